@@ -1,23 +1,60 @@
-from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
+from sqlalchemy import insert, select
+from sqlalchemy.orm import defer
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
-from typing import Optional
+from typing import Dict, List, Literal, Optional
 import uuid
+import json
+import os
 from datetime import datetime
 
-from app.core.database import get_db
+from app.core.database import get_async_db
 from app.models.agent import Agent, AgentStatus
-from app.core.orchestrator import AgentExecutor
 from app.core.events import EventService
+from app.core.queue import AgentQueue
+from app.core.orchestrator import request_kill
+from app.core.redis_client import get_redis
+from app.core.dag import DAG_MAX_PARALLEL, StepGraph
+from app.core.estimator import get_estimator
+from app.core.llm_providers import provider_class
+from app.core.status_cache import StatusCache, get_status_cache
+from app.core.tracing import TraceStore, to_chrome, to_otlp, waterfall
 
 router = APIRouter()
 
+# Most agents accepted by one POST /batch
+AGENT_BATCH_MAX_SIZE = int(os.getenv("AGENT_BATCH_MAX_SIZE", "5000"))
+
+class StepCreate(BaseModel):
+    id: str
+    prompt: str  # May reference {{task}} and {{<step id>}}
+    depends_on: List[str] = []
+
+class FallbackCreate(BaseModel):
+    provider: str
+    model: str
+    api_key: Optional[str] = None  # Defaults to the agent's key for the same provider
+
 class AgentCreate(BaseModel):
     task: str
     provider: str = "openai"
     model: str = "gpt-4"
     api_key: str  # User's own API key
     max_cost_usd: float = 10.0
+    cache: Optional[bool] = None  # None = server default (LLM_CACHE_ENABLED)
+    cache_similarity: Optional[float] = None  # Also reuse responses to prompts at least this similar (0-1]
+    stream: bool = False  # Forward token deltas over the WebSocket
+    priority: Literal["high", "normal", "low"] = "normal"
+    steps: Optional[List[StepCreate]] = None  # Step graph; default is one step running the task
+    max_parallel: Optional[int] = None  # Steps in flight at once (default DAG_MAX_PARALLEL)
+    batch: bool = False  # Use the provider's batch API: cheaper, results can take hours
+    fallbacks: Optional[List[FallbackCreate]] = None  # Equivalent models to fail over to
+    hedge: bool = True  # Race a fallback when a call is slower than usual (see HedgedProvider)
+    trace: Optional[bool] = None  # Trace every run (True) or none (False); None = TRACE_SAMPLE_RATE
+
+class AgentBatchCreate(BaseModel):
+    agents: List[AgentCreate]
 
 class AgentResponse(BaseModel):
     id: str
@@ -36,48 +73,96 @@ class AgentResponse(BaseModel):
     result: Optional[dict]
     error: Optional[str]
 
-async def run_agent_background(agent_id: str):
-    """Background task to run agent"""
-    from app.core.database import get_db_context
+def get_queue() -> AgentQueue:
+    return AgentQueue(get_redis())
+
+def get_agent_status_cache() -> StatusCache:
+    return get_status_cache(get_redis())
+
+def check_cache_similarity(agent: AgentCreate):
+    """400 unless near-duplicate matching can run for this agent"""
+    if not 0 < agent.cache_similarity <= 1:
+        raise HTTPException(status_code=400, detail="cache_similarity must be in (0, 1]")
+    if agent.cache is False:
+        raise HTTPException(status_code=400, detail="cache_similarity needs the response cache (cache=false)")
+    # Imported on first use: numpy is only loaded by processes that need it
+    from app.core import prompt_index
+    if prompt_index.np is None:
+        raise HTTPException(status_code=400, detail="cache_similarity is unavailable: numpy is not installed")
+
+def fallback_config(agent: AgentCreate, fallback: FallbackCreate) -> Dict:
+    """Stored route for a fallback; ValueError if it can't be used"""
+    api_key = fallback.api_key
+    if api_key is None:
+        if fallback.provider != agent.provider:
+            raise ValueError(f"Fallback {fallback.provider}/{fallback.model} needs its own api_key")
+        api_key = agent.api_key
+    provider_class(fallback.provider)
+    return {'provider': fallback.provider, 'model': fallback.model, 'api_key': api_key}
+
+def agent_row(agent: AgentCreate) -> Dict:
+    """Column values for a new PENDING agent; 400 if its step graph or provider is invalid"""
+    config = {
+        'api_key': agent.api_key,  # In production, encrypt this!
+        'max_cost_usd': agent.max_cost_usd,
+        'stream': agent.stream,
+        'priority': agent.priority
+    }
+    if agent.cache is not None:
+        config['cache'] = agent.cache
+    if agent.cache_similarity is not None:
+        check_cache_similarity(agent)
+        config['cache_similarity'] = agent.cache_similarity
+    if agent.steps:
+        config['steps'] = [step.model_dump() for step in agent.steps]
+    if agent.max_parallel is not None:
+        config['max_parallel'] = agent.max_parallel
+    if agent.batch:
+        config['batch'] = True
+    if agent.trace is not None:
+        config['trace'] = agent.trace
     
-    with get_db_context() as db:
-        executor = AgentExecutor(agent_id, db)
-        await executor.run()
+    try:
+        graph = StepGraph.from_config(config)
+        provider_class(agent.provider)
+        if agent.fallbacks:
+            config['fallbacks'] = [fallback_config(agent, fallback) for fallback in agent.fallbacks]
+            config['hedge'] = agent.hedge
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return {
+        'id': str(uuid.uuid4()),
+        'task': agent.task,
+        'provider': agent.provider,
+        'model': agent.model,
+        'status': AgentStatus.PENDING,
+        'config': config,
+        'current_step': 0,
+        'total_steps': len(graph),
+        'cost_usd': 0.0,
+        'runtime_seconds': 0,
+        # Confidence and cost/runtime bounds from past runs (see CostEstimator)
+        **get_estimator().estimate(agent.provider, agent.model, agent.task, graph,
+                                   config.get('max_parallel', DAG_MAX_PARALLEL))
+    }
 
 @router.post("/", response_model=AgentResponse)
 async def create_agent(
     agent: AgentCreate, 
-    background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db),
+    queue: AgentQueue = Depends(get_queue),
+    status_cache: StatusCache = Depends(get_agent_status_cache)
 ):
     """Create and start a new agent"""
-    agent_id = str(uuid.uuid4())
-    
-    # Create agent in DB
-    new_agent = Agent(
-        id=agent_id,
-        task=agent.task,
-        provider=agent.provider,
-        model=agent.model,
-        status=AgentStatus.PENDING,
-        config={
-            'api_key': agent.api_key,  # In production, encrypt this!
-            'max_cost_usd': agent.max_cost_usd
-        },
-        total_steps=1,  # Simple for now
-        confidence_score=85.0,  # TODO: Calculate actual confidence
-        estimated_cost_min=2.50,
-        estimated_cost_max=4.00,
-        estimated_runtime_min=120,
-        estimated_runtime_max=300
-    )
+    new_agent = Agent(**agent_row(agent))
     
     db.add(new_agent)
-    db.commit()
-    db.refresh(new_agent)
+    await db.commit()
+    await status_cache.put(new_agent)
     
-    # Start agent in background
-    background_tasks.add_task(run_agent_background, agent_id)
+    # Hand off to the worker pool (see app/worker.py)
+    await queue.enqueue(new_agent.id, lane=agent.priority)
     
     return AgentResponse(
         id=new_agent.id,
@@ -97,68 +182,149 @@ async def create_agent(
         error=new_agent.error
     )
 
+@router.post("/batch")
+async def create_agents(
+    batch: AgentBatchCreate,
+    db: AsyncSession = Depends(get_async_db),
+    queue: AgentQueue = Depends(get_queue),
+    status_cache: StatusCache = Depends(get_agent_status_cache)
+):
+    """Create many agents in one transaction and enqueue them together"""
+    if not batch.agents:
+        raise HTTPException(status_code=400, detail="No agents in batch")
+    if len(batch.agents) > AGENT_BATCH_MAX_SIZE:
+        raise HTTPException(status_code=413, detail=f"At most {AGENT_BATCH_MAX_SIZE} agents per batch")
+    
+    rows = [agent_row(agent) for agent in batch.agents]
+    # Set here rather than by the column default so the cached status has it
+    created_at = datetime.utcnow()
+    for row in rows:
+        row['created_at'] = created_at
+    await db.execute(insert(Agent), rows)
+    await db.commit()
+    await status_cache.put_many([Agent(**row) for row in rows])
+    
+    # One pipelined round trip per priority lane
+    by_lane: Dict[str, List[str]] = {}
+    for agent, row in zip(batch.agents, rows):
+        by_lane.setdefault(agent.priority, []).append(row['id'])
+    for lane, agent_ids in by_lane.items():
+        await queue.enqueue_many(agent_ids, lane=lane)
+    
+    return {
+        "count": len(rows),
+        "agents": [{"id": row['id'], "status": row['status'].value} for row in rows]
+    }
+
 @router.get("/{agent_id}", response_model=AgentResponse)
-async def get_agent(agent_id: str, db: Session = Depends(get_db)):
-    """Get agent status"""
-    agent = db.query(Agent).filter(Agent.id == agent_id).first()
+async def get_agent(
+    agent_id: str,
+    request: Request,
+    include: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+    status_cache: StatusCache = Depends(get_agent_status_cache)
+):
+    """Get agent status.
+
+    Served from the status cache with an ETag, so polling clients that send
+    If-None-Match get a 304 without a database read. `result` is only
+    loaded with ?include=result.
+    """
+    cached = await status_cache.get(agent_id)
+    if cached is None:
+        agent = await db.scalar(
+            select(Agent).where(Agent.id == agent_id).options(
+                defer(Agent.result), defer(Agent.checkpoint_data), defer(Agent.config)
+            )
+        )
+        if not agent:
+            raise HTTPException(status_code=404, detail="Agent not found")
+        cached = await status_cache.put(agent, only_if_missing=True)
     
-    if not agent:
-        raise HTTPException(status_code=404, detail="Agent not found")
+    etag, body = cached
+    with_result = 'result' in (include or '').split(',')
+    if with_result:
+        etag = etag[:-1] + '-result"'
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
     
-    return AgentResponse(
-        id=agent.id,
-        task=agent.task,
-        status=agent.status.value,
-        current_step=agent.current_step,
-        total_steps=agent.total_steps,
-        cost_usd=agent.cost_usd,
-        runtime_seconds=agent.runtime_seconds,
-        confidence_score=agent.confidence_score,
-        estimated_cost_min=agent.estimated_cost_min,
-        estimated_cost_max=agent.estimated_cost_max,
-        created_at=agent.created_at,
-        started_at=agent.started_at,
-        completed_at=agent.completed_at,
-        result=agent.result,
-        error=agent.error
-    )
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match and (if_none_match.strip() == '*' or etag in (t.strip() for t in if_none_match.split(','))):
+        return Response(status_code=304, headers=headers)
+    
+    if with_result:
+        payload = json.loads(body)
+        payload['result'] = await db.scalar(select(Agent.result).where(Agent.id == agent_id))
+        body = json.dumps(payload)
+    return Response(body, media_type='application/json', headers=headers)
 
 @router.get("/{agent_id}/timeline")
-async def get_timeline(agent_id: str, db: Session = Depends(get_db)):
-    """Get agent event timeline"""
+async def get_timeline(
+    agent_id: str,
+    limit: int = 100,
+    before_id: Optional[int] = None,
+    since_id: Optional[int] = None,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get agent event timeline (keyset-paginated, see EventService.get_timeline)"""
     event_service = EventService(db)
-    return {"timeline": event_service.get_timeline(agent_id)}
+    return await event_service.get_timeline(
+        agent_id,
+        limit=limit,
+        before_id=before_id,
+        since_id=since_id,
+        fields=fields.split(',') if fields else None
+    )
+
+@router.get("/{agent_id}/trace")
+async def get_trace(
+    agent_id: str,
+    run: int = 0,
+    format: Literal["waterfall", "otlp", "chrome"] = "waterfall"
+):
+    """Spans of a traced run (run=0 is the latest) as a waterfall, OTLP/JSON or Chrome trace events"""
+    record = await TraceStore(get_redis()).load(agent_id, run)
+    if record is None:
+        raise HTTPException(
+            status_code=404,
+            detail="No trace for this run: runs are sampled at TRACE_SAMPLE_RATE, or create the agent with trace=true"
+        )
+    if format == "otlp":
+        return to_otlp(record)
+    if format == "chrome":
+        return to_chrome(record)
+    return waterfall(record)
 
 @router.post("/{agent_id}/kill")
-async def kill_agent(agent_id: str, db: Session = Depends(get_db)):
+async def kill_agent(agent_id: str):
     """Kill a running agent"""
-    import redis
-    redis_client = redis.Redis(host='redis', port=6379, decode_responses=True)
-    redis_client.set(f'kill:{agent_id}', '1')
+    await request_kill(get_redis(), agent_id)
     
     return {"status": "kill_signal_sent", "agent_id": agent_id}
 
 @router.post("/{agent_id}/resume")
 async def resume_agent(
     agent_id: str, 
-    background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db),
+    queue: AgentQueue = Depends(get_queue),
+    status_cache: StatusCache = Depends(get_agent_status_cache)
 ):
-    """Resume a failed/paused agent"""
-    agent = db.query(Agent).filter(Agent.id == agent_id).first()
+    """Resume a failed/paused/killed agent"""
+    agent = await db.get(Agent, agent_id)
     
     if not agent:
         raise HTTPException(status_code=404, detail="Agent not found")
     
-    if agent.status not in [AgentStatus.FAILED, AgentStatus.PAUSED]:
+    if agent.status not in [AgentStatus.FAILED, AgentStatus.PAUSED, AgentStatus.KILLED]:
         raise HTTPException(status_code=400, detail="Agent cannot be resumed")
     
     # Reset status
     agent.status = AgentStatus.PENDING
     agent.error = None
-    db.commit()
+    await db.commit()
+    await status_cache.put(agent)
     
-    # Restart in background
-    background_tasks.add_task(run_agent_background, agent_id)
+    # Re-queue for the worker pool
+    await queue.enqueue(agent_id, lane=agent.config.get('priority', 'normal'))
     
     return {"status": "resuming", "agent_id": agent_id}
\ No newline at end of file
@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from datetime import datetime
+
+from app.core.database import get_async_db
+from app.core.costs import CostService
+
+router = APIRouter()
+
+@router.get("/")
+async def get_costs(
+    group_by: str = "provider,model",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    agent_id: Optional[str] = None,
+    provider: Optional[str] = None,
+    model: Optional[str] = None,
+    key_hash: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Aggregate spend from the hourly cost rollups.
+
+    group_by is a comma-separated subset of agent_id, provider, model,
+    key_hash and bucket (hour).
+    """
+    return await CostService(db).aggregate(
+        group_by=[g for g in group_by.split(',') if g],
+        start=start,
+        end=end,
+        filters={'agent_id': agent_id, 'provider': provider, 'model': model, 'key_hash': key_hash}
+    )
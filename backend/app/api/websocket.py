@@ -1,49 +1,223 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from typing import Dict
-import redis.asyncio as redis
-import json
+from typing import Dict, List, Optional, Set, Union
+from app.core.redis_client import get_redis
+from app.core.event_codec import EventCodec, JSON_CODEC, get_codec
+from app.core.event_sink import AGENT_STREAM_MAXLEN, stream_key
+from app.core.monitoring import WS_CONNECTIONS, WS_FANOUT_LAG_SECONDS, WS_MESSAGES_DROPPED
+import asyncio
+import os
+import time
 
 router = APIRouter()
 
+# Per-socket send buffer; a slow viewer loses its oldest messages past this
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+# How long a replay waits for the fan-out subscription before sending a replay_gap instead
+WS_SUBSCRIBE_TIMEOUT_SECONDS = float(os.getenv("WS_SUBSCRIBE_TIMEOUT_SECONDS", "5"))
+
+class Client:
+    """One connected socket with a bounded outgoing queue"""
+
+    def __init__(self, websocket: WebSocket, max_queue: int = WS_SEND_QUEUE_SIZE, codec: EventCodec = JSON_CODEC):
+        self.websocket = websocket
+        self.codec = codec
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.dropped = 0
+        # Replayed from the agent's stream, sent before anything live
+        self.backlog: List[Union[str, bytes]] = []
+        # Live messages up to this event id were already sent from the backlog
+        self.replayed_through: Optional[int] = None
+
+    def offer(self, message: Union[str, bytes]):
+        """Queue a message without blocking the fan-out loop"""
+        if self.queue.full():
+            # Slow consumer: drop the oldest message, tell the client later
+            self.queue.get_nowait()
+            self.dropped += 1
+            WS_MESSAGES_DROPPED.inc()
+        self.queue.put_nowait((time.perf_counter(), message))
+
+    def replay_gap(self, since_id: int):
+        """Tell the client to fetch the timeline since `since_id`: the replay can't cover it"""
+        self.backlog.append(self.codec.encode({
+            'action': 'replay_gap',
+            'status': 'warning',
+            'data': {'since_id': since_id}
+        }))
+
+    async def run(self):
+        """Send the backlog, then queued messages until cancelled or the socket fails"""
+        for message in self.backlog:
+            await self.send(message)
+        self.backlog = []
+        while True:
+            queued_at, message = await self.queue.get()
+            if self.replayed_through is not None:
+                # Only while live and replayed messages overlap
+                event_id = self.codec.decode(message).get('id')
+                if event_id is not None:
+                    if event_id <= self.replayed_through:
+                        continue
+                    self.replayed_through = None
+            if self.dropped:
+                # Let the client know it should refetch the timeline
+                await self.send(self.codec.encode({
+                    'action': 'messages_dropped',
+                    'status': 'warning',
+                    'data': {'count': self.dropped}
+                }))
+                self.dropped = 0
+            await self.send(message)
+            WS_FANOUT_LAG_SECONDS.observe(time.perf_counter() - queued_at)
+
+    async def send(self, message: Union[str, bytes]):
+        if self.codec.binary:
+            await self.websocket.send_bytes(message)
+        else:
+            await self.websocket.send_text(message)
+
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[str, WebSocket] = {}
-    
-    async def connect(self, agent_id: str, websocket: WebSocket):
+    """Fans agent events out to every connected viewer.
+
+    The process holds a single Redis pattern subscription (agent:*) no matter
+    how many sockets are open; each message is handed to every socket
+    watching that agent through its own bounded queue. Messages arrive
+    encoded and are forwarded as is; sockets that asked for another format
+    share one transcoded copy per message.
+    """
+
+    def __init__(self, redis_client=None):
+        self.redis_client = redis_client
+        self.active_connections: Dict[str, Set[Client]] = {}
+        self._listener: Optional[asyncio.Task] = None
+        # Set while the pattern subscription is confirmed by Redis
+        self._subscribed = asyncio.Event()
+
+    async def connect(self, agent_id: str, websocket: WebSocket, codec: EventCodec = JSON_CODEC) -> Client:
         await websocket.accept()
-        self.active_connections[agent_id] = websocket
-    
-    def disconnect(self, agent_id: str):
-        if agent_id in self.active_connections:
-            del self.active_connections[agent_id]
-    
-    async def send_message(self, agent_id: str, message: dict):
-        if agent_id in self.active_connections:
-            await self.active_connections[agent_id].send_json(message)
+        client = Client(websocket, codec=codec)
+        self.active_connections.setdefault(agent_id, set()).add(client)
+        WS_CONNECTIONS.inc()
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen())
+        return client
+
+    async def replay(self, agent_id: str, client: Client, last_event_id: int):
+        """Fill the client's backlog with events after last_event_id from the agent's stream.
+
+        The stream is read once the shared subscription is confirmed, so the
+        client is already receiving live messages and nothing published in
+        between is missed; duplicates are skipped in Client.run(). If the
+        stream no longer reaches back to last_event_id (trimmed, expired or
+        never written) the backlog starts with a replay_gap message telling
+        the client to fetch the timeline since that id instead.
+        """
+        await asyncio.wait_for(self._subscribed.wait(), WS_SUBSCRIBE_TIMEOUT_SECONDS)
+        key = stream_key(agent_id)
+        async with (self.redis_client or get_redis()).pipeline(transaction=False) as pipe:
+            pipe.xrange(key, count=1)
+            pipe.xrange(key, min=f'{last_event_id + 1}', count=max(AGENT_STREAM_MAXLEN, 1))
+            oldest, entries = await pipe.execute()
+
+        if not oldest or int(oldest[0][0].split('-')[0]) > last_event_id:
+            client.replay_gap(last_event_id)
+        for entry_id, fields in entries:
+            message = fields['m']
+            if client.codec is not JSON_CODEC:
+                message = client.codec.encode(JSON_CODEC.decode(message))
+            client.backlog.append(message)
+        if entries:
+            client.replayed_through = int(entries[-1][0].split('-')[0])
+
+    def disconnect(self, agent_id: str, client: Client):
+        clients = self.active_connections.get(agent_id)
+        if clients is not None and client in clients:
+            clients.discard(client)
+            WS_CONNECTIONS.dec()
+            if not clients:
+                del self.active_connections[agent_id]
+
+    def dispatch(self, agent_id: str, message: str):
+        encoded: Dict[str, Union[str, bytes]] = {JSON_CODEC.name: message}
+        decoded = None
+        for client in self.active_connections.get(agent_id, ()):
+            data = encoded.get(client.codec.name)
+            if data is None:
+                if decoded is None:
+                    decoded = JSON_CODEC.decode(message)
+                data = encoded[client.codec.name] = client.codec.encode(decoded)
+            client.offer(data)
+
+    async def _listen(self):
+        redis_client = self.redis_client or get_redis()
+        while True:
+            pubsub = redis_client.pubsub()
+            try:
+                await pubsub.psubscribe('agent:*')
+                async for message in pubsub.listen():
+                    if message['type'] == 'pmessage':
+                        self.dispatch(message['channel'][len('agent:'):], message['data'])
+                    elif message['type'] == 'psubscribe':
+                        self._subscribed.set()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Messages published until the resubscribe are lost: replays wait for it
+                self._subscribed.clear()
+                print(f"WebSocket fan-out error: {e}")
+                await asyncio.sleep(1)
+            finally:
+                self._subscribed.clear()
+                await pubsub.aclose()
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+            self._subscribed.clear()
 
 manager = ConnectionManager()
 
 @router.websocket("/ws/agents/{agent_id}")
-async def websocket_endpoint(websocket: WebSocket, agent_id: str):
-    """WebSocket endpoint for real-time agent updates"""
-    await manager.connect(agent_id, websocket)
-    
-    # Subscribe to Redis pub/sub for this agent
-    redis_client = await redis.Redis(host='redis', port=6379, decode_responses=True)
-    pubsub = redis_client.pubsub()
-    await pubsub.subscribe(f'agent:{agent_id}')
-    
+async def websocket_endpoint(
+    websocket: WebSocket,
+    agent_id: str,
+    format: str = 'json',
+    last_event_id: Optional[int] = None
+):
+    """WebSocket endpoint for real-time agent updates.
+
+    ?format=msgpack for binary frames; ?last_event_id=<id> (the last event
+    id the client has, e.g. the timeline's since_id) replays newer events
+    before going live.
+    """
+    try:
+        codec = get_codec(format)
+    except ValueError:
+        await websocket.close(code=1003)
+        return
+    client = await manager.connect(agent_id, websocket, codec)
+    if last_event_id is not None:
+        try:
+            await manager.replay(agent_id, client, last_event_id)
+        except Exception as e:
+            print(f"WebSocket replay error: {e}")
+            client.backlog = []
+            client.replay_gap(last_event_id)
+    sender = asyncio.create_task(client.run())
+
     try:
-        async for message in pubsub.listen():
-            if message['type'] == 'message':
-                data = json.loads(message['data'])
-                await websocket.send_json(data)
+        # Nothing is expected from the browser; this just notices the disconnect
+        while True:
+            await websocket.receive_text()
     except WebSocketDisconnect:
-        manager.disconnect(agent_id)
-        await pubsub.unsubscribe(f'agent:{agent_id}')
-        await redis_client.close()
+        pass
     except Exception as e:
         print(f"WebSocket error: {e}")
-        manager.disconnect(agent_id)
-        await pubsub.unsubscribe(f'agent:{agent_id}')
-        await redis_client.close()
\ No newline at end of file
+    finally:
+        sender.cancel()
+        manager.disconnect(agent_id, client)
@@ -0,0 +1,23 @@
+# backend/app/backfill_rollups.py
+"""One-off: build cost rollups for agents that spent money before they existed.
+
+    python -m app.backfill_rollups
+
+Safe to re-run; agents that already have rollup rows are skipped. Until it
+has run, those agents' cost is summed from their events instead.
+"""
+import asyncio
+
+from app.core.costs import backfill_rollups
+from app.core.database import AsyncSessionLocal, close_db
+
+async def main():
+    try:
+        async with AsyncSessionLocal() as db:
+            agents = await backfill_rollups(db)
+        print(f"Backfilled cost rollups for {agents} agents")
+    finally:
+        await close_db()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,199 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime, timedelta
+from sqlalchemy import select, delete, exists
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.agent import Agent, AgentStatus, AgentEvent, EventArchive, EventArchiveChunk
+import json
+import os
+import time
+import zlib
+
+# Events of agents finished longer ago than this move out of agent_events
+EVENT_RETENTION_DAYS = float(os.getenv("EVENT_RETENTION_DAYS", "30"))
+EVENT_ARCHIVE_INTERVAL_SECONDS = float(os.getenv("EVENT_ARCHIVE_INTERVAL_SECONDS", "3600"))
+EVENT_ARCHIVE_BATCH = int(os.getenv("EVENT_ARCHIVE_BATCH", "100"))  # Agents per pass
+# Events per archive chunk; a timeline page decodes only the chunks it overlaps
+EVENT_ARCHIVE_CHUNK_SIZE = int(os.getenv("EVENT_ARCHIVE_CHUNK_SIZE", "500"))
+EVENT_ARCHIVE_COMPRESS_LEVEL = int(os.getenv("EVENT_ARCHIVE_COMPRESS_LEVEL", "6"))
+EVENT_ARCHIVE_CACHE_SIZE = int(os.getenv("EVENT_ARCHIVE_CACHE_SIZE", "64"))  # Decoded chunks kept in memory
+# How long a process trusts what it knows about an agent's archive row; a pass
+# that archives the agent meanwhile shows up in timelines after at most this
+EVENT_ARCHIVE_BOUNDS_TTL_SECONDS = float(os.getenv("EVENT_ARCHIVE_BOUNDS_TTL_SECONDS", "300"))
+EVENT_ARCHIVE_BOUNDS_CACHE_SIZE = int(os.getenv("EVENT_ARCHIVE_BOUNDS_CACHE_SIZE", "10000"))
+
+FINISHED_STATUSES = (AgentStatus.COMPLETED, AgentStatus.FAILED, AgentStatus.KILLED)
+
+# agent_id -> (expires_at, (first_event_id, last_event_id) or None if not archived)
+_bounds_cache: "OrderedDict[str, Tuple[float, Optional[Tuple[int, int]]]]" = OrderedDict()
+# (agent_id, first_event_id) -> decoded events; chunks never change once written
+_chunk_cache: "OrderedDict[Tuple[str, int], List[Dict]]" = OrderedDict()
+
+def cache_bounds(agent_id: str, bounds: Optional[Tuple[int, int]]):
+    _bounds_cache[agent_id] = (time.monotonic() + EVENT_ARCHIVE_BOUNDS_TTL_SECONDS, bounds)
+    _bounds_cache.move_to_end(agent_id)
+    while len(_bounds_cache) > EVENT_ARCHIVE_BOUNDS_CACHE_SIZE:
+        _bounds_cache.popitem(last=False)
+
+def encode_chunk(events: List[Dict]) -> bytes:
+    return zlib.compress(json.dumps(events, separators=(',', ':')).encode(), EVENT_ARCHIVE_COMPRESS_LEVEL)
+
+def decode_chunk(payload: bytes) -> List[Dict]:
+    return json.loads(zlib.decompress(payload))
+
+class EventArchiver:
+    """Moves events of long-finished agents from agent_events to archive chunks.
+
+    Archived events are stored in the database as compressed chunks of
+    EVENT_ARCHIVE_CHUNK_SIZE events (event_archive_chunks) plus one
+    event_archives row per agent, so agent_events (and its indexes) only
+    holds recent and running agents while every API process and worker can
+    still read the archive. Chunks are written in the same commit that
+    deletes the rows. A resumed agent's later events become new chunks.
+    """
+
+    def __init__(
+        self,
+        db: AsyncSession,
+        retention: timedelta = timedelta(days=EVENT_RETENTION_DAYS),
+        chunk_size: int = EVENT_ARCHIVE_CHUNK_SIZE
+    ):
+        self.db = db
+        self.retention = retention
+        self.chunk_size = chunk_size
+
+    async def candidates(self, limit: int = EVENT_ARCHIVE_BATCH) -> List[str]:
+        """Finished agents past retention that still have events in the table"""
+        cutoff = datetime.utcnow() - self.retention
+        result = await self.db.execute(
+            select(Agent.id).where(
+                Agent.status.in_(FINISHED_STATUSES),
+                Agent.completed_at < cutoff,
+                exists().where(AgentEvent.agent_id == Agent.id)
+            ).limit(limit)
+        )
+        return list(result.scalars())
+
+    async def archive_agent(self, agent_id: str) -> int:
+        """Archive one agent's events; returns how many were moved"""
+        rows = (await self.db.execute(
+            select(AgentEvent).where(AgentEvent.agent_id == agent_id).order_by(AgentEvent.id)
+        )).scalars().all()
+        if not rows:
+            return 0
+
+        events = [
+            {
+                'id': row.id,
+                'timestamp': row.timestamp.isoformat() if row.timestamp else None,
+                'action': row.action,
+                'status': row.status,
+                'step': row.step,
+                'data': row.data,
+                'cost': row.cost_usd
+            }
+            for row in rows
+        ]
+
+        size = 0
+        for i in range(0, len(events), self.chunk_size):
+            chunk = events[i:i + self.chunk_size]
+            payload = encode_chunk(chunk)
+            size += len(payload)
+            self.db.add(EventArchiveChunk(
+                agent_id=agent_id,
+                first_event_id=chunk[0]['id'],
+                last_event_id=chunk[-1]['id'],
+                event_count=len(chunk),
+                payload=payload
+            ))
+
+        archive = await self.db.get(EventArchive, agent_id)
+        if archive is None:
+            archive = EventArchive(agent_id=agent_id, event_count=0, first_event_id=events[0]['id'], size_bytes=0)
+            self.db.add(archive)
+        archive.event_count += len(events)
+        archive.last_event_id = events[-1]['id']
+        archive.size_bytes += size
+        archive.archived_at = datetime.utcnow()
+
+        await self.db.execute(
+            delete(AgentEvent).where(
+                AgentEvent.agent_id == agent_id,
+                AgentEvent.id <= rows[-1].id
+            )
+        )
+        await self.db.commit()
+        cache_bounds(agent_id, (archive.first_event_id, archive.last_event_id))
+        return len(rows)
+
+    async def run_once(self, limit: int = EVENT_ARCHIVE_BATCH) -> int:
+        """Archive up to `limit` agents; returns the number of events moved"""
+        moved = 0
+        for agent_id in await self.candidates(limit):
+            try:
+                moved += await self.archive_agent(agent_id)
+            except Exception as e:
+                await self.db.rollback()
+                print(f"Archiving events for {agent_id} failed: {e}")
+        return moved
+
+    async def bounds(self, agent_id: str) -> Optional[Tuple[int, int]]:
+        """(first, last) archived event id of an agent, None if it has no archive (cached)"""
+        cached = _bounds_cache.get(agent_id)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+        row = (await self.db.execute(
+            select(EventArchive.first_event_id, EventArchive.last_event_id)
+            .where(EventArchive.agent_id == agent_id)
+        )).first()
+        bounds = tuple(row) if row is not None else None
+        cache_bounds(agent_id, bounds)
+        return bounds
+
+    async def chunk(self, agent_id: str, first_event_id: int) -> List[Dict]:
+        """Decoded events of one chunk (cached)"""
+        key = (agent_id, first_event_id)
+        events = _chunk_cache.get(key)
+        if events is None:
+            payload = await self.db.scalar(
+                select(EventArchiveChunk.payload).where(
+                    EventArchiveChunk.agent_id == agent_id,
+                    EventArchiveChunk.first_event_id == first_event_id
+                )
+            )
+            events = decode_chunk(payload)
+            _chunk_cache[key] = events
+        _chunk_cache.move_to_end(key)
+        while len(_chunk_cache) > EVENT_ARCHIVE_CACHE_SIZE:
+            _chunk_cache.popitem(last=False)
+        return events
+
+    async def load(
+        self,
+        agent_id: str,
+        limit: int,
+        before_id: Optional[int] = None,
+        since_id: Optional[int] = None
+    ) -> List[Dict]:
+        """Up to `limit` archived events, oldest first: the newest before `before_id` or the oldest after `since_id`"""
+        query = select(EventArchiveChunk.first_event_id).where(EventArchiveChunk.agent_id == agent_id)
+        if since_id is not None:
+            query = query.where(EventArchiveChunk.last_event_id > since_id).order_by(EventArchiveChunk.first_event_id)
+        else:
+            if before_id is not None:
+                query = query.where(EventArchiveChunk.first_event_id < before_id)
+            query = query.order_by(EventArchiveChunk.first_event_id.desc())
+
+        # Chunks are decoded one at a time until the page is full
+        events: List[Dict] = []
+        for first_event_id in list(await self.db.scalars(query)):
+            chunk = await self.chunk(agent_id, first_event_id)
+            if since_id is not None:
+                events += [e for e in chunk if e['id'] > since_id][:limit - len(events)]
+            else:
+                matching = [e for e in chunk if before_id is None or e['id'] < before_id]
+                events = matching[max(0, len(matching) - (limit - len(events))):] + events
+            if len(events) >= limit:
+                break
+        return events
@@ -0,0 +1,189 @@
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+from app.core.llm_providers import LLMProvider, ProviderError
+import asyncio
+import os
+import uuid
+
+# A batch is sent once it has this many prompts or its oldest prompt has waited this long
+LLM_BATCH_MAX_SIZE = int(os.getenv("LLM_BATCH_MAX_SIZE", "1000"))
+LLM_BATCH_MAX_WAIT_SECONDS = float(os.getenv("LLM_BATCH_MAX_WAIT_SECONDS", "5"))
+LLM_BATCH_POLL_SECONDS = float(os.getenv("LLM_BATCH_POLL_SECONDS", "30"))
+
+# (provider, model, api key hash): prompts that can share one batch job
+BatchKey = Tuple[str, str, str]
+# Called with (batch_id, custom_id) once a prompt's batch is submitted
+OnSubmit = Callable[[str, str], Awaitable[None]]
+
+class BatchCollector:
+    """Groups prompts from many agents into provider batch jobs.
+
+    Callers await complete() like a normal call. Prompts for the same
+    provider, model and API key are collected until the batch is full or
+    LLM_BATCH_MAX_WAIT_SECONDS pass, submitted as one job, and polled until
+    the provider finishes it. Slower than a direct call, but batch APIs
+    are billed at a discount and don't count against the live rate limits.
+
+    Jobs can run for up to a day, so callers can record each submitted
+    (batch_id, custom_id) and, after a restart, resume() polling it rather
+    than submitting (and paying for) the prompt again.
+    """
+
+    def __init__(
+        self,
+        max_size: int = LLM_BATCH_MAX_SIZE,
+        max_wait_seconds: float = LLM_BATCH_MAX_WAIT_SECONDS,
+        poll_seconds: float = LLM_BATCH_POLL_SECONDS
+    ):
+        self.max_size = max_size
+        self.max_wait = max_wait_seconds
+        self.poll_seconds = poll_seconds
+        self._pending: Dict[BatchKey, Dict[str, Tuple[str, asyncio.Future, Optional[OnSubmit]]]] = {}
+        self._providers: Dict[BatchKey, LLMProvider] = {}
+        self._timers: Dict[BatchKey, asyncio.TimerHandle] = {}
+        self._jobs: Set[asyncio.Task] = set()
+        self._polls: Dict[str, asyncio.Task] = {}  # batch_id -> poll shared by resumed callers
+
+    async def complete(
+        self,
+        provider: LLMProvider,
+        key_hash: str,
+        prompt: str,
+        on_submit: Optional[OnSubmit] = None
+    ) -> Dict[str, Any]:
+        key = (provider.name, provider.model, key_hash)
+        custom_id = uuid.uuid4().hex
+        future = asyncio.get_running_loop().create_future()
+
+        pending = self._pending.setdefault(key, {})
+        pending[custom_id] = (prompt, future, on_submit)
+        self._providers[key] = provider
+        if len(pending) >= self.max_size:
+            self._submit(key)
+        elif key not in self._timers:
+            self._timers[key] = asyncio.get_running_loop().call_later(self.max_wait, self._submit, key)
+
+        try:
+            return await future
+        except asyncio.CancelledError:
+            # Not sent yet: leave it out of the batch
+            pending = self._pending.get(key)
+            if pending is not None:
+                pending.pop(custom_id, None)
+            raise
+
+    def _submit(self, key: BatchKey):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        requests = self._pending.pop(key, None)
+        provider = self._providers.pop(key, None)
+        if requests:
+            job = asyncio.create_task(self._run(provider, requests))
+            self._jobs.add(job)
+            job.add_done_callback(self._jobs.discard)
+
+    async def resume(self, provider: LLMProvider, batch_id: str, custom_id: str) -> Dict[str, Any]:
+        """Result of a prompt submitted earlier (possibly by another process)"""
+        poll = self._polls.get(batch_id)
+        if poll is None:
+            poll = self._polls[batch_id] = asyncio.create_task(self._wait(provider, batch_id))
+            poll.add_done_callback(lambda _: self._polls.pop(batch_id, None))
+        # Shielded: other agents may be waiting on the same batch
+        results = await asyncio.shield(poll)
+        return self._result(provider, batch_id, results.get(custom_id))
+
+    def _result(self, provider: LLMProvider, batch_id: str, result: Any) -> Dict[str, Any]:
+        if result is None:
+            raise ProviderError(f"Batch {batch_id} ended without a result for this request")
+        if isinstance(result, Exception):
+            raise result
+        return {
+            **result,
+            'cost_usd': result['cost_usd'] * provider.batch_discount,
+            'batch_id': batch_id
+        }
+
+    async def _run(self, provider: LLMProvider, requests: Dict[str, Tuple[str, asyncio.Future, Optional[OnSubmit]]]):
+        try:
+            batch_id = await provider.submit_batch({
+                custom_id: prompt for custom_id, (prompt, _, _) in requests.items()
+            })
+            await asyncio.gather(*(
+                self._notify(on_submit, batch_id, custom_id)
+                for custom_id, (_, _, on_submit) in requests.items()
+                if on_submit is not None
+            ))
+            results = await self._wait(provider, batch_id)
+        except Exception as e:
+            for _, future, _ in requests.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for custom_id, (_, future, _) in requests.items():
+            if future.done():
+                continue
+            try:
+                future.set_result(self._result(provider, batch_id, results.get(custom_id)))
+            except Exception as e:
+                future.set_exception(e)
+
+    async def _notify(self, on_submit: OnSubmit, batch_id: str, custom_id: str):
+        try:
+            await on_submit(batch_id, custom_id)
+        except Exception as e:
+            # The batch still runs; only a restart would have to submit it again
+            print(f"Recording batch {batch_id} failed: {e}")
+
+    async def _wait(self, provider: LLMProvider, batch_id: str) -> Dict[str, Any]:
+        while True:
+            try:
+                results = await provider.batch_results(batch_id)
+            except ProviderError as e:
+                if not e.retryable:
+                    raise
+                print(f"Batch {batch_id} poll failed, retrying: {e}")
+                results = None
+            if results is not None:
+                return results
+            await asyncio.sleep(self.poll_seconds)
+
+_batch_collector: Optional[BatchCollector] = None
+
+def get_batch_collector() -> BatchCollector:
+    """Process-wide collector, so agents on one worker share batches"""
+    global _batch_collector
+    if _batch_collector is None:
+        _batch_collector = BatchCollector()
+    return _batch_collector
+
+class BatchedProvider(LLMProvider):
+    """Sends a provider's calls through the BatchCollector instead of calling it directly"""
+
+    def __init__(
+        self,
+        provider: LLMProvider,
+        collector: BatchCollector,
+        key_hash: str,
+        on_submit: Optional[OnSubmit] = None,
+        resume: Optional[Dict[str, str]] = None  # {batch_id, custom_id} recorded by on_submit
+    ):
+        self.provider = provider
+        self.collector = collector
+        self.key_hash = key_hash
+        self.on_submit = on_submit
+        self.resume = resume
+        self.name = provider.name
+        self.model = provider.model
+
+    def cost(self, tokens_prompt: int, tokens_completion: int) -> float:
+        return self.provider.cost(tokens_prompt, tokens_completion) * self.provider.batch_discount
+
+    async def complete(self, prompt: str, **kwargs) -> Dict[str, Any]:
+        if self.resume:
+            try:
+                return await self.collector.resume(self.provider, self.resume['batch_id'], self.resume['custom_id'])
+            except ProviderError as e:
+                # Failed or expired batch: nothing was billed for this prompt, send it again
+                print(f"Resuming batch {self.resume['batch_id']} failed, resubmitting: {e}")
+        return await self.collector.complete(self.provider, self.key_hash, prompt, self.on_submit)
@@ -0,0 +1,196 @@
+from typing import Any, Dict, List, Set
+from datetime import datetime, timedelta
+from sqlalchemy import select, delete, exists, func, or_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.agent import Agent, AgentCheckpoint, AgentStatus, CheckpointBlob
+import hashlib
+import json
+import os
+import zlib
+
+# Strings longer than this are moved out of the log row into checkpoint_blobs
+CHECKPOINT_BLOB_THRESHOLD = int(os.getenv("CHECKPOINT_BLOB_THRESHOLD", "4096"))
+# Deltas appended before the log is folded into a snapshot
+CHECKPOINT_COMPACT_EVERY = int(os.getenv("CHECKPOINT_COMPACT_EVERY", "20"))
+CHECKPOINT_COMPRESS_LEVEL = int(os.getenv("CHECKPOINT_COMPRESS_LEVEL", "6"))
+# Failed and killed agents can be resumed from their log for this long;
+# completed ones are swept on the next pass
+CHECKPOINT_RETENTION_DAYS = float(os.getenv("CHECKPOINT_RETENTION_DAYS", "7"))
+CHECKPOINT_SWEEP_BATCH = int(os.getenv("CHECKPOINT_SWEEP_BATCH", "100"))  # Agents per pass
+
+BLOB_REF = '$blob'
+
+def merge_state(state: Dict, delta: Dict) -> Dict:
+    """Apply a delta: nested dicts merge key by key, anything else replaces"""
+    for key, value in delta.items():
+        if isinstance(value, dict) and isinstance(state.get(key), dict):
+            merge_state(state[key], value)
+        else:
+            state[key] = value
+    return state
+
+def encode(value: Any) -> bytes:
+    return zlib.compress(json.dumps(value, separators=(',', ':')).encode(), CHECKPOINT_COMPRESS_LEVEL)
+
+def decode(payload: bytes) -> Any:
+    return json.loads(zlib.decompress(payload))
+
+class CheckpointLog:
+    """Append-only, compressed checkpoint log for one agent.
+
+    Each checkpoint appends only what changed, so its cost tracks the step,
+    not the whole state. Every CHECKPOINT_COMPACT_EVERY deltas the log is
+    folded into a snapshot and the older rows are dropped. Rows are added to
+    the session and commit with the next EventSink flush.
+    """
+
+    def __init__(
+        self,
+        db: AsyncSession,
+        agent_id: str,
+        blob_threshold: int = CHECKPOINT_BLOB_THRESHOLD,
+        compact_every: int = CHECKPOINT_COMPACT_EVERY
+    ):
+        self.db = db
+        self.agent_id = agent_id
+        self.blob_threshold = blob_threshold
+        self.compact_every = compact_every
+
+        self.seq = 0
+        self.deltas_since_snapshot = 0
+        self._stored: Dict = {}  # State as stored, i.e. with blob references
+        self._blobs: Set[str] = set()  # Digests already written for this agent
+
+    async def load(self) -> Dict:
+        """Rebuild state from the latest snapshot plus the deltas after it"""
+        rows = (await self.db.execute(
+            select(AgentCheckpoint.seq, AgentCheckpoint.kind, AgentCheckpoint.payload)
+            .where(AgentCheckpoint.agent_id == self.agent_id)
+            .order_by(AgentCheckpoint.seq)
+        )).all()
+
+        self._stored = {}
+        self.seq = 0
+        self.deltas_since_snapshot = 0
+        for seq, kind, payload in rows:
+            if kind == 'snapshot':
+                self._stored = decode(payload)
+                self.deltas_since_snapshot = 0
+            else:
+                merge_state(self._stored, decode(payload))
+                self.deltas_since_snapshot += 1
+            self.seq = seq
+
+        digests: Set[str] = set()
+        self._collect_refs(self._stored, digests)
+        blobs: Dict[str, str] = {}
+        if digests:
+            for digest, data in await self.db.execute(
+                select(CheckpointBlob.digest, CheckpointBlob.data).where(
+                    CheckpointBlob.agent_id == self.agent_id,
+                    CheckpointBlob.digest.in_(digests)
+                )
+            ):
+                blobs[digest] = zlib.decompress(data).decode()
+        self._blobs = digests
+        return self._resolve(self._stored, blobs)
+
+    async def append(self, delta: Dict):
+        """Record what changed since the last checkpoint"""
+        stored = self._externalize(delta)
+        self.seq += 1
+        self.db.add(AgentCheckpoint(agent_id=self.agent_id, seq=self.seq, kind='delta', payload=encode(stored)))
+        merge_state(self._stored, stored)
+        self.deltas_since_snapshot += 1
+
+        if self.deltas_since_snapshot >= self.compact_every:
+            await self.compact()
+
+    async def compact(self):
+        """Write the current state as a snapshot and drop the rows and blobs it no longer needs"""
+        self.seq += 1
+        self.db.add(AgentCheckpoint(agent_id=self.agent_id, seq=self.seq, kind='snapshot', payload=encode(self._stored)))
+        await self.db.execute(
+            delete(AgentCheckpoint).where(
+                AgentCheckpoint.agent_id == self.agent_id,
+                AgentCheckpoint.seq < self.seq
+            )
+        )
+        # Blobs are per agent, so the snapshot holds every remaining reference
+        live: Set[str] = set()
+        self._collect_refs(self._stored, live)
+        await self.db.execute(
+            delete(CheckpointBlob).where(
+                CheckpointBlob.agent_id == self.agent_id,
+                CheckpointBlob.digest.not_in(live)
+            )
+        )
+        self._blobs = live
+        self.deltas_since_snapshot = 0
+
+    def _externalize(self, value: Any) -> Any:
+        if isinstance(value, dict):
+            return {k: self._externalize(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self._externalize(v) for v in value]
+        if isinstance(value, str) and len(value) > self.blob_threshold:
+            raw = value.encode()
+            digest = hashlib.sha256(raw).hexdigest()
+            if digest not in self._blobs:
+                self.db.add(CheckpointBlob(
+                    agent_id=self.agent_id,
+                    digest=digest,
+                    data=zlib.compress(raw, CHECKPOINT_COMPRESS_LEVEL),
+                    size=len(raw)
+                ))
+                self._blobs.add(digest)
+            return {BLOB_REF: digest}
+        return value
+
+    def _collect_refs(self, value: Any, digests: Set[str]):
+        if isinstance(value, dict):
+            if BLOB_REF in value:
+                digests.add(value[BLOB_REF])
+                return
+            for v in value.values():
+                self._collect_refs(v, digests)
+        elif isinstance(value, list):
+            for v in value:
+                self._collect_refs(v, digests)
+
+    def _resolve(self, value: Any, blobs: Dict[str, str]) -> Any:
+        if isinstance(value, dict):
+            if BLOB_REF in value:
+                return blobs[value[BLOB_REF]]
+            return {k: self._resolve(v, blobs) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self._resolve(v, blobs) for v in value]
+        return value
+
+
+async def sweep_checkpoints(
+    db: AsyncSession,
+    retention: timedelta = timedelta(days=CHECKPOINT_RETENTION_DAYS),
+    limit: int = CHECKPOINT_SWEEP_BATCH
+) -> int:
+    """Drop the checkpoint logs and blobs of finished agents; returns agents swept"""
+    cutoff = datetime.utcnow() - retention
+    agent_ids: List[str] = list(await db.scalars(
+        select(Agent.id).where(
+            or_(
+                Agent.status == AgentStatus.COMPLETED,
+                # Failed agents have no completed_at
+                Agent.status.in_((AgentStatus.FAILED, AgentStatus.KILLED))
+                & (func.coalesce(Agent.completed_at, Agent.started_at, Agent.created_at) < cutoff)
+            ),
+            exists().where(AgentCheckpoint.agent_id == Agent.id)
+        ).limit(limit)
+    ))
+    if not agent_ids:
+        return 0
+    await db.execute(delete(AgentCheckpoint).where(AgentCheckpoint.agent_id.in_(agent_ids)))
+    await db.execute(delete(CheckpointBlob).where(CheckpointBlob.agent_id.in_(agent_ids)))
+    # A resume after this starts the agent over
+    await db.execute(update(Agent).where(Agent.id.in_(agent_ids)).values(checkpoint_data=None))
+    await db.commit()
+    return len(agent_ids)
@@ -0,0 +1,201 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+from datetime import datetime
+from sqlalchemy import select, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.llm_providers import hash_api_key
+from app.models.agent import Agent, AgentEvent, CostRollup
+
+# (agent_id, provider, model, key_hash, bucket_start)
+RollupKey = Tuple[str, str, str, str, datetime]
+
+ROLLUP_GROUP_COLUMNS = {
+    'agent_id': CostRollup.agent_id,
+    'provider': CostRollup.provider,
+    'model': CostRollup.model,
+    'key_hash': CostRollup.key_hash,
+    'bucket': CostRollup.bucket_start,
+}
+
+# Rollups need an INSERT ... ON CONFLICT; elsewhere spend is summed from events
+ROLLUP_INSERTS = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert,
+}
+
+def hour_bucket(ts: datetime) -> datetime:
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+def rollups_supported(db: AsyncSession) -> bool:
+    return db.get_bind().dialect.name in ROLLUP_INSERTS
+
+async def upsert_rollups(db: AsyncSession, rollups: Dict[RollupKey, List[float]]):
+    """Add batched [cost, tokens, calls] deltas onto their rollup rows.
+
+    Runs inside the caller's transaction, so rollups commit atomically with
+    the events they summarize.
+    """
+    if not rollups or not rollups_supported(db):
+        return
+
+    stmt = ROLLUP_INSERTS[db.get_bind().dialect.name](CostRollup).values([
+        {
+            'agent_id': agent_id, 'provider': provider, 'model': model,
+            'key_hash': key_hash, 'bucket_start': bucket_start,
+            'cost_usd': cost, 'tokens': int(tokens), 'calls': int(calls)
+        }
+        for (agent_id, provider, model, key_hash, bucket_start), (cost, tokens, calls)
+        in sorted(rollups.items())  # Stable lock order across writers
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['agent_id', 'provider', 'model', 'key_hash', 'bucket_start'],
+        set_={
+            'cost_usd': CostRollup.cost_usd + stmt.excluded.cost_usd,
+            'tokens': CostRollup.tokens + stmt.excluded.tokens,
+            'calls': CostRollup.calls + stmt.excluded.calls,
+        }
+    )
+    await db.execute(stmt)
+
+async def event_rollups(
+    db: AsyncSession,
+    agent_ids: Optional[List[str]] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+) -> Dict[RollupKey, List[float]]:
+    """The rollup rows the EventSink would have written, rebuilt from events"""
+    query = (
+        select(AgentEvent.agent_id, AgentEvent.timestamp, AgentEvent.cost_usd, AgentEvent.data,
+               Agent.provider, Agent.model, Agent.config)
+        .join(Agent, Agent.id == AgentEvent.agent_id)
+        .where(AgentEvent.cost_usd > 0)
+    )
+    if agent_ids is not None:
+        query = query.where(AgentEvent.agent_id.in_(agent_ids))
+    if start is not None:
+        query = query.where(AgentEvent.timestamp >= hour_bucket(start))
+    if end is not None:
+        query = query.where(AgentEvent.timestamp < end)
+
+    rollups: Dict[RollupKey, List[float]] = {}
+    key_hashes: Dict[str, str] = {}
+    for agent_id, timestamp, cost, data, provider, model, config in await db.execute(query):
+        data = data or {}
+        if agent_id not in key_hashes:
+            key_hashes[agent_id] = hash_api_key((config or {}).get('api_key'))
+        bucket = hour_bucket(timestamp)
+        # Hedge spend belongs to the route that incurred it, as in EventSink.emit
+        hedges = data.get('hedge_costs', ())
+        entries = [(data.get('provider') or provider, data.get('model') or model,
+                    cost - sum(hedge['cost_usd'] for hedge in hedges), data.get('tokens', 0))]
+        entries += [(hedge['provider'], hedge['model'], hedge['cost_usd'], hedge['tokens']) for hedge in hedges]
+        for entry_provider, entry_model, entry_cost, tokens in entries:
+            key = (agent_id, entry_provider, entry_model, key_hashes[agent_id], bucket)
+            totals = rollups.setdefault(key, [0.0, 0, 0])
+            totals[0] += entry_cost
+            totals[1] += tokens
+            totals[2] += 1
+    return rollups
+
+async def backfill_rollups(db: AsyncSession, batch_size: int = 500) -> int:
+    """Write rollups for agents whose spend predates them; returns agents backfilled"""
+    if not rollups_supported(db):
+        return 0
+    agent_ids = list(await db.scalars(
+        select(AgentEvent.agent_id).distinct()
+        .where(AgentEvent.cost_usd > 0)
+        .where(AgentEvent.agent_id.not_in(select(CostRollup.agent_id)))
+    ))
+    for i in range(0, len(agent_ids), batch_size):
+        await upsert_rollups(db, await event_rollups(db, agent_ids[i:i + batch_size]))
+        await db.commit()
+    return len(agent_ids)
+
+class CostService:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_agent_cost(self, agent_id: str) -> float:
+        """Total spend for one agent from its rollup rows, or its events if it has none"""
+        total = await self.db.scalar(
+            select(func.sum(CostRollup.cost_usd)).where(CostRollup.agent_id == agent_id)
+        )
+        if total is None:
+            # Spend from before rollups existed (or a dialect without them)
+            total = await self.db.scalar(
+                select(func.sum(AgentEvent.cost_usd)).where(AgentEvent.agent_id == agent_id)
+            )
+        return total or 0.0
+
+    async def aggregate(
+        self,
+        group_by: Iterable[str] = ('provider', 'model'),
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        filters: Optional[Dict[str, str]] = None
+    ) -> Dict:
+        """Spend grouped by any of agent_id/provider/model/key_hash/bucket"""
+        names = [g for g in group_by if g in ROLLUP_GROUP_COLUMNS]
+        if not rollups_supported(self.db):
+            return await self.aggregate_events(names, start, end, filters)
+        columns = [ROLLUP_GROUP_COLUMNS[g] for g in names]
+
+        query = select(
+            *columns,
+            func.sum(CostRollup.cost_usd),
+            func.sum(CostRollup.tokens),
+            func.sum(CostRollup.calls)
+        )
+        if start is not None:
+            query = query.where(CostRollup.bucket_start >= hour_bucket(start))
+        if end is not None:
+            query = query.where(CostRollup.bucket_start < end)
+        for name, value in (filters or {}).items():
+            if value is not None and name in ROLLUP_GROUP_COLUMNS:
+                query = query.where(ROLLUP_GROUP_COLUMNS[name] == value)
+        if columns:
+            query = query.group_by(*columns).order_by(*columns)
+
+        rows = []
+        total = 0.0
+        for row in await self.db.execute(query):
+            item = {}
+            for name, value in zip(names, row):
+                item[name] = value.isoformat() if name == 'bucket' else value
+            item['cost_usd'] = row[-3] or 0.0
+            item['tokens'] = row[-2] or 0
+            item['calls'] = row[-1] or 0
+            total += item['cost_usd']
+            rows.append(item)
+
+        return {'group_by': names, 'rows': rows, 'total_cost_usd': total}
+
+    async def aggregate_events(
+        self,
+        names: List[str],
+        start: Optional[datetime],
+        end: Optional[datetime],
+        filters: Optional[Dict[str, str]]
+    ) -> Dict:
+        """aggregate() computed from events, for databases without rollups"""
+        fields = list(ROLLUP_GROUP_COLUMNS)
+        filters = {name: value for name, value in (filters or {}).items()
+                   if value is not None and name in ROLLUP_GROUP_COLUMNS}
+        groups: Dict[Tuple, List[float]] = {}
+        for key, (cost, tokens, calls) in (await event_rollups(self.db, start=start, end=end)).items():
+            values = dict(zip(fields, key))
+            if any(values[name] != value for name, value in filters.items()):
+                continue
+            totals = groups.setdefault(tuple(values[name] for name in names), [0.0, 0, 0])
+            totals[0] += cost
+            totals[1] += tokens
+            totals[2] += calls
+
+        rows = []
+        for group in sorted(groups, key=lambda group: tuple(str(value) for value in group)):
+            item = {}
+            for name, value in zip(names, group):
+                item[name] = value.isoformat() if name == 'bucket' else value
+            item['cost_usd'], item['tokens'], item['calls'] = groups[group]
+            rows.append(item)
+        return {'group_by': names, 'rows': rows, 'total_cost_usd': sum(row['cost_usd'] for row in rows)}
@@ -0,0 +1,137 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+import os
+
+# Steps of one agent that may call the provider at the same time
+DAG_MAX_PARALLEL = int(os.getenv("DAG_MAX_PARALLEL", "4"))
+
+DEFAULT_STEP_PROMPT = "Task: {{task}}\n\nPlease complete this task and provide a detailed response."
+
+@dataclass
+class StepNode:
+    id: str
+    prompt: str
+    depends_on: List[str] = field(default_factory=list)
+    number: int = 0  # 1-based position in topological order, used as the event step
+
+class StepGraph:
+    """Agent steps and the dependency edges between them.
+
+    Built from Agent.config["steps"], a list of {id, prompt, depends_on}.
+    Prompts may reference {{task}} and {{<step id>}}; outputs of dependencies
+    that aren't referenced are appended to the prompt. Agents without steps
+    get a single step running the task.
+    """
+
+    def __init__(self, nodes: List[StepNode]):
+        self.nodes: Dict[str, StepNode] = {}
+        for node in nodes:
+            if node.id in self.nodes:
+                raise ValueError(f"Duplicate step id: {node.id}")
+            self.nodes[node.id] = node
+
+        for node in nodes:
+            for dep in node.depends_on:
+                if dep not in self.nodes:
+                    raise ValueError(f"Step {node.id} depends on unknown step {dep}")
+
+        self.order = self._topological_order()
+        for number, node_id in enumerate(self.order, start=1):
+            self.nodes[node_id].number = number
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict]) -> 'StepGraph':
+        steps = (config or {}).get('steps')
+        if not steps:
+            return cls([StepNode(id='main', prompt=DEFAULT_STEP_PROMPT)])
+        return cls([
+            StepNode(
+                id=str(step['id']),
+                prompt=step['prompt'],
+                depends_on=[str(dep) for dep in step.get('depends_on') or []]
+            )
+            for step in steps
+        ])
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def _topological_order(self) -> List[str]:
+        """Kahn's algorithm; keeps config order among independent steps"""
+        remaining = {node_id: len(node.depends_on) for node_id, node in self.nodes.items()}
+        dependents: Dict[str, List[str]] = {node_id: [] for node_id in self.nodes}
+        for node in self.nodes.values():
+            for dep in node.depends_on:
+                dependents[dep].append(node.id)
+
+        ready = [node_id for node_id, count in remaining.items() if count == 0]
+        order = []
+        while ready:
+            node_id = ready.pop(0)
+            order.append(node_id)
+            for dependent in dependents[node_id]:
+                remaining[dependent] -= 1
+                if remaining[dependent] == 0:
+                    ready.append(dependent)
+
+        if len(order) != len(self.nodes):
+            cycle = sorted(node_id for node_id, count in remaining.items() if count > 0)
+            raise ValueError(f"Step dependencies form a cycle: {', '.join(cycle)}")
+        return order
+
+    def ready(self, done: Set[str], started: Set[str]) -> List[StepNode]:
+        """Steps whose dependencies are all done, in topological order"""
+        return [
+            self.nodes[node_id] for node_id in self.order
+            if node_id not in done and node_id not in started
+            and all(dep in done for dep in self.nodes[node_id].depends_on)
+        ]
+
+    def sinks(self) -> List[StepNode]:
+        """Steps nothing depends on; their outputs make up the agent result"""
+        used = {dep for node in self.nodes.values() for dep in node.depends_on}
+        return [self.nodes[node_id] for node_id in self.order if node_id not in used]
+
+    def render_prompt(self, node: StepNode, task: str, outputs: Dict[str, str]) -> str:
+        prompt = node.prompt.replace('{{task}}', task)
+        appended = []
+        for dep in node.depends_on:
+            placeholder = '{{' + dep + '}}'
+            if placeholder in prompt:
+                prompt = prompt.replace(placeholder, outputs[dep])
+            else:
+                appended.append(f"Output of step '{dep}':\n{outputs[dep]}")
+        if appended:
+            prompt = prompt + '\n\n' + '\n\n'.join(appended)
+        return prompt
+
+    def levels(self) -> List[List[str]]:
+        """Step ids grouped by depth (longest chain of dependencies before them)"""
+        depth: Dict[str, int] = {}
+        levels: List[List[str]] = []
+        for node_id in self.order:
+            depth[node_id] = max((depth[dep] + 1 for dep in self.nodes[node_id].depends_on), default=0)
+            if depth[node_id] == len(levels):
+                levels.append([])
+            levels[depth[node_id]].append(node_id)
+        return levels
+
+    def critical_path(self, durations: Dict[str, float]) -> Tuple[float, List[str]]:
+        """Longest dependency chain by step duration, i.e. the best possible wall time"""
+        finish: Dict[str, float] = {}
+        via: Dict[str, Optional[str]] = {}
+        for node_id in self.order:
+            node = self.nodes[node_id]
+            before = max(node.depends_on, key=lambda dep: finish[dep], default=None)
+            finish[node_id] = durations.get(node_id, 0.0) + (finish[before] if before else 0.0)
+            via[node_id] = before
+
+        if not finish:
+            return 0.0, []
+        node_id = max(self.order, key=lambda n: finish[n])
+        length = finish[node_id]
+        path = []
+        while node_id is not None:
+            path.append(node_id)
+            node_id = via[node_id]
+        return length, path[::-1]
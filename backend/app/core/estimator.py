@@ -0,0 +1,258 @@
+from typing import Callable, Dict, List, Optional, Tuple
+from sqlalchemy import select, func
+from app.core.llm_providers import LLMProvider, provider_class
+from app.core.rate_limit import LLM_EXPECTED_COMPLETION_TOKENS
+from app.core.dag import DAG_MAX_PARALLEL, StepGraph
+from app.models.agent import AgentEvent
+import asyncio
+import math
+import os
+import re
+
+try:
+    import tiktoken
+except ImportError:  # Optional: exact counts for OpenAI models
+    tiktoken = None
+
+# Estimates are the low/high quantiles of past calls for the same provider/model
+ESTIMATE_LOW_QUANTILE = float(os.getenv("ESTIMATE_LOW_QUANTILE", "0.1"))
+ESTIMATE_HIGH_QUANTILE = float(os.getenv("ESTIMATE_HIGH_QUANTILE", "0.9"))
+ESTIMATOR_REFRESH_SECONDS = float(os.getenv("ESTIMATOR_REFRESH_SECONDS", "30"))
+ESTIMATOR_WARMUP_EVENTS = int(os.getenv("ESTIMATOR_WARMUP_EVENTS", "50000"))  # History read at startup
+ESTIMATOR_REFRESH_BATCH = int(os.getenv("ESTIMATOR_REFRESH_BATCH", "5000"))
+# Calls seen for a provider/model at which confidence is halfway between 50 and 95
+ESTIMATOR_CONFIDENCE_SAMPLES = int(os.getenv("ESTIMATOR_CONFIDENCE_SAMPLES", "100"))
+
+# Used until a provider/model has history
+DEFAULT_STEP_SECONDS = (5.0, 60.0)
+DEFAULT_COMPLETION_TOKENS = (LLM_EXPECTED_COMPLETION_TOKENS // 4, LLM_EXPECTED_COMPLETION_TOKENS)
+
+# Roughly how BPE tokenizers split text: words, numbers, single symbols
+TOKEN_PATTERN = re.compile(r"[A-Za-z]+|\d{1,3}|[^\sA-Za-z\d]")
+
+# tiktoken encodings loaded at startup by load_encodings(). The first load of
+# each downloads its BPE file (cached under TIKTOKEN_CACHE_DIR), so it never
+# happens on the request path; counts are approximated if it fails
+TOKEN_ENCODINGS = [name for name in os.getenv("TOKEN_ENCODINGS", "cl100k_base,o200k_base").split(",") if name]
+DEFAULT_ENCODING = "cl100k_base"  # For models tiktoken doesn't know
+
+_encodings: Dict[str, object] = {}  # Encoding name -> encoding
+_model_encodings: Dict[str, str] = {}  # Model -> encoding name
+
+def load_encodings(names: List[str] = TOKEN_ENCODINGS) -> List[str]:
+    """Load tiktoken encodings (blocking, run once at startup); returns the loaded names"""
+    if tiktoken is None:
+        return []
+    for name in names:
+        if name in _encodings:
+            continue
+        try:
+            _encodings[name] = tiktoken.get_encoding(name)
+        except Exception as e:
+            print(f"Token encoding {name} unavailable, approximating its counts: {e}")
+    return list(_encodings)
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """Prompt tokens, counted locally (tiktoken when its encoding is loaded, else an approximation)"""
+    if _encodings and model:
+        name = _model_encodings.get(model)
+        if name is None:
+            try:
+                name = tiktoken.encoding_name_for_model(model)
+            except KeyError:
+                name = DEFAULT_ENCODING
+            _model_encodings[model] = name
+        encoding = _encodings.get(name)
+        if encoding is not None:
+            return len(encoding.encode(text))
+    # Long words are split into several tokens
+    return sum(1 + len(piece) // 6 for piece in TOKEN_PATTERN.findall(text))
+
+class QuantileSketch:
+    """Streaming quantiles with bounded relative error.
+
+    Values go into logarithmic buckets (as in DDSketch), so memory grows
+    with the range of values rather than their number, and any quantile is
+    within relative_accuracy of the true one. Quantiles are cached until
+    the next add().
+    """
+
+    def __init__(self, relative_accuracy: float = 0.02):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.buckets: Dict[int, int] = {}
+        self.zeros = 0
+        self.count = 0
+        self._keys: Optional[List[int]] = None
+        self._cache: Dict[float, float] = {}
+
+    def add(self, value: float):
+        if value <= 1e-9:
+            self.zeros += 1
+        else:
+            key = math.ceil(math.log(value) / self.log_gamma)
+            if key not in self.buckets:
+                self.buckets[key] = 0
+                self._keys = None
+            self.buckets[key] += 1
+        self.count += 1
+        self._cache.clear()
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        cached = self._cache.get(q)
+        if cached is not None:
+            return cached
+
+        rank = q * (self.count - 1)
+        value = 0.0
+        if rank >= self.zeros:
+            if self._keys is None:
+                self._keys = sorted(self.buckets)
+            seen = self.zeros
+            for key in self._keys:
+                seen += self.buckets[key]
+                if seen > rank:
+                    value = 2 * self.gamma ** key / (self.gamma + 1)
+                    break
+        self._cache[q] = value
+        return value
+
+class ModelStats:
+    """Sketches of past LLM calls for one provider/model"""
+
+    def __init__(self):
+        self.completion_tokens = QuantileSketch()
+        self.seconds = QuantileSketch()
+
+    @property
+    def count(self) -> int:
+        return self.completion_tokens.count
+
+    def observe(self, completion_tokens: int, seconds: float):
+        self.completion_tokens.add(completion_tokens)
+        self.seconds.add(seconds)
+
+class CostEstimator:
+    """Cost, runtime and confidence for an agent before it runs.
+
+    Prompt tokens are counted locally and priced with the provider's cost();
+    completion tokens and call time come from quantile sketches of past llm_response events per provider/model,
+    kept in memory and refreshed incrementally (refresh() reads only events
+    newer than the last one seen). Estimates never touch the database.
+    """
+
+    def __init__(self):
+        self.stats: Dict[Tuple[str, str], ModelStats] = {}
+        self.last_event_id: Optional[int] = None
+
+    def observe(self, provider: str, model: str, completion_tokens: int, seconds: float):
+        stats = self.stats.get((provider, model))
+        if stats is None:
+            stats = self.stats[(provider, model)] = ModelStats()
+        stats.observe(completion_tokens, seconds)
+
+    def completion_range(self, provider: str, model: str) -> Tuple[float, float]:
+        stats = self.stats.get((provider, model))
+        if stats is None or not stats.count:
+            return DEFAULT_COMPLETION_TOKENS
+        return (stats.completion_tokens.quantile(ESTIMATE_LOW_QUANTILE),
+                stats.completion_tokens.quantile(ESTIMATE_HIGH_QUANTILE))
+
+    def seconds_range(self, provider: str, model: str) -> Tuple[float, float]:
+        stats = self.stats.get((provider, model))
+        if stats is None or not stats.count:
+            return DEFAULT_STEP_SECONDS
+        return (stats.seconds.quantile(ESTIMATE_LOW_QUANTILE),
+                stats.seconds.quantile(ESTIMATE_HIGH_QUANTILE))
+
+    def confidence(self, provider: str, model: str) -> float:
+        stats = self.stats.get((provider, model))
+        samples = stats.count if stats is not None else 0
+        return round(50 + 45 * samples / (samples + ESTIMATOR_CONFIDENCE_SAMPLES), 1)
+
+    def step_cost(self, provider: LLMProvider, prompt: str) -> Tuple[float, float]:
+        """(low, high) USD for one call with this prompt"""
+        prompt_tokens = count_tokens(prompt, provider.model)
+        low, high = self.completion_range(provider.name, provider.model)
+        return provider.cost(prompt_tokens, int(low)), provider.cost(prompt_tokens, int(high))
+
+    def estimate(
+        self,
+        provider: str,
+        model: str,
+        task: str,
+        graph: StepGraph,
+        max_parallel: int = DAG_MAX_PARALLEL
+    ) -> Dict:
+        """Cost and runtime bounds for running `graph`, plus a 0-100 confidence.
+
+        Works from the provider's class, so no client (or SDK import) is needed.
+        """
+        cost = provider_class(provider).cost
+        completion_low, completion_high = self.completion_range(provider, model)
+        seconds_low, seconds_high = self.seconds_range(provider, model)
+
+        cost_low = cost_high = 0.0
+        for node in graph.nodes.values():
+            # Dependency outputs are filled into the prompt when the step runs
+            empty = {dep: '' for dep in node.depends_on}
+            prompt_tokens = count_tokens(graph.render_prompt(node, task, empty), model)
+            deps = len(node.depends_on)
+            cost_low += cost(prompt_tokens + int(deps * completion_low), int(completion_low))
+            cost_high += cost(prompt_tokens + int(deps * completion_high), int(completion_high))
+
+        # Each level of the graph runs in waves of at most max_parallel steps
+        waves = sum(math.ceil(len(level) / max(1, max_parallel)) for level in graph.levels())
+        runtime_low, runtime_high = waves * seconds_low, waves * seconds_high
+        return {
+            'confidence_score': self.confidence(provider, model),
+            'estimated_cost_min': round(cost_low, 4),
+            'estimated_cost_max': round(cost_high, 4),
+            'estimated_runtime_min': int(runtime_low),
+            'estimated_runtime_max': math.ceil(runtime_high)
+        }
+
+    async def refresh(self, db, limit: int = ESTIMATOR_REFRESH_BATCH) -> int:
+        """Fold llm_response events newer than the last seen into the sketches"""
+        if self.last_event_id is None:
+            latest = await db.scalar(select(func.max(AgentEvent.id)))
+            self.last_event_id = max(0, (latest or 0) - ESTIMATOR_WARMUP_EVENTS)
+
+        result = await db.execute(
+            select(AgentEvent.id, AgentEvent.data).where(
+                AgentEvent.id > self.last_event_id,
+                AgentEvent.action == 'llm_response'
+            ).order_by(AgentEvent.id).limit(limit)
+        )
+        rows = result.all()
+        for event_id, data in rows:
+            self.last_event_id = event_id
+            # Events from before the estimator existed lack the provider/model
+            if not data or 'provider' not in data or 'tokens_completion' not in data:
+                continue
+            # Time spent waiting on the rate governor depends on load, not the call
+            seconds = data.get('duration_seconds', 0.0) - data.get('queue_wait_ms', 0) / 1000
+            self.observe(data['provider'], data['model'], data['tokens_completion'], max(0.0, seconds))
+        return len(rows)
+
+    async def run(self, session_factory: Callable, interval: float = ESTIMATOR_REFRESH_SECONDS):
+        """Keep the sketches current until cancelled"""
+        while True:
+            try:
+                async with session_factory() as db:
+                    while await self.refresh(db) >= ESTIMATOR_REFRESH_BATCH:
+                        pass
+            except Exception as e:
+                print(f"Estimator refresh failed: {e}")
+            await asyncio.sleep(interval)
+
+_estimator: Optional[CostEstimator] = None
+
+def get_estimator() -> CostEstimator:
+    """Process-wide estimator shared by the API and executors"""
+    global _estimator
+    if _estimator is None:
+        _estimator = CostEstimator()
+    return _estimator
@@ -0,0 +1,111 @@
+from typing import Any, Dict, Optional, Union
+from datetime import datetime
+import json
+import os
+
+try:
+    import orjson
+except ImportError:  # Optional: several times faster than json
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # Optional: binary WebSocket format
+    msgpack = None
+
+# Strings in live event data longer than this are cut before publishing (the
+# stored event keeps them; the timeline has the full payload)
+EVENT_FIELD_MAX_CHARS = int(os.getenv("EVENT_FIELD_MAX_CHARS", "4096"))
+
+def truncate(value: Any, limit: int = EVENT_FIELD_MAX_CHARS) -> Any:
+    """Copy of `value` with long strings cut to `limit` characters"""
+    if isinstance(value, str):
+        if len(value) > limit:
+            return value[:limit] + f"... [{len(value) - limit} more chars]"
+        return value
+    if isinstance(value, dict):
+        return {k: truncate(v, limit) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [truncate(v, limit) for v in value]
+    return value
+
+def _default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+class EventCodec:
+    """Serializes live event messages for pub/sub and WebSocket frames"""
+
+    name = ''
+    binary = False
+
+    def encode(self, message: Dict) -> Union[str, bytes]:
+        raise NotImplementedError
+
+    def decode(self, data: Union[str, bytes]) -> Dict:
+        raise NotImplementedError
+
+class JSONCodec(EventCodec):
+    name = 'json'
+
+    def encode(self, message: Dict) -> str:
+        if orjson is not None:
+            return orjson.dumps(message, default=_default).decode()
+        return json.dumps(message, separators=(',', ':'), default=_default)
+
+    def decode(self, data: Union[str, bytes]) -> Dict:
+        if orjson is not None:
+            return orjson.loads(data)
+        return json.loads(data)
+
+class MsgPackCodec(EventCodec):
+    name = 'msgpack'
+    binary = True
+
+    def encode(self, message: Dict) -> bytes:
+        return msgpack.packb(message, default=_default)
+
+    def decode(self, data: Union[str, bytes]) -> Dict:
+        return msgpack.unpackb(data)
+
+# Pub/sub always carries JSON; other formats are transcoded once per message
+# by the WebSocket fan-out for the sockets that asked for them
+JSON_CODEC = JSONCodec()
+CODECS: Dict[str, EventCodec] = {'json': JSON_CODEC}
+if msgpack is not None:
+    CODECS['msgpack'] = MsgPackCodec()
+
+def get_codec(name: Optional[str]) -> EventCodec:
+    codec = CODECS.get(name or 'json')
+    if codec is None:
+        raise ValueError(f"Unsupported event format: {name} (available: {', '.join(CODECS)})")
+    return codec
+
+def encode_event(
+    agent_id: str,
+    action: str,
+    status: str,
+    step: Optional[int],
+    data: Optional[Dict],
+    cost: float,
+    timestamp: datetime,
+    event_id: Optional[int] = None
+) -> str:
+    """Live message for an event, encoded once for every viewer.
+
+    Stored events carry their id (the timeline cursor); transient ones
+    (llm_delta) have none.
+    """
+    message = {
+        'agent_id': agent_id,
+        'action': action,
+        'status': status,
+        'step': step,
+        'data': truncate(data) if data else data,
+        'cost': cost,
+        'timestamp': timestamp
+    }
+    if event_id is not None:
+        message['id'] = event_id
+    return JSON_CODEC.encode(message)
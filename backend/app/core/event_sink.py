@@ -0,0 +1,234 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+from datetime import datetime
+from sqlalchemy import insert
+from app.models.agent import AgentEvent
+from app.core.costs import RollupKey, hour_bucket, upsert_rollups
+from app.core.event_codec import encode_event
+from app.core.monitoring import EVENTS_EMITTED, DB_COMMIT_SECONDS, REDIS_PUBLISH_SECONDS
+from app.core.tracing import span
+import asyncio
+import os
+import time
+
+EVENT_SINK_MAX_BATCH = int(os.getenv("EVENT_SINK_MAX_BATCH", "50"))
+EVENT_SINK_MAX_DELAY_MS = int(os.getenv("EVENT_SINK_MAX_DELAY_MS", "250"))
+
+# Recent live messages per agent, kept in a capped Redis Stream so reconnecting
+# sockets can replay what they missed (0 disables); idle streams expire
+AGENT_STREAM_MAXLEN = int(os.getenv("AGENT_STREAM_MAXLEN", "500"))
+AGENT_STREAM_TTL_SECONDS = int(os.getenv("AGENT_STREAM_TTL_SECONDS", "3600"))
+
+def stream_key(agent_id: str) -> str:
+    return f'events:{agent_id}'
+
+class EventSink:
+    """Buffers agent events and writes them in groups.
+
+    Each flush is one multi-row INSERT plus a single commit (which also carries
+    any pending Agent changes on the session and the matching cost rollup
+    updates), followed by one pipelined round trip to Redis for all the
+    pub/sub messages and their entries in the agent's event stream. Messages
+    are encoded after the INSERT so they carry the event id, which is also
+    the stream entry id.
+    """
+
+    def __init__(
+        self,
+        db_session,  # AsyncSession
+        redis_client,
+        max_batch: int = EVENT_SINK_MAX_BATCH,
+        max_delay_ms: int = EVENT_SINK_MAX_DELAY_MS
+    ):
+        self.db = db_session
+        self.redis_client = redis_client
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000.0
+
+        self._rows: List[Dict] = []
+        self._messages: List[Tuple[Any, ...]] = []  # encode_event() arguments
+        self._rollups: Dict[RollupKey, List[float]] = {}
+        self._first_buffered_at: Optional[float] = None
+        # Flushes a batch max_delay after its first event if nothing else does
+        self._timer: Optional[asyncio.Task] = None
+        # Held while flushing. Parallel steps share the session, so anything
+        # else that changes session state takes it too (see AgentExecutor)
+        self.lock = asyncio.Lock()
+        # Called with the publish pipeline after each commit to add its own writes
+        self.on_commit: Optional[Callable] = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._rows)
+
+    async def emit(
+        self,
+        agent_id: str,
+        step: int,
+        action: str,
+        status: str,
+        data: Dict = None,
+        cost: float = 0.0,
+        flush: bool = False,
+        usage: Union[Dict, List[Dict], None] = None
+    ):
+        """Buffer an event; flushes when the batch is full or too old.
+
+        `usage` ({provider, model, key_hash, tokens}) marks an event that spent
+        money and feeds the cost rollups. A list splits the spend across
+        several providers, each entry carrying its share as cost_usd.
+        """
+        now = datetime.utcnow()
+        self._rows.append({
+            'agent_id': agent_id,
+            'step': step,
+            'action': action,
+            'status': status,
+            'data': data or {},
+            'cost_usd': cost,
+            'timestamp': now
+        })
+        self._messages.append((agent_id, action, status, step, data, cost, now))
+
+        for entry in [usage] if isinstance(usage, dict) else usage or ():
+            key = (agent_id, entry['provider'], entry['model'], entry['key_hash'], hour_bucket(now))
+            totals = self._rollups.setdefault(key, [0.0, 0, 0])
+            totals[0] += entry.get('cost_usd', cost)
+            totals[1] += entry.get('tokens', 0)
+            totals[2] += 1
+
+        EVENTS_EMITTED.inc()
+        if self._first_buffered_at is None:
+            self._first_buffered_at = time.monotonic()
+            if not flush and self._timer is None:
+                self._timer = asyncio.create_task(self._flush_later())
+
+        if flush or self._should_flush():
+            await self.flush()
+
+    async def _flush_later(self):
+        # Without this an agent that goes quiet (a long LLM call, a stalled
+        # step) would leave its last events unflushed until its next emit
+        await asyncio.sleep(self.max_delay)
+        self._timer = None
+        try:
+            await self.flush()
+        except Exception as e:
+            # The batch is back in the buffer and flush() re-armed the timer
+            print(f"EventSink timed flush failed, retrying: {e}")
+
+    def _restore(self, rows: List[Dict], messages: List[Tuple[Any, ...]], rollups: Dict[RollupKey, List[float]]):
+        """Put a batch that failed to commit back in front of anything buffered since"""
+        self._rows = rows + self._rows
+        self._messages = messages + self._messages
+        for key, totals in rollups.items():
+            merged = self._rollups.setdefault(key, [0.0, 0, 0])
+            for i, value in enumerate(totals):
+                merged[i] += value
+        if self._rows:
+            self._first_buffered_at = time.monotonic()
+            if self._timer is None:
+                self._timer = asyncio.create_task(self._flush_later())
+
+    async def _write(self, rows: List[Dict], rollups: Dict[RollupKey, List[float]]) -> List[int]:
+        """INSERT the events and rollups and commit; returns the new event ids in order"""
+        event_ids = []
+        try:
+            if rows:
+                result = await self.db.execute(insert(AgentEvent).returning(AgentEvent.id), rows)
+                # Ids are assigned in VALUES order, but RETURNING order isn't
+                # guaranteed (sort_by_parameter_order costs a second pass)
+                event_ids = sorted(result.scalars())
+            await upsert_rollups(self.db, rollups)
+            await self.db.commit()
+        except Exception:
+            await self.db.rollback()
+            raise
+        return event_ids
+
+    async def close(self):
+        """Stop the flush timer and write whatever is still buffered"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._rows or self._rollups:
+            try:
+                await self.flush()
+            finally:
+                # Nobody is left to retry a failed batch: the error goes to the caller
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+
+    async def broadcast(self, agent_id: str, step: int, action: str, status: str, data: Dict = None):
+        """Publish a transient event right away without persisting it"""
+        await self.redis_client.publish(
+            f'agent:{agent_id}',
+            encode_event(agent_id, action, status, step, data, 0.0, datetime.utcnow())
+        )
+
+    def _should_flush(self) -> bool:
+        if len(self._rows) >= self.max_batch:
+            return True
+        return (
+            self._first_buffered_at is not None
+            and time.monotonic() - self._first_buffered_at >= self.max_delay
+        )
+
+    async def flush(self):
+        """Write buffered events in one transaction, then publish them"""
+        # Opened before the lock so time queued behind another step's flush shows
+        with span('events.flush') as flush_span:
+            async with self.lock:
+                rows, messages, rollups = self._rows, self._messages, self._rollups
+                self._rows, self._messages, self._rollups = [], [], {}
+                self._first_buffered_at = None
+                if self._timer is not None and self._timer is not asyncio.current_task():
+                    self._timer.cancel()
+                self._timer = None
+
+                flush_span.set(events=len(rows))
+
+                start = time.perf_counter()
+                with span('db.commit'):
+                    write = asyncio.ensure_future(self._write(rows, rollups))
+                    cancelled = False
+                    # A step cancelled mid-commit (a sibling failed, a kill) would
+                    # leave the shared session unusable: finish the write first
+                    while not write.done():
+                        try:
+                            await asyncio.shield(write)
+                        except asyncio.CancelledError:
+                            cancelled = True
+                        except Exception:
+                            pass  # Raised by write.result() below
+                    if write.exception() is not None:
+                        # Kept for the next flush; the caller decides whether to fail
+                        self._restore(rows, messages, rollups)
+                    if cancelled:
+                        raise asyncio.CancelledError()
+                    event_ids = write.result()
+                DB_COMMIT_SECONDS.observe(time.perf_counter() - start)
+
+                if messages or self.on_commit is not None:
+                    start = time.perf_counter()
+                    streams = set()
+                    with span('redis.publish'):
+                        async with self.redis_client.pipeline(transaction=False) as pipe:
+                            for event_id, args in zip(event_ids, messages):
+                                agent_id = args[0]
+                                message = encode_event(*args, event_id)
+                                pipe.publish(f'agent:{agent_id}', message)
+                                if AGENT_STREAM_MAXLEN:
+                                    pipe.xadd(stream_key(agent_id), {'m': message}, id=f'{event_id}-0',
+                                              maxlen=AGENT_STREAM_MAXLEN, approximate=True)
+                                    streams.add(agent_id)
+                            for agent_id in streams:
+                                pipe.expire(stream_key(agent_id), AGENT_STREAM_TTL_SECONDS)
+                            if self.on_commit is not None:
+                                self.on_commit(pipe)
+                            if len(pipe):
+                                # A failed XADD (e.g. an out-of-order id) must not lose the other writes
+                                for reply in await pipe.execute(raise_on_error=False):
+                                    if isinstance(reply, Exception):
+                                        print(f"EventSink publish error: {reply}")
+                    REDIS_PUBLISH_SECONDS.observe(time.perf_counter() - start)
@@ -1,51 +1,128 @@
-from typing import List, Optional
-from sqlalchemy.orm import Session
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.agent import AgentEvent
-from datetime import datetime, timedelta
+from app.core.costs import CostService
+from app.core.archive import EventArchiver
+from datetime import datetime
+
+# Timeline field -> column; `id` is always returned since it is the cursor
+TIMELINE_COLUMNS = {
+    'timestamp': AgentEvent.timestamp,
+    'action': AgentEvent.action,
+    'status': AgentEvent.status,
+    'step': AgentEvent.step,
+    'data': AgentEvent.data,
+    'cost': AgentEvent.cost_usd,
+}
+MAX_TIMELINE_LIMIT = 500
 
 class EventService:
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         self.db = db
     
-    def get_agent_events(
+    async def get_agent_events(
         self, 
         agent_id: str, 
         limit: int = 100,
         since: Optional[datetime] = None
     ) -> List[AgentEvent]:
         """Get events for an agent"""
-        query = self.db.query(AgentEvent).filter(
+        query = select(AgentEvent).where(
             AgentEvent.agent_id == agent_id
         )
         
         if since:
-            query = query.filter(AgentEvent.timestamp >= since)
+            query = query.where(AgentEvent.timestamp >= since)
         
-        return query.order_by(AgentEvent.timestamp.desc()).limit(limit).all()
+        result = await self.db.execute(
+            query.order_by(AgentEvent.timestamp.desc()).limit(limit)
+        )
+        return list(result.scalars())
     
-    def get_timeline(self, agent_id: str) -> List[dict]:
-        """Get formatted timeline for display"""
-        events = self.get_agent_events(agent_id)
+    async def get_timeline(
+        self,
+        agent_id: str,
+        limit: int = 100,
+        before_id: Optional[int] = None,
+        since_id: Optional[int] = None,
+        fields: Optional[Iterable[str]] = None
+    ) -> Dict:
+        """Get a page of the timeline for display, oldest first.
+
+        Keyset-paginated on (agent_id, id): with no cursor this is the latest
+        page, `before_id` pages back and `since_id` returns only newer events
+        (cheap polling). `fields` limits the columns loaded, e.g. leave out
+        `data` to skip the JSON payloads entirely. Events that were moved to
+        the archive (see EventArchiver) are merged in when the hot table
+        can't fill the page.
+        """
+        limit = max(1, min(limit, MAX_TIMELINE_LIMIT))
+        names = [f for f in (fields or TIMELINE_COLUMNS) if f in TIMELINE_COLUMNS]
+        
+        query = select(AgentEvent.id, *(TIMELINE_COLUMNS[f] for f in names)).where(
+            AgentEvent.agent_id == agent_id
+        )
+        if since_id is not None:
+            query = query.where(AgentEvent.id > since_id).order_by(AgentEvent.id.asc())
+        else:
+            if before_id is not None:
+                query = query.where(AgentEvent.id < before_id)
+            query = query.order_by(AgentEvent.id.desc())
+        
+        # Fetch one extra row to know whether another page exists
+        keys = ['id', *names]
+        rows = [dict(zip(keys, row)) for row in await self.db.execute(query.limit(limit + 1))]
+        if len(rows) <= limit:
+            rows = await self._with_archived(agent_id, rows, keys, limit, before_id, since_id)
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if since_id is None:
+            rows.reverse()  # Chronological order
         
         timeline = []
-        for event in reversed(events):  # Chronological order
-            timeline.append({
-                'timestamp': event.timestamp.isoformat(),
-                'action': event.action,
-                'status': event.status,
-                'step': event.step,
-                'data': event.data,
-                'cost': event.cost_usd
-            })
+        for row in rows:
+            if isinstance(row.get('timestamp'), datetime):
+                row['timestamp'] = row['timestamp'].isoformat()
+            timeline.append(row)
         
-        return timeline
+        return {
+            'timeline': timeline,
+            'has_more': has_more,
+            # Pass as before_id to page back, or as since_id to poll for new events
+            'before_id': timeline[0]['id'] if timeline else before_id,
+            'since_id': timeline[-1]['id'] if timeline else since_id
+        }
     
-    def get_agent_cost(self, agent_id: str) -> float:
-        """Calculate total cost from events"""
-        total = self.db.query(AgentEvent).filter(
-            AgentEvent.agent_id == agent_id
-        ).with_entities(
-            func.sum(AgentEvent.cost_usd)
-        ).scalar()
-        
-        return total or 0.0
\ No newline at end of file
+    async def _with_archived(
+        self,
+        agent_id: str,
+        rows: List[Dict],
+        keys: List[str],
+        limit: int,
+        before_id: Optional[int],
+        since_id: Optional[int]
+    ) -> List[Dict]:
+        """Extend a short page with archived events (all older than hot ones)"""
+        archiver = EventArchiver(self.db)
+        # Usually answered from cache, so polling a live agent costs no extra query
+        bounds = await archiver.bounds(agent_id)
+        if bounds is None:
+            return rows
+        first_id, last_id = bounds
+        if (since_id is not None and since_id >= last_id) or (before_id is not None and before_id <= first_id):
+            return rows
+        # Enough to fill the page, plus one to tell whether there is more;
+        # polling pages start with archived events, backward ones end with them
+        wanted = limit + 1 if since_id is not None else limit + 1 - len(rows)
+        archived = await archiver.load(agent_id, wanted, before_id=before_id, since_id=since_id)
+        if not archived:
+            return rows
+        older = [{k: e.get(k) for k in keys} for e in archived]
+        if since_id is not None:
+            return older + rows
+        return rows + older[::-1]
+    
+    async def get_agent_cost(self, agent_id: str) -> float:
+        """Total cost for an agent (read from the rollups, not a scan of events)"""
+        return await CostService(self.db).get_agent_cost(agent_id)
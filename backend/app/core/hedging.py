@@ -0,0 +1,230 @@
+from collections import deque
+from typing import AsyncIterator, Dict, Any, List, Optional, Tuple
+from app.core.llm_providers import LLMProvider, ProviderError
+from app.core.estimator import count_tokens
+from app.core.monitoring import LLM_COST, LLM_HEDGES
+from app.core.tracing import span
+import asyncio
+import os
+import time
+
+# A backup request is fired once a call has run longer than this quantile of
+# its route's recent latencies (or the default delay until there are enough)
+LLM_HEDGE_QUANTILE = float(os.getenv("LLM_HEDGE_QUANTILE", "0.95"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_HEDGE_WINDOW = int(os.getenv("LLM_HEDGE_WINDOW", "200"))
+LLM_HEDGE_DEFAULT_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY_SECONDS", "30"))
+LLM_HEDGE_MIN_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", "1"))
+# Backups fired for slowness per call; failover after errors is not limited
+LLM_HEDGE_MAX_BACKUPS = int(os.getenv("LLM_HEDGE_MAX_BACKUPS", "1"))
+LLM_ROUTE_EWMA_ALPHA = float(os.getenv("LLM_ROUTE_EWMA_ALPHA", "0.2"))
+
+class RouteStats:
+    """Latency and error EWMAs plus a window of recent latencies for one provider/model"""
+
+    def __init__(self, window: int = LLM_HEDGE_WINDOW):
+        self.latency: Optional[float] = None  # Seconds, successful calls
+        self.errors = 0.0  # Fraction of recent calls that failed
+        self.recent: deque = deque(maxlen=window)
+        self._sorted: Optional[List[float]] = None
+
+    def observe(self, seconds: float, ok: bool, alpha: float = LLM_ROUTE_EWMA_ALPHA):
+        if ok:
+            self.latency = seconds if self.latency is None else self.latency + alpha * (seconds - self.latency)
+            self.recent.append(seconds)
+            self._sorted = None
+        self.errors += alpha * ((0.0 if ok else 1.0) - self.errors)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.recent:
+            return None
+        if self._sorted is None:
+            self._sorted = sorted(self.recent)
+        return self._sorted[min(int(q * len(self._sorted)), len(self._sorted) - 1)]
+
+    def score(self) -> Optional[float]:
+        """Expected seconds to a successful response (None until observed)"""
+        if self.latency is None:
+            return None if self.errors == 0 else float('inf')
+        return self.latency / max(1.0 - self.errors, 0.01)
+
+class LatencyTracker:
+    """Per-route latency/error EWMAs used to order and hedge calls.
+
+    Process-wide: every agent in a worker feeds and reads the same stats,
+    so one agent's slow calls move the others off a degraded endpoint.
+    """
+
+    def __init__(self):
+        self.routes: Dict[Tuple[str, str], RouteStats] = {}
+
+    def stats(self, provider: LLMProvider) -> RouteStats:
+        key = (provider.name, provider.model)
+        stats = self.routes.get(key)
+        if stats is None:
+            stats = self.routes[key] = RouteStats()
+        return stats
+
+    def observe(self, provider: LLMProvider, seconds: float, ok: bool):
+        self.stats(provider).observe(seconds, ok)
+
+    def observe_cancelled(self, provider: LLMProvider, seconds: float):
+        """A call cancelled after `seconds` took at least that long; only counts if it is slower than usual"""
+        stats = self.stats(provider)
+        if stats.latency is not None and seconds > stats.latency:
+            stats.observe(seconds, ok=True)
+
+    def rank(self, providers: List[LLMProvider]) -> List[LLMProvider]:
+        """Providers fastest first; unobserved ones tie with the best, keeping configured order"""
+        scores = [self.stats(p).score() for p in providers]
+        known = [s for s in scores if s is not None]
+        default = min(known) if known else 0.0
+        order = sorted(range(len(providers)), key=lambda i: default if scores[i] is None else scores[i])
+        return [providers[i] for i in order]
+
+    def hedge_delay(self, provider: LLMProvider) -> float:
+        stats = self.stats(provider)
+        if len(stats.recent) < LLM_HEDGE_MIN_SAMPLES:
+            return LLM_HEDGE_DEFAULT_DELAY_SECONDS
+        return max(stats.quantile(LLM_HEDGE_QUANTILE), LLM_HEDGE_MIN_DELAY_SECONDS)
+
+_latency_tracker: Optional[LatencyTracker] = None
+
+def get_latency_tracker() -> LatencyTracker:
+    global _latency_tracker
+    if _latency_tracker is None:
+        _latency_tracker = LatencyTracker()
+    return _latency_tracker
+
+def hedge_cost(provider: LLMProvider, cost: float, tokens: int) -> Dict[str, Any]:
+    return {'provider': provider.name, 'model': provider.model, 'cost_usd': cost, 'tokens': tokens}
+
+class HedgedProvider(LLMProvider):
+    """Routes a call across equivalent providers and hedges slow ones.
+
+    The call goes to the route with the best latency/error EWMA. If it is
+    still running after that route's LLM_HEDGE_QUANTILE latency, a backup
+    goes to the next route; the first response wins and the other call is
+    cancelled. Errors fail over to the next route straight away. Spend on
+    cancelled calls (the prompt, which providers bill once processing
+    starts) is added to cost_usd and reported as hedge_cost_usd, with the
+    per-route breakdown in hedge_costs ({provider, model, cost_usd, tokens}).
+
+    Streams are routed and fail over before their first chunk, but are not
+    hedged: deltas already sent to viewers can't be taken back.
+    """
+
+    def __init__(self, providers: List[LLMProvider], tracker: LatencyTracker, hedge: bool = True):
+        self.providers = providers
+        self.tracker = tracker
+        self.hedge = hedge
+        self.name = providers[0].name
+        self.model = providers[0].model
+
+    def cost(self, tokens_prompt: int, tokens_completion: int) -> float:
+        return self.providers[0].cost(tokens_prompt, tokens_completion)
+
+    async def complete(self, prompt: str, **kwargs) -> Dict[str, Any]:
+        routes = iter(self.tracker.rank(self.providers))
+        remaining = len(self.providers)
+        pending: Dict[asyncio.Task, Tuple[LLMProvider, float]] = {}
+        first: Optional[LLMProvider] = None
+        error: Optional[ProviderError] = None
+        backups = 0
+        deadline = 0.0
+
+        async def attempt(provider: LLMProvider, reason: str) -> Dict[str, Any]:
+            # Each route gets its own span; a cancelled loser shows error=CancelledError
+            with span('llm.attempt', provider=provider.name, model=provider.model, reason=reason):
+                return await provider.complete(prompt, **kwargs)
+
+        def launch(reason: Optional[str] = None):
+            nonlocal remaining, first, deadline
+            provider = next(routes)
+            remaining -= 1
+            first = first or provider
+            started = time.monotonic()
+            pending[asyncio.create_task(attempt(provider, reason or 'primary'))] = (provider, started)
+            deadline = started + self.tracker.hedge_delay(provider)
+            if reason:
+                LLM_HEDGES.labels(provider.name, provider.model, reason).inc()
+
+        launch()
+        try:
+            while pending:
+                timeout = None
+                if self.hedge and remaining and backups < LLM_HEDGE_MAX_BACKUPS:
+                    timeout = max(0.0, deadline - time.monotonic())
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    backups += 1
+                    launch('hedge')
+                    continue
+
+                winner: Optional[Dict[str, Any]] = None
+                winner_provider: Optional[LLMProvider] = None
+                hedge_costs: List[Dict[str, Any]] = []
+                for task in done:
+                    provider, started = pending.pop(task)
+                    try:
+                        result = task.result()
+                    except ProviderError as e:
+                        self.tracker.observe(provider, time.monotonic() - started, ok=False)
+                        error = error or e
+                        continue
+                    self.tracker.observe(provider, time.monotonic() - started, ok=True)
+                    if winner is None:
+                        winner, winner_provider = result, provider
+                    else:
+                        # Both finished in the same tick: the second is paid for in full
+                        hedge_costs.append(hedge_cost(provider, result['cost_usd'], result['tokens_total']))
+                        LLM_COST.labels(provider.name, provider.model).inc(result['cost_usd'])
+
+                if winner is None:
+                    if remaining and not pending:
+                        launch('failover')
+                    continue
+
+                for task, (provider, started) in pending.items():
+                    task.cancel()
+                    self.tracker.observe_cancelled(provider, time.monotonic() - started)
+                    tokens = count_tokens(prompt, provider.model)
+                    spent = provider.cost(tokens, 0)
+                    LLM_COST.labels(provider.name, provider.model).inc(spent)
+                    hedge_costs.append(hedge_cost(provider, spent, tokens))
+                pending.clear()
+
+                if winner_provider is not first:
+                    LLM_HEDGES.labels(winner_provider.name, winner_provider.model, 'won').inc()
+                if not hedge_costs:
+                    return winner
+                extra_cost = sum(entry['cost_usd'] for entry in hedge_costs)
+                return {
+                    **winner,
+                    'cost_usd': winner['cost_usd'] + extra_cost,
+                    'hedge_cost_usd': extra_cost,
+                    'hedge_costs': hedge_costs
+                }
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def stream(self, prompt: str, **kwargs) -> AsyncIterator[Dict[str, Any]]:
+        routes = self.tracker.rank(self.providers)
+        for i, provider in enumerate(routes):
+            if i:
+                LLM_HEDGES.labels(provider.name, provider.model, 'failover').inc()
+            started = time.monotonic()
+            streaming = False
+            try:
+                async for chunk in provider.stream(prompt, **kwargs):
+                    if chunk['type'] == 'result':
+                        self.tracker.observe(provider, time.monotonic() - started, ok=True)
+                    streaming = True
+                    yield chunk
+                return
+            except ProviderError:
+                self.tracker.observe(provider, time.monotonic() - started, ok=False)
+                if streaming or i == len(routes) - 1:
+                    raise
@@ -0,0 +1,203 @@
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, Any, Optional, Tuple
+from app.core.llm_providers import LLMProvider
+from app.core.tracing import span
+import hashlib
+import json
+import os
+import time
+import weakref
+import zlib
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "false").lower() == "true"
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", "86400"))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+LLM_CACHE_MAX_ENTRY_BYTES = int(os.getenv("LLM_CACHE_MAX_ENTRY_BYTES", str(512 * 1024)))
+
+def cache_key(provider: str, model: str, prompt: str, kwargs: Dict) -> str:
+    """Cache key covering everything that changes the completion"""
+    raw = json.dumps([provider, model, prompt, kwargs], sort_keys=True, default=str)
+    return "llmcache:" + hashlib.sha256(raw.encode()).hexdigest()
+
+class ResponseCache:
+    """Two-tier completion cache.
+
+    The in-process tier is an LRU bounded by total encoded size; the shared
+    tier is Redis with a TTL per entry (pair it with an allkeys-lru
+    maxmemory-policy to bound it by size too). Entries larger than
+    LLM_CACHE_MAX_ENTRY_BYTES are never cached.
+    """
+
+    def __init__(
+        self,
+        redis_client=None,  # redis.asyncio client
+        max_bytes: int = LLM_CACHE_MAX_BYTES,
+        ttl_seconds: int = LLM_CACHE_TTL_SECONDS,
+        max_entry_bytes: int = LLM_CACHE_MAX_ENTRY_BYTES
+    ):
+        self.redis_client = redis_client
+        self.max_bytes = max_bytes
+        self.ttl = ttl_seconds
+        self.max_entry_bytes = max_entry_bytes
+
+        # key -> (encoded entry, expires_at)
+        self._local: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._local_bytes = 0
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._local.get(key)
+        if entry is not None:
+            encoded, expires_at = entry
+            if expires_at > time.time():
+                self._local.move_to_end(key)
+                return json.loads(encoded)
+            self._drop_local(key)
+
+        if self.redis_client is None:
+            return None
+        encoded = await self.redis_client.get(key)
+        if encoded is None:
+            return None
+        self._store_local(key, encoded)
+        return json.loads(encoded)
+
+    async def set(self, key: str, value: Dict[str, Any]):
+        encoded = json.dumps(value)
+        if len(encoded) > self.max_entry_bytes:
+            return
+        self._store_local(key, encoded)
+        if self.redis_client is not None:
+            await self.redis_client.set(key, encoded, ex=self.ttl)
+
+    def _store_local(self, key: str, encoded: str):
+        self._drop_local(key)
+        self._local[key] = (encoded, time.time() + self.ttl)
+        self._local_bytes += len(encoded)
+        while self._local_bytes > self.max_bytes and self._local:
+            oldest = next(iter(self._local))
+            self._drop_local(oldest)
+
+    def _drop_local(self, key: str):
+        entry = self._local.pop(key, None)
+        if entry is not None:
+            self._local_bytes -= len(entry[0])
+
+# One cache per Redis client (as for the status cache), so the in-memory tier
+# is shared by all agents of a process but never fronts a different server
+_response_caches: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_local_response_cache: Optional[ResponseCache] = None  # Without Redis
+
+def get_response_cache(redis_client=None) -> ResponseCache:
+    """Shared cache for this Redis client (in-process only for None)"""
+    global _local_response_cache
+    if redis_client is None:
+        if _local_response_cache is None:
+            _local_response_cache = ResponseCache()
+        return _local_response_cache
+    cache = _response_caches.get(redis_client)
+    if cache is None:
+        cache = _response_caches[redis_client] = ResponseCache(redis_client)
+    return cache
+
+class CachedProvider(LLMProvider):
+    """Wraps a provider and serves repeated prompts from a ResponseCache.
+
+    Hits come back with cost_usd=0 and cached=True, plus the cost and latency
+    of the original call as saved_cost_usd / saved_ms. With a PromptIndex
+    and a similarity threshold, an exact miss falls back to the response of
+    the most similar cached prompt (reported as similarity).
+    """
+
+    def __init__(
+        self,
+        provider: LLMProvider,
+        cache: ResponseCache,
+        index=None,  # PromptIndex
+        similarity: Optional[float] = None
+    ):
+        self.provider = provider
+        self.cache = cache
+        self.index = index if similarity else None
+        self.similarity = similarity
+        self.name = provider.name
+        self.model = provider.model
+
+    def cost(self, tokens_prompt: int, tokens_completion: int) -> float:
+        return self.provider.cost(tokens_prompt, tokens_completion)
+
+    def namespace(self, kwargs: Dict) -> int:
+        """Near-duplicates only match within the same provider, model and options"""
+        return zlib.crc32(cache_key(self.name, self.model, "", kwargs).encode())
+
+    async def lookup(self, key: str, prompt: str, kwargs: Dict) -> Optional[Dict[str, Any]]:
+        with span("cache.lookup") as lookup_span:
+            hit = await self.find(key, prompt, kwargs)
+            lookup_span.set(hit=hit is not None)
+            if hit is not None and "similarity" in hit:
+                lookup_span.set(similarity=hit["similarity"])
+        return hit
+
+    async def find(self, key: str, prompt: str, kwargs: Dict) -> Optional[Dict[str, Any]]:
+        hit = await self.cache.get(key)
+        if hit is not None:
+            return self._as_hit(hit)
+        if self.index is None:
+            return None
+
+        match = self.index.lookup(self.namespace(kwargs), prompt, self.similarity)
+        if match is None:
+            return None
+        similar_key, similarity = match
+        hit = await self.cache.get(similar_key)
+        if hit is None:
+            return None
+        return {**self._as_hit(hit), "similarity": round(similarity, 3)}
+
+    async def store(self, key: str, prompt: str, kwargs: Dict, result: Dict[str, Any], duration_ms: int):
+        entry = {k: v for k, v in result.items() if k not in ("hedge_cost_usd", "hedge_costs")}
+        # A hit saves the answer, not the duplicate spend of a hedged call
+        entry["cost_usd"] = result["cost_usd"] - result.get("hedge_cost_usd", 0.0)
+        entry["duration_ms"] = duration_ms
+        await self.cache.set(key, entry)
+        if self.index is not None:
+            self.index.add(self.namespace(kwargs), prompt, key)
+
+    async def complete(self, prompt: str, **kwargs) -> Dict[str, Any]:
+        key = cache_key(self.name, self.model, prompt, kwargs)
+
+        hit = await self.lookup(key, prompt, kwargs)
+        if hit is not None:
+            return hit
+
+        start_time = time.time()
+        result = await self.provider.complete(prompt, **kwargs)
+        duration_ms = int((time.time() - start_time) * 1000)
+
+        await self.store(key, prompt, kwargs, result, duration_ms)
+        return result
+
+    async def stream(self, prompt: str, **kwargs) -> AsyncIterator[Dict[str, Any]]:
+        key = cache_key(self.name, self.model, prompt, kwargs)
+
+        hit = await self.lookup(key, prompt, kwargs)
+        if hit is not None:
+            yield {"type": "delta", "text": hit["content"]}
+            yield {"type": "result", **hit}
+            return
+
+        start_time = time.time()
+        async for chunk in self.provider.stream(prompt, **kwargs):
+            if chunk["type"] == "result":
+                result = {k: v for k, v in chunk.items() if k != "type"}
+                duration_ms = int((time.time() - start_time) * 1000)
+                await self.store(key, prompt, kwargs, result, duration_ms)
+            yield chunk
+
+    def _as_hit(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            **entry,
+            "cost_usd": 0.0,
+            "cached": True,
+            "saved_cost_usd": entry["cost_usd"],
+            "saved_ms": entry.get("duration_ms", 0)
+        }
@@ -1,20 +1,119 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional
-import openai
-import anthropic
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, Any, Optional, Tuple, Type
+import hashlib
+import importlib
+import json
+import time
 import os
 
+# Keep-alive HTTP pool shared by all clients of a provider
+LLM_POOL_MAX_CONNECTIONS = int(os.getenv("LLM_POOL_MAX_CONNECTIONS", "100"))
+LLM_POOL_MAX_KEEPALIVE = int(os.getenv("LLM_POOL_MAX_KEEPALIVE", "20"))
+LLM_POOL_KEEPALIVE_EXPIRY = float(os.getenv("LLM_POOL_KEEPALIVE_EXPIRY", "30"))
+LLM_HTTP_TIMEOUT = float(os.getenv("LLM_HTTP_TIMEOUT", "600"))
+
+# Provider client cache
+PROVIDER_CACHE_SIZE = int(os.getenv("PROVIDER_CACHE_SIZE", "256"))
+PROVIDER_IDLE_TTL_SECONDS = float(os.getenv("PROVIDER_IDLE_TTL_SECONDS", "600"))
+
+DEFAULT_MODELS = {
+    "openai": "gpt-4",
+    "anthropic": "claude-3-5-sonnet-20241022",
+}
+
+class ProviderError(Exception):
+    """A failed provider call, with enough detail to decide on a retry"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None,
+                 retryable: bool = False, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+    @classmethod
+    def wrap(cls, prefix: str, error: Exception, sdk) -> "ProviderError":
+        """Classify an SDK exception: 429, 5xx and connection errors are retryable"""
+        status_code = getattr(error, "status_code", None)
+        retry_after = None
+        response = getattr(error, "response", None)
+        if response is not None:
+            try:
+                retry_after = float(response.headers.get("retry-after"))
+            except (TypeError, ValueError):
+                pass
+        retryable = (
+            status_code == 429
+            or (status_code is not None and status_code >= 500)
+            or isinstance(error, sdk.APIConnectionError)
+        )
+        return cls(f"{prefix} error: {str(error)}", status_code, retryable, retry_after)
+
 class LLMProvider(ABC):
+    name = ""
+    model = ""
+    supports_batch = False
+    batch_discount = 1.0  # Batch price as a fraction of the synchronous price
+
     @abstractmethod
     async def complete(self, prompt: str, **kwargs) -> Dict[str, Any]:
         """Execute completion and return response with metadata"""
         pass
 
+    async def stream(self, prompt: str, **kwargs) -> AsyncIterator[Dict[str, Any]]:
+        """Yield {"type": "delta", "text": ...} chunks as tokens arrive, then a
+        final {"type": "result", ...} with the same fields as complete().
+
+        Providers without native streaming emit the whole response as one delta.
+        """
+        result = await self.complete(prompt, **kwargs)
+        yield {"type": "delta", "text": result["content"]}
+        yield {"type": "result", **result}
+
+    async def submit_batch(self, requests: Dict[str, str]) -> str:
+        """Send {custom_id: prompt} to the provider's asynchronous batch API; returns the batch id"""
+        raise NotImplementedError(f"{self.name} has no batch API")
+
+    async def batch_results(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        """None while the batch runs, then {custom_id: result dict or ProviderError}"""
+        raise NotImplementedError(f"{self.name} has no batch API")
+
+    @classmethod
+    def cost(cls, tokens_prompt: int, tokens_completion: int) -> float:
+        """USD cost of a call with the given token counts"""
+        return 0.0
+
+    def build_result(self, content: str, tokens_prompt: int, tokens_completion: int) -> Dict[str, Any]:
+        """Response dict returned by complete() and the final stream() chunk"""
+        return {
+            "content": content,
+            "tokens_prompt": tokens_prompt,
+            "tokens_completion": tokens_completion,
+            "tokens_total": tokens_prompt + tokens_completion,
+            "cost_usd": self.cost(tokens_prompt, tokens_completion),
+            "model": self.model,
+            "provider": self.name
+        }
+
 class OpenAIProvider(LLMProvider):
-    def __init__(self, api_key: Optional[str] = None, model: str = "gpt-4"):
+    name = "openai"
+    supports_batch = True
+    batch_discount = 0.5
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        model: str = "gpt-4",
+        http_client=None
+    ):
         self.api_key = api_key or os.getenv("OPENAI_API_KEY")
         self.model = model
-        self.client = openai.AsyncOpenAI(api_key=self.api_key)
+        # Imported on first use: the SDKs take a while to import
+        import openai
+        self.sdk = openai
+        # Retries are handled by the rate governor, not the SDK
+        self.client = openai.AsyncOpenAI(api_key=self.api_key, http_client=http_client, max_retries=0)
     
     async def complete(self, prompt: str, **kwargs) -> Dict[str, Any]:
         try:
@@ -26,27 +125,117 @@ class OpenAIProvider(LLMProvider):
             
             usage = response.usage
             
-            # Calculate cost (simplified - use actual pricing)
-            cost = (usage.prompt_tokens * 0.00003 + 
-                   usage.completion_tokens * 0.00006)
+            return self.build_result(
+                response.choices[0].message.content,
+                usage.prompt_tokens,
+                usage.completion_tokens
+            )
+        except Exception as e:
+            raise ProviderError.wrap("OpenAI", e, self.sdk)
+    
+    async def stream(self, prompt: str, **kwargs) -> AsyncIterator[Dict[str, Any]]:
+        try:
+            response = await self.client.chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}],
+                stream=True,
+                stream_options={"include_usage": True},
+                **kwargs
+            )
             
-            return {
-                "content": response.choices[0].message.content,
-                "tokens_prompt": usage.prompt_tokens,
-                "tokens_completion": usage.completion_tokens,
-                "tokens_total": usage.total_tokens,
-                "cost_usd": cost,
-                "model": self.model,
-                "provider": "openai"
+            parts = []
+            usage = None
+            async for chunk in response:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                    yield {"type": "delta", "text": chunk.choices[0].delta.content}
+                if chunk.usage:
+                    usage = chunk.usage
+            
+            yield {
+                "type": "result",
+                **self.build_result(
+                    "".join(parts),
+                    usage.prompt_tokens if usage else 0,
+                    usage.completion_tokens if usage else 0
+                )
             }
         except Exception as e:
-            raise Exception(f"OpenAI error: {str(e)}")
+            raise ProviderError.wrap("OpenAI", e, self.sdk)
+    
+    async def submit_batch(self, requests: Dict[str, str]) -> str:
+        lines = [
+            json.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {"model": self.model, "messages": [{"role": "user", "content": prompt}]}
+            })
+            for custom_id, prompt in requests.items()
+        ]
+        try:
+            upload = await self.client.files.create(
+                file=("batch.jsonl", "\n".join(lines).encode()),
+                purpose="batch"
+            )
+            batch = await self.client.batches.create(
+                input_file_id=upload.id,
+                endpoint="/v1/chat/completions",
+                completion_window="24h"
+            )
+            return batch.id
+        except Exception as e:
+            raise ProviderError.wrap("OpenAI", e, self.sdk)
+    
+    async def batch_results(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            batch = await self.client.batches.retrieve(batch_id)
+            if batch.status in ("validating", "in_progress", "finalizing", "cancelling"):
+                return None
+            
+            results: Dict[str, Any] = {}
+            if batch.output_file_id:
+                output = await self.client.files.content(batch.output_file_id)
+                for line in output.text.splitlines():
+                    item = json.loads(line)
+                    response = item.get("response") or {}
+                    if response.get("status_code") == 200:
+                        body = response["body"]
+                        results[item["custom_id"]] = self.build_result(
+                            body["choices"][0]["message"]["content"],
+                            body["usage"]["prompt_tokens"],
+                            body["usage"]["completion_tokens"]
+                        )
+                    else:
+                        results[item["custom_id"]] = ProviderError(
+                            f"OpenAI batch error: {item.get('error') or response.get('body')}",
+                            response.get("status_code")
+                        )
+            return results
+        except Exception as e:
+            raise ProviderError.wrap("OpenAI", e, self.sdk)
+    
+    @classmethod
+    def cost(cls, tokens_prompt: int, tokens_completion: int) -> float:
+        # Simplified - use actual pricing
+        return tokens_prompt * 0.00003 + tokens_completion * 0.00006
 
 class AnthropicProvider(LLMProvider):
-    def __init__(self, api_key: Optional[str] = None, model: str = "claude-3-5-sonnet-20241022"):
+    name = "anthropic"
+    supports_batch = True
+    batch_discount = 0.5
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        model: str = "claude-3-5-sonnet-20241022",
+        http_client=None
+    ):
         self.api_key = api_key or os.getenv("ANTHROPIC_API_KEY")
         self.model = model
-        self.client = anthropic.AsyncAnthropic(api_key=self.api_key)
+        import anthropic
+        self.sdk = anthropic
+        self.client = anthropic.AsyncAnthropic(api_key=self.api_key, http_client=http_client, max_retries=0)
     
     async def complete(self, prompt: str, **kwargs) -> Dict[str, Any]:
         try:
@@ -59,27 +248,187 @@ class AnthropicProvider(LLMProvider):
             
             usage = response.usage
             
-            # Calculate cost (simplified)
-            cost = (usage.input_tokens * 0.000003 + 
-                   usage.output_tokens * 0.000015)
+            return self.build_result(
+                response.content[0].text,
+                usage.input_tokens,
+                usage.output_tokens
+            )
+        except Exception as e:
+            raise ProviderError.wrap("Anthropic", e, self.sdk)
+    
+    async def stream(self, prompt: str, **kwargs) -> AsyncIterator[Dict[str, Any]]:
+        try:
+            async with self.client.messages.stream(
+                model=self.model,
+                max_tokens=4096,
+                messages=[{"role": "user", "content": prompt}],
+                **kwargs
+            ) as stream:
+                async for text in stream.text_stream:
+                    yield {"type": "delta", "text": text}
+                message = await stream.get_final_message()
             
-            return {
-                "content": response.content[0].text,
-                "tokens_prompt": usage.input_tokens,
-                "tokens_completion": usage.output_tokens,
-                "tokens_total": usage.input_tokens + usage.output_tokens,
-                "cost_usd": cost,
-                "model": self.model,
-                "provider": "anthropic"
+            yield {
+                "type": "result",
+                **self.build_result(
+                    "".join(block.text for block in message.content if block.type == "text"),
+                    message.usage.input_tokens,
+                    message.usage.output_tokens
+                )
             }
         except Exception as e:
-            raise Exception(f"Anthropic error: {str(e)}")
+            raise ProviderError.wrap("Anthropic", e, self.sdk)
+    
+    async def submit_batch(self, requests: Dict[str, str]) -> str:
+        try:
+            batch = await self.client.messages.batches.create(requests=[
+                {
+                    "custom_id": custom_id,
+                    "params": {
+                        "model": self.model,
+                        "max_tokens": 4096,
+                        "messages": [{"role": "user", "content": prompt}]
+                    }
+                }
+                for custom_id, prompt in requests.items()
+            ])
+            return batch.id
+        except Exception as e:
+            raise ProviderError.wrap("Anthropic", e, self.sdk)
+    
+    async def batch_results(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            batch = await self.client.messages.batches.retrieve(batch_id)
+            if batch.processing_status != "ended":
+                return None
+            
+            results: Dict[str, Any] = {}
+            async for entry in await self.client.messages.batches.results(batch_id):
+                if entry.result.type == "succeeded":
+                    message = entry.result.message
+                    results[entry.custom_id] = self.build_result(
+                        "".join(block.text for block in message.content if block.type == "text"),
+                        message.usage.input_tokens,
+                        message.usage.output_tokens
+                    )
+                else:
+                    results[entry.custom_id] = ProviderError(f"Anthropic batch request {entry.result.type}")
+            return results
+        except Exception as e:
+            raise ProviderError.wrap("Anthropic", e, self.sdk)
+    
+    @classmethod
+    def cost(cls, tokens_prompt: int, tokens_completion: int) -> float:
+        # Simplified
+        return tokens_prompt * 0.000003 + tokens_completion * 0.000015
+
+PROVIDER_CLASSES = {
+    "openai": OpenAIProvider,
+    "anthropic": AnthropicProvider,
+}
+
+# SDK module per provider, imported on first use
+PROVIDER_SDKS = {
+    "openai": "openai",
+    "anthropic": "anthropic",
+}
+
+def provider_class(provider: str) -> Type[LLMProvider]:
+    """Class registered for a provider name, without building a client; ValueError if unknown"""
+    if provider not in PROVIDER_CLASSES:
+        raise ValueError(f"Unknown provider: {provider}")
+    cls = PROVIDER_CLASSES[provider]
+    # Registered with preset options (functools.partial)
+    return getattr(cls, 'func', cls)
+
+def hash_api_key(api_key: Optional[str]) -> str:
+    """Stable, non-reversible identifier for an API key"""
+    return hashlib.sha256((api_key or "").encode()).hexdigest()[:16]
+
+def build_http_client(sdk):
+    """Pooled async HTTP client of the flavour the given SDK expects"""
+    limits_cls = type(sdk.DEFAULT_CONNECTION_LIMITS)
+    return sdk.DefaultAsyncHttpxClient(
+        limits=limits_cls(
+            max_connections=LLM_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=LLM_POOL_KEEPALIVE_EXPIRY
+        ),
+        timeout=LLM_HTTP_TIMEOUT
+    )
+
+class ProviderRegistry:
+    """Process-wide cache of provider clients.
+
+    Clients are keyed by (provider, hashed api key, model), evicted LRU-first
+    once the cache is full or after sitting idle, and every client of a given
+    provider shares one keep-alive connection pool, so repeated calls skip
+    connection setup and the TLS handshake.
+    """
+
+    def __init__(
+        self,
+        max_size: int = PROVIDER_CACHE_SIZE,
+        idle_ttl_seconds: float = PROVIDER_IDLE_TTL_SECONDS
+    ):
+        self.max_size = max_size
+        self.idle_ttl = idle_ttl_seconds
+        self._providers: "OrderedDict[Tuple[str, str, str], Tuple[LLMProvider, float]]" = OrderedDict()
+        self._http_clients: Dict[str, Any] = {}
+
+    def http_client(self, provider: str):
+        if provider not in PROVIDER_SDKS:
+            return None
+        client = self._http_clients.get(provider)
+        if client is None or client.is_closed:
+            client = build_http_client(importlib.import_module(PROVIDER_SDKS[provider]))
+            self._http_clients[provider] = client
+        return client
+
+    def __len__(self) -> int:
+        return len(self._providers)
+
+    def get(self, provider: str, api_key: Optional[str] = None, model: Optional[str] = None) -> LLMProvider:
+        """Return a cached client, building one on first use"""
+        if provider not in PROVIDER_CLASSES:
+            raise ValueError(f"Unknown provider: {provider}")
+        model = model or DEFAULT_MODELS.get(provider, "")
+        key = (provider, hash_api_key(api_key), model)
+        now = time.monotonic()
+
+        self._evict_idle(now)
+
+        entry = self._providers.pop(key, None)
+        if entry is not None:
+            instance = entry[0]
+        else:
+            instance = PROVIDER_CLASSES[provider](
+                api_key=api_key, model=model, http_client=self.http_client(provider)
+            )
+        self._providers[key] = (instance, now)
+
+        while len(self._providers) > self.max_size:
+            self._providers.popitem(last=False)
+
+        return instance
+
+    def _evict_idle(self, now: float):
+        # Entries are in last-used order, so stop at the first fresh one
+        while self._providers:
+            key, (_, last_used) = next(iter(self._providers.items()))
+            if now - last_used < self.idle_ttl:
+                break
+            del self._providers[key]
+
+    async def aclose(self):
+        """Drop cached clients and close the shared connection pools"""
+        self._providers.clear()
+        clients, self._http_clients = self._http_clients, {}
+        for client in clients.values():
+            await client.aclose()
+
+provider_registry = ProviderRegistry()
 
 def get_provider(provider: str, api_key: Optional[str] = None, model: Optional[str] = None) -> LLMProvider:
-    """Factory to get LLM provider"""
-    if provider == "openai":
-        return OpenAIProvider(api_key=api_key, model=model or "gpt-4")
-    elif provider == "anthropic":
-        return AnthropicProvider(api_key=api_key, model=model or "claude-3-5-sonnet-20241022")
-    else:
-        raise ValueError(f"Unknown provider: {provider}")
\ No newline at end of file
+    """Factory to get LLM provider (cached, see ProviderRegistry)"""
+    return provider_registry.get(provider, api_key=api_key, model=model)
@@ -0,0 +1,38 @@
+from typing import Dict, List, Tuple
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+# Changes to tables that existed before, which create_all leaves alone.
+# (description, {dialect: statements}); every statement is idempotent, so the
+# whole list runs on each upgrade and a dialect without an entry has nothing to do.
+MIGRATIONS: List[Tuple[str, Dict[str, List[str]]]] = [
+    ("agentstatus enum gains KILLED", {
+        # SQLite stores the enum as plain VARCHAR
+        'postgresql': ["ALTER TYPE agentstatus ADD VALUE IF NOT EXISTS 'KILLED'"],
+    }),
+    ("agent_events: (agent_id, id) index replaces the agent_id one", {
+        # CONCURRENTLY keeps the table writable while a large index builds
+        'postgresql': [
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_agent_events_agent_id_id ON agent_events (agent_id, id)",
+            "DROP INDEX CONCURRENTLY IF EXISTS ix_agent_events_agent_id",
+        ],
+        'sqlite': [
+            "CREATE INDEX IF NOT EXISTS ix_agent_events_agent_id_id ON agent_events (agent_id, id)",
+            "DROP INDEX IF EXISTS ix_agent_events_agent_id",
+        ],
+    }),
+]
+
+async def migrate(engine: AsyncEngine) -> List[str]:
+    """Apply MIGRATIONS for the engine's dialect; returns the descriptions run"""
+    applied = []
+    # Outside a transaction: Postgres won't use a new enum value in the
+    # transaction that added it
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        for description, statements in MIGRATIONS:
+            for statement in statements.get(engine.dialect.name, []):
+                await conn.execute(text(statement))
+            if engine.dialect.name in statements:
+                applied.append(description)
+    return applied
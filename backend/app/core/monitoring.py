@@ -0,0 +1,253 @@
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from bisect import bisect_left
+import asyncio
+import os
+
+# Port for the worker's /metrics listener (0 disables it); the API serves /metrics itself
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "9100"))
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+def escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+class Metric:
+    """Base for metrics with optional labels.
+
+    Hot paths should hold on to labels(...) children; an update is then a
+    single float add (plus a bisect for histograms), cheap enough to call
+    for every event and every LLM call.
+    """
+
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def labels(self, *values):
+        if not values:
+            return self._default()
+        key = tuple(map(str, values))
+        child = self._children.get(key)
+        if child is None:
+            child = self._children[key] = self._new_child()
+        return child
+
+    def _default(self):
+        child = self._children.get(())
+        if child is None:
+            child = self._children[()] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for key, child in list(self._children.items()):
+            lines.extend(self._render_child(key, child))
+        return lines
+
+    def _render_child(self, key, child) -> List[str]:
+        return [f'{self.name}{format_labels(self.labelnames, key)} {child.value}']
+
+class _Value:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def set(self, value: float):
+        self.value = value
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0):
+        self._default().inc(amount)
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._function: Optional[Callable[[], float]] = None
+
+    def _new_child(self):
+        return _Value()
+
+    def set(self, value: float):
+        self._default().set(value)
+
+    def inc(self, amount: float = 1.0):
+        self._default().inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self._default().inc(-amount)
+
+    def set_function(self, function: Callable[[], float]):
+        """Read the value at scrape time instead of tracking it"""
+        self._function = function
+
+    def render(self) -> List[str]:
+        if self._function is not None:
+            self._default().set(self._function())
+        return super().render()
+
+class _Histogram:
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _Histogram(self.buckets)
+
+    def observe(self, value: float):
+        self._default().observe(value)
+
+    def _render_child(self, key, child) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), child.counts):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            labels = format_labels(self.labelnames, key, 'le="' + le + '"')
+            lines.append(f'{self.name}_bucket{labels} {cumulative}')
+        labels = format_labels(self.labelnames, key)
+        lines.append(f'{self.name}_sum{labels} {child.sum}')
+        lines.append(f'{self.name}_count{labels} {child.count}')
+        return lines
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = MetricsRegistry()
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# LLM calls
+LLM_REQUEST_SECONDS = REGISTRY.histogram(
+    'agentos_llm_request_seconds', 'LLM call latency', ('provider', 'model'))
+LLM_REQUESTS = REGISTRY.counter(
+    'agentos_llm_requests_total', 'LLM calls by outcome (ok, error, cached)', ('provider', 'model', 'outcome'))
+LLM_TOKENS = REGISTRY.counter(
+    'agentos_llm_tokens_total', 'Tokens used', ('provider', 'model', 'kind'))
+LLM_COST = REGISTRY.counter(
+    'agentos_llm_cost_usd_total', 'Spend in USD', ('provider', 'model'))
+LLM_HEDGES = REGISTRY.counter(
+    'agentos_llm_hedges_total', 'Backup LLM calls (hedge, failover) and backups that won', ('provider', 'model', 'outcome'))
+
+# Near-duplicate prompt matching (cache_similarity)
+NEAR_DUP_LOOKUPS = REGISTRY.counter(
+    'agentos_prompt_index_lookups_total', 'Near-duplicate prompt lookups by outcome (hit, miss)', ('outcome',))
+NEAR_DUP_LOOKUP_SECONDS = REGISTRY.histogram(
+    'agentos_prompt_index_lookup_seconds', 'Near-duplicate prompt lookup: fingerprint + probe',
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01))
+NEAR_DUP_ENTRIES = REGISTRY.gauge(
+    'agentos_prompt_index_entries', 'Prompts in the near-duplicate index')
+
+# Event pipeline
+EVENTS_EMITTED = REGISTRY.counter(
+    'agentos_events_emitted_total', 'Agent events emitted')
+DB_COMMIT_SECONDS = REGISTRY.histogram(
+    'agentos_db_commit_seconds', 'EventSink flush: insert + commit')
+REDIS_PUBLISH_SECONDS = REGISTRY.histogram(
+    'agentos_redis_publish_seconds', 'EventSink flush: pipelined publish')
+
+# Queue and workers
+QUEUE_DEPTH = REGISTRY.gauge(
+    'agentos_queue_depth', 'Jobs waiting or in flight per priority lane', ('lane',))
+ACTIVE_AGENTS = REGISTRY.gauge(
+    'agentos_active_agents', 'Agents running in this process')
+
+# WebSocket fan-out
+WS_CONNECTIONS = REGISTRY.gauge(
+    'agentos_ws_connections', 'Open WebSocket connections')
+WS_FANOUT_LAG_SECONDS = REGISTRY.histogram(
+    'agentos_ws_fanout_lag_seconds', 'Time a message waits in a socket send queue',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0))
+WS_MESSAGES_DROPPED = REGISTRY.counter(
+    'agentos_ws_messages_dropped_total', 'Messages dropped for slow WebSocket consumers')
+
+async def serve_metrics(port: int = WORKER_METRICS_PORT, host: str = '0.0.0.0') -> asyncio.AbstractServer:
+    """Minimal HTTP listener for processes without a web app (workers)"""
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request = await reader.readline()
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass  # Skip headers
+            if request.split(b' ')[1:2] == [b'/metrics']:
+                body = REGISTRY.render().encode()
+                status = b'200 OK'
+            else:
+                body = b'Not found\n'
+                status = b'404 Not Found'
+            writer.write(
+                b'HTTP/1.1 ' + status + b'\r\nContent-Type: ' + CONTENT_TYPE.encode()
+                + b'\r\nContent-Length: ' + str(len(body)).encode() + b'\r\nConnection: close\r\n\r\n' + body
+            )
+            await writer.drain()
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
@@ -1,191 +1,671 @@
-from typing import List, Dict, Any, Optional
-import uuid
+from typing import List, Dict, Any, Optional, Set, Union
 import time
 from datetime import datetime
-from app.core.llm_providers import get_provider
-from app.models.agent import Agent, AgentStatus, AgentEvent
-from app.core.database import SessionLocal
-import redis
+from sqlalchemy import inspect
+from app.core.llm_providers import ProviderError, get_provider, hash_api_key
+from app.models.agent import Agent, AgentStatus
+from app.core.event_sink import EventSink
+from app.core.llm_cache import CachedProvider, get_response_cache, LLM_CACHE_ENABLED
+from app.core.rate_limit import GovernedProvider, get_rate_governor
+from app.core.dag import StepGraph, StepNode, DAG_MAX_PARALLEL
+from app.core.checkpoints import CheckpointLog
+from app.core.batching import BatchedProvider, get_batch_collector
+from app.core.hedging import HedgedProvider, get_latency_tracker
+from app.core.estimator import count_tokens, get_estimator
+from app.core.status_cache import get_status_cache
+from app.core.redis_client import get_redis
+from app.core.monitoring import LLM_REQUEST_SECONDS, LLM_REQUESTS, LLM_TOKENS, LLM_COST
+from app.core.tracing import TraceStore, span, start_trace
+import asyncio
+import functools
 import json
+import os
+
+# Token deltas are coalesced into one llm_delta message per window
+STREAM_COALESCE_MS = int(os.getenv("STREAM_COALESCE_MS", "100"))
+STREAM_COALESCE_TOKENS = int(os.getenv("STREAM_COALESCE_TOKENS", "20"))
+
+# Kill requests are pushed to every worker; the kill:{id} key catches agents
+# that haven't started yet and expires on its own
+KILL_CHANNEL = "control:kill"
+KILL_SIGNAL_TTL_SECONDS = int(os.getenv("KILL_SIGNAL_TTL_SECONDS", "3600"))
+
+async def request_kill(redis_client, agent_id: str):
+    """Ask whichever worker owns the agent to stop it"""
+    requested_at = time.time()
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.set(f'kill:{agent_id}', str(requested_at), ex=KILL_SIGNAL_TTL_SECONDS)
+        pipe.publish(KILL_CHANNEL, json.dumps({'agent_id': agent_id, 'requested_at': requested_at}))
+        await pipe.execute()
+
+class AgentKilled(Exception):
+    def __init__(self, partial_cost: float = 0.0, partial_tokens: int = 0):
+        super().__init__("Agent killed by user")
+        self.partial_cost = partial_cost
+        self.partial_tokens = partial_tokens
+
+class BudgetExceeded(Exception):
+    """The next call could take the agent past its budget; it is paused, not failed"""
 
 class AgentExecutor:
-    def __init__(self, agent_id: str, db_session):
+    def __init__(self, agent_id: str, db_session, redis_client=None):
         self.agent_id = agent_id
-        self.db = db_session
-        self.redis_client = redis.Redis(host='redis', port=6379, decode_responses=True)
+        self.db = db_session  # AsyncSession
+        self.redis_client = redis_client or get_redis()
+        self.events = EventSink(self.db, self.redis_client)
+        self.checkpoints = CheckpointLog(self.db, agent_id)
+        self.agent: Optional[Agent] = None
+        
+        # Every commit refreshes the cached status that polling clients read
+        self.status_cache = get_status_cache(self.redis_client)
+        self._status_etag: Optional[str] = None
+        self.events.on_commit = self.cache_status
         
-        # Load agent from DB
-        self.agent = self.db.query(Agent).filter(Agent.id == agent_id).first()
+        # Cancellation state (see kill())
+        self.kill_requested_at: Optional[float] = None
+        self._llm_tasks: Set[asyncio.Task] = set()
+        self._streamed_text: Dict[int, List[str]] = {}  # step number -> deltas streamed so far
+        self._inflight_cost = 0.0  # Estimated cost of LLM calls not yet billed
+        self._batches: Dict[str, Dict[str, str]] = {}  # step id -> submitted batch (see save_batch)
+    
+    async def load_agent(self) -> Agent:
+        """Load agent from DB"""
+        self.agent = await self.db.get(Agent, self.agent_id)
         if not self.agent:
-            raise ValueError(f"Agent {agent_id} not found")
-    
-    def emit_event(self, action: str, status: str, data: Dict = None, cost: float = 0.0):
-        """Emit an event and broadcast via Redis"""
-        event = AgentEvent(
-            agent_id=self.agent_id,
-            step=self.agent.current_step,
-            action=action,
-            status=status,
-            data=data or {},
-            cost_usd=cost
-        )
-        self.db.add(event)
-        self.db.commit()
-        
-        # Broadcast to Redis for real-time updates
-        self.redis_client.publish(
-            f'agent:{self.agent_id}',
-            json.dumps({
-                'agent_id': self.agent_id,
-                'action': action,
-                'status': status,
-                'step': self.agent.current_step,
-                'data': data,
-                'cost': cost,
-                'timestamp': datetime.utcnow().isoformat()
-            })
-        )
+            raise ValueError(f"Agent {self.agent_id} not found")
+        return self.agent
+    
+    async def emit_event(
+        self,
+        action: str,
+        status: str,
+        data: Dict = None,
+        cost: float = 0.0,
+        flush: bool = False,
+        usage: Union[Dict, List[Dict], None] = None,
+        step: Optional[int] = None
+    ):
+        """Emit an event and broadcast via Redis (buffered, see EventSink)"""
+        with span('event.emit', action=action):
+            await self.events.emit(
+                agent_id=self.agent_id,
+                step=self.agent.current_step if step is None else step,
+                action=action,
+                status=status,
+                data=data,
+                cost=cost,
+                flush=flush,
+                usage=usage
+            )
+    
+    def usage(self, tokens: int, provider: Optional[str] = None, model: Optional[str] = None) -> Dict:
+        """Cost rollup dimensions for an event that spent money"""
+        return {
+            'provider': provider or self.agent.provider,
+            'model': model or self.agent.model,
+            'key_hash': hash_api_key(self.agent.config.get('api_key')),
+            'tokens': tokens
+        }
     
-    def save_checkpoint(self, state: Dict):
-        """Save checkpoint for resume capability"""
-        self.agent.checkpoint_data = state
-        self.agent.current_step = state.get('current_step', 0)
-        self.db.commit()
+    def response_usage(self, result: Dict) -> Union[Dict, List[Dict]]:
+        """Rollup entries for a response; hedge spend is booked under the route that incurred it"""
+        usage = self.usage(result['tokens_total'], result.get('provider'), result.get('model'))
+        if not result.get('hedge_costs'):
+            return usage
+        usage['cost_usd'] = result['cost_usd'] - result['hedge_cost_usd']
+        return [usage] + [
+            {**self.usage(hedge['tokens'], hedge['provider'], hedge['model']), 'cost_usd': hedge['cost_usd']}
+            for hedge in result['hedge_costs']
+        ]
+
+    def cache_status(self, pipe):
+        """Queue the agent's status for the status cache if it changed since the last commit"""
+        if self.agent is None:
+            return
+        etag, body = self.status_cache.encode(self.agent)
+        if etag != self._status_etag:
+            self.status_cache.put_on(pipe, self.agent_id, etag, body)
+            self._status_etag = etag
+    
+    async def save_checkpoint(self, delta: Dict):
+        """Append what changed to the checkpoint log (committed on the next flush)"""
+        with span('checkpoint.save'):
+            async with self.events.lock:
+                await self.checkpoints.append(delta)
+                self.agent.current_step = delta.get('current_step', self.agent.current_step)
+                self.agent.checkpoint_data = {
+                    'current_step': self.agent.current_step,
+                    'log_seq': self.checkpoints.seq
+                }
         
-        self.emit_event(
-            action='checkpoint_saved',
-            status='completed',
-            data={'step': self.agent.current_step}
-        )
+            await self.emit_event(
+                action='checkpoint_saved',
+                status='completed',
+                data={'step': self.agent.current_step}
+            )
     
-    def check_kill_signal(self) -> bool:
+    async def check_kill_signal(self) -> bool:
         """Check if user requested kill"""
-        kill_signal = self.redis_client.get(f'kill:{self.agent_id}')
-        return kill_signal == '1'
+        if self.kill_requested_at is not None:
+            return True
+        kill_signal = await self.redis_client.get(f'kill:{self.agent_id}')
+        if kill_signal is None:
+            return False
+        try:
+            self.kill_requested_at = float(kill_signal)
+        except ValueError:
+            self.kill_requested_at = time.time()
+        return True
+    
+    def kill(self, requested_at: Optional[float] = None):
+        """Stop the agent, interrupting any in-flight LLM calls"""
+        self.kill_requested_at = requested_at or time.time()
+        for task in self._llm_tasks:
+            task.cancel()
     
     def check_budget(self, estimated_next_cost: float = 0) -> bool:
-        """Check if we're approaching budget limit"""
+        """Whether a call costing up to estimated_next_cost still fits the budget"""
         max_cost = self.agent.config.get('max_cost_usd', 10.0)
-        current_cost = self.agent.cost_usd
+        # Parallel steps already in flight count at their estimates
+        current_cost = self.agent.cost_usd + self._inflight_cost
         
+        # The estimate is a high quantile, not a bound: keep 10% headroom
         if current_cost + estimated_next_cost > max_cost * 0.9:
             return False
         return True
     
-    async def execute_step(self, step_config: Dict) -> Dict[str, Any]:
-        """Execute a single step"""
-        step_num = step_config['step_number']
-        self.agent.current_step = step_num
+    def cache_enabled(self) -> bool:
+        """Per-agent `cache` config wins over the LLM_CACHE_ENABLED default"""
+        if self.agent.config.get('cache_similarity'):
+            return True
+        return bool(self.agent.config.get('cache', LLM_CACHE_ENABLED))
+    
+    async def stream_completion(self, provider, prompt: str, step: int) -> Dict[str, Any]:
+        """Run a streaming completion, forwarding coalesced deltas to viewers"""
+        start_time = time.time()
+        first_token_at = None
+        last_sent = start_time
+        pending: List[str] = []
+        result = None
         
-        # Check kill signal
-        if self.check_kill_signal():
-            raise Exception("Agent killed by user")
-        
-        # Check budget
-        if not self.check_budget(estimated_next_cost=0.5):
-            self.agent.status = AgentStatus.PAUSED
-            self.db.commit()
-            self.emit_event(
-                action='budget_pause',
-                status='paused',
-                data={'reason': 'Approaching budget limit'}
+        async def send_pending():
+            await self.events.broadcast(
+                agent_id=self.agent_id,
+                step=step,
+                action='llm_delta',
+                status='running',
+                data={'text': ''.join(pending)}
             )
-            raise Exception("Paused: approaching budget limit")
+            pending.clear()
+        
+        async for chunk in provider.stream(prompt):
+            if chunk['type'] == 'result':
+                result = {k: v for k, v in chunk.items() if k != 'type'}
+                continue
+            
+            now = time.time()
+            if first_token_at is None:
+                first_token_at = now
+            pending.append(chunk['text'])
+            self._streamed_text[step].append(chunk['text'])
+            if (len(pending) >= STREAM_COALESCE_TOKENS
+                    or (now - last_sent) * 1000 >= STREAM_COALESCE_MS):
+                await send_pending()
+                last_sent = now
         
-        # Execute LLM call
+        if pending:
+            await send_pending()
+        
+        if result is None:
+            # Stream closed before its final chunk (e.g. a dropped connection)
+            raise ProviderError("Stream ended without a result", retryable=True)
+        result['ttft_ms'] = int(((first_token_at or time.time()) - start_time) * 1000)
+        return result
+    
+    async def save_batch(self, step_id: str, batch_id: str, custom_id: str):
+        """Record a step's submitted batch so a resumed run polls it instead of paying again"""
+        self._batches[step_id] = {'batch_id': batch_id, 'custom_id': custom_id}
+        await self.save_checkpoint({'batches': {step_id: self._batches[step_id]}})
+        await self.events.flush()
+    
+    def build_provider(self, step_id: Optional[str] = None):
+        """Provider stack for one call: governed/batched, hedged, cached as configured"""
         provider = get_provider(
             provider=self.agent.provider,
             api_key=self.agent.config.get('api_key'),
             model=self.agent.model
         )
+        key_hash = hash_api_key(self.agent.config.get('api_key'))
+        if self.agent.config.get('batch') and provider.supports_batch:
+            # Offline mode: cheaper, higher throughput, results in minutes to hours
+            provider = BatchedProvider(
+                provider, get_batch_collector(), key_hash,
+                on_submit=functools.partial(self.save_batch, step_id) if step_id else None,
+                resume=self._batches.get(step_id)
+            )
+        else:
+            rate_limits = self.agent.config.get('rate_limits') or {}
+            provider = GovernedProvider(
+                provider,
+                get_rate_governor(self.redis_client),
+                key_hash=key_hash,
+                rpm=rate_limits.get('rpm'),
+                tpm=rate_limits.get('tpm')
+            )
+            fallbacks = self.agent.config.get('fallbacks')
+            if fallbacks:
+                # Fallbacks use their provider's default limits (they may be other keys)
+                provider = HedgedProvider(
+                    [provider] + [
+                        GovernedProvider(
+                            get_provider(**fallback),
+                            get_rate_governor(self.redis_client),
+                            key_hash=hash_api_key(fallback['api_key'])
+                        )
+                        for fallback in fallbacks
+                    ],
+                    get_latency_tracker(),
+                    hedge=self.agent.config.get('hedge', True)
+                )
+        if self.cache_enabled():
+            similarity = self.agent.config.get('cache_similarity')
+            index = None
+            if similarity:
+                # Imported on first use so numpy only loads in workers that need it
+                from app.core.prompt_index import get_prompt_index
+                index = get_prompt_index()
+            provider = CachedProvider(provider, get_response_cache(self.redis_client), index, similarity)
+        return provider
+    
+    async def execute_step(self, step_config: Dict) -> Dict[str, Any]:
+        """Execute a single step"""
+        step_num = step_config['step_number']
+        
+        # Check kill signal
+        with span('kill.check'):
+            killed = await self.check_kill_signal()
+        if killed:
+            raise AgentKilled()
+        
+        with span('provider.build'):
+            provider = self.build_provider(step_config.get('step_id'))
         
         prompt = step_config['prompt']
         
-        self.emit_event(
+        # Check budget against the high estimate for this call
+        _, estimated_cost = get_estimator().step_cost(provider, prompt)
+        if not self.check_budget(estimated_next_cost=estimated_cost):
+            # Other steps may be mid-flush on the shared session
+            async with self.events.lock:
+                self.agent.status = AgentStatus.PAUSED
+            await self.emit_event(
+                action='budget_pause',
+                status='paused',
+                data={'reason': 'Approaching budget limit', 'estimated_next_cost': round(estimated_cost, 4)},
+                flush=True,
+                step=step_num
+            )
+            raise BudgetExceeded("Paused: approaching budget limit")
+        
+        await self.emit_event(
             action='llm_call',
             status='running',
             data={
+                'step_id': step_config.get('step_id'),
                 'provider': self.agent.provider,
                 'model': self.agent.model,
                 'prompt_preview': prompt[:100] + '...'
-            }
+            },
+            step=step_num
         )
+        # Flush before blocking on the provider so viewers see the call start
+        await self.events.flush()
         
         start_time = time.time()
-        result = await provider.complete(prompt)
+        # The task is created inside the span so provider spans nest under it
+        with span('llm.call', provider=self.agent.provider, model=self.agent.model):
+            # Run the call as its own task so a kill can cancel it mid-request
+            self._streamed_text[step_num] = []
+            if self.agent.config.get('stream') and not isinstance(provider, BatchedProvider):
+                llm_task = asyncio.create_task(self.stream_completion(provider, prompt, step_num))
+            else:
+                llm_task = asyncio.create_task(provider.complete(prompt))
+            self._llm_tasks.add(llm_task)
+            self._inflight_cost += estimated_cost
+            if self.kill_requested_at is not None:
+                llm_task.cancel()
+            try:
+                result = await llm_task
+            except asyncio.CancelledError:
+                if self.kill_requested_at is None:
+                    raise
+                # Prompt is billed in full, completion up to what was streamed
+                prompt_tokens = count_tokens(prompt, self.agent.model)
+                streamed = count_tokens(''.join(self._streamed_text[step_num]), self.agent.model)
+                raise AgentKilled(
+                    partial_cost=provider.cost(prompt_tokens, streamed),
+                    partial_tokens=prompt_tokens + streamed
+                )
+            except Exception:
+                LLM_REQUESTS.labels(self.agent.provider, self.agent.model, 'error').inc()
+                raise
+            finally:
+                self._llm_tasks.discard(llm_task)
+                self._inflight_cost -= estimated_cost
+                self._streamed_text.pop(step_num, None)
         duration = time.time() - start_time
+        # Without streaming the first token arrives with the whole response
+        ttft_ms = result.get('ttft_ms', int(duration * 1000))
         
-        # Update agent cost
-        self.agent.cost_usd += result['cost_usd']
-        self.db.commit()
+        # Update agent cost (not while another step's flush is mid-commit)
+        async with self.events.lock:
+            self.agent.cost_usd += result['cost_usd']
         
-        self.emit_event(
-            action='llm_response',
-            status='completed',
-            data={
+        provider_name = result.get('provider') or self.agent.provider
+        model_name = result.get('model') or self.agent.model
+        if result.get('cached'):
+            LLM_REQUESTS.labels(provider_name, model_name, 'cached').inc()
+            data = {
+                'tokens': result['tokens_total'],
+                'saved_cost_usd': result['saved_cost_usd'],
+                'saved_ms': result['saved_ms'],
+                'response_preview': result['content'][:200] + '...'
+            }
+            if 'similarity' in result:
+                # Response to a near-duplicate prompt (cache_similarity)
+                data['similarity'] = result['similarity']
+            await self.emit_event(
+                action='llm_cache_hit',
+                status='completed',
+                data=data,
+                cost=0.0,
+                step=step_num
+            )
+        else:
+            LLM_REQUESTS.labels(provider_name, model_name, 'ok').inc()
+            LLM_REQUEST_SECONDS.labels(provider_name, model_name).observe(duration)
+            LLM_TOKENS.labels(provider_name, model_name, 'prompt').inc(result.get('tokens_prompt', 0))
+            LLM_TOKENS.labels(provider_name, model_name, 'completion').inc(result.get('tokens_completion', 0))
+            # Cancelled hedges were counted against their own provider by HedgedProvider
+            LLM_COST.labels(provider_name, model_name).inc(result['cost_usd'] - result.get('hedge_cost_usd', 0.0))
+            data = {
+                'provider': provider_name,
+                'model': model_name,
                 'tokens': result['tokens_total'],
+                'tokens_completion': result.get('tokens_completion', 0),
                 'duration_seconds': round(duration, 2),
+                'ttft_ms': ttft_ms,
+                'queue_wait_ms': result.get('queue_wait_ms', 0),
+                'retries': result.get('retries', 0),
                 'response_preview': result['content'][:200] + '...'
-            },
-            cost=result['cost_usd']
-        )
+            }
+            if result.get('batch_id'):
+                data['batch_id'] = result['batch_id']
+            if result.get('hedge_cost_usd'):
+                data['hedge_cost_usd'] = round(result['hedge_cost_usd'], 6)
+                data['hedge_costs'] = result['hedge_costs']
+            await self.emit_event(
+                action='llm_response',
+                status='completed',
+                data=data,
+                cost=result['cost_usd'],
+                usage=self.response_usage(result),
+                step=step_num
+            )
+        
+        # Step boundary: cost update and response event land in one commit
+        await self.events.flush()
         
         return result
     
+    async def run_node(self, graph: StepGraph, node: StepNode, outputs: Dict[str, str]) -> Dict[str, Any]:
+        """Run one step with its dependencies' outputs filled into the prompt"""
+        start_time = time.time()
+        with span('step', step=node.number, step_id=node.id):
+            result = await self.execute_step({
+                'step_number': node.number,
+                'step_id': node.id,
+                'prompt': graph.render_prompt(node, self.agent.task, outputs)
+            })
+        return {**result, 'duration_seconds': time.time() - start_time}
+    
+    async def run_graph(self, graph: StepGraph, completed: Optional[Dict[str, Dict]] = None) -> Dict[str, Dict[str, Any]]:
+        """Run every step, starting each as soon as its dependencies finish.
+
+        At most config["max_parallel"] steps are in flight at once. Steps in
+        `completed` (from the checkpoint log) are not run again. Progress is
+        checkpointed after each step. If a step fails the others are cancelled
+        and the error is raised; a kill lets in-flight steps record their
+        partial spend before AgentKilled is raised with the total. A budget
+        pause starts no new steps but lets in-flight ones finish (they are
+        already paid for) before BudgetExceeded is raised.
+        """
+        max_parallel = max(1, int(self.agent.config.get('max_parallel', DAG_MAX_PARALLEL)))
+        results: Dict[str, Dict[str, Any]] = {
+            node_id: {
+                'content': step['content'],
+                'tokens_total': step['tokens'],
+                'cost_usd': step['cost'],
+                'duration_seconds': step.get('duration_seconds', 0.0)
+            }
+            for node_id, step in (completed or {}).items()
+            if node_id in graph.nodes
+        }
+        running: Dict[asyncio.Task, StepNode] = {}
+        failure: Optional[BaseException] = None
+        paused: Optional[BudgetExceeded] = None
+        partial_cost = 0.0
+        partial_tokens = 0
+        # Progress is the number of finished steps (parallel steps have no
+        # single current one); save_checkpoint advances it as each finishes,
+        # so kill/failure events record how far the run got
+        async with self.events.lock:
+            self.agent.current_step = len(results)
+        
+        try:
+            while True:
+                if failure is None and paused is None and self.kill_requested_at is None:
+                    started = {node.id for node in running.values()}
+                    outputs = {node_id: r['content'] for node_id, r in results.items()}
+                    for node in graph.ready(set(results), started)[:max_parallel - len(running)]:
+                        running[asyncio.create_task(self.run_node(graph, node, outputs))] = node
+                if not running:
+                    break
+            
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    node = running.pop(task)
+                    try:
+                        results[node.id] = task.result()
+                    except AgentKilled as e:
+                        partial_cost += e.partial_cost
+                        partial_tokens += e.partial_tokens
+                        self.kill(self.kill_requested_at)
+                        continue
+                    except BudgetExceeded as e:
+                        paused = paused or e
+                        continue
+                    except asyncio.CancelledError as e:
+                        failure = failure or e
+                        continue
+                    except Exception as e:
+                        if failure is None:
+                            failure = e
+                            for other in running:
+                                other.cancel()
+                        continue
+                
+                    result = results[node.id]
+                    await self.save_checkpoint({
+                        'current_step': len(results),
+                        'completed': {
+                            node.id: {
+                                'content': result['content'],
+                                'tokens': result['tokens_total'],
+                                'cost': result['cost_usd'],
+                                'duration_seconds': result['duration_seconds']
+                            }
+                        }
+                    })
+                    await self.events.flush()
+        
+        finally:
+            # Only reached with steps still running if run() itself was cancelled
+            for task in running:
+                task.cancel()
+        
+        if failure is not None:
+            raise failure
+        if self.kill_requested_at is None and paused is not None:
+            raise paused
+        if len(results) < len(graph):
+            raise AgentKilled(partial_cost=partial_cost, partial_tokens=partial_tokens)
+        return results
+    
+    async def finish_killed(self, partial_cost: float = 0.0, partial_tokens: int = 0):
+        """Record a user kill as the agent's terminal state"""
+        kill_latency_ms = None
+        if self.kill_requested_at is not None:
+            kill_latency_ms = int((time.time() - self.kill_requested_at) * 1000)
+        
+        async with self.events.lock:
+            self.agent.cost_usd += partial_cost
+            self.agent.status = AgentStatus.KILLED
+            self.agent.completed_at = datetime.utcnow()
+            if self.agent.started_at:
+                self.agent.runtime_seconds = int((self.agent.completed_at - self.agent.started_at).total_seconds())
+        
+        await self.emit_event(
+            action='agent_killed',
+            status='killed',
+            data={
+                'partial_cost_usd': partial_cost,
+                'total_cost': self.agent.cost_usd,
+                'kill_latency_ms': kill_latency_ms
+            },
+            cost=partial_cost,
+            flush=True,
+            usage=self.usage(partial_tokens) if partial_cost else None
+        )
+        await self.redis_client.delete(f'kill:{self.agent_id}')
+    
     async def run(self):
-        """Main execution loop"""
+        """Main execution loop, traced when sampled (config["trace"] forces it on or off)"""
+        if self.agent is None:
+            await self.load_agent()
+        
+        trace = start_trace(self.agent_id, self.agent.config.get('trace'))
+        try:
+            with span('agent.run'):
+                return await self._run()
+        finally:
+            try:
+                await self.events.close()
+            except Exception as e:
+                print(f"Final event flush failed for {self.agent_id}: {e}")
+            if trace is not None:
+                try:
+                    await TraceStore(self.redis_client).save(trace)
+                except Exception as e:
+                    print(f"Trace save failed for {self.agent_id}: {e}")
+    
+    async def _run(self):
         try:
             self.agent.status = AgentStatus.RUNNING
             self.agent.started_at = datetime.utcnow()
-            self.db.commit()
             
-            self.emit_event(
+            graph = StepGraph.from_config(self.agent.config)
+            self.agent.total_steps = len(graph)
+            
+            # On resume, steps that already finished come back from the log
+            state = await self.checkpoints.load()
+            completed = state.get('completed', {})
+            self._batches = state.get('batches', {})
+            
+            data = {'task': self.agent.task}
+            if completed:
+                data['resumed_steps'] = len(completed)
+            await self.emit_event(
                 action='agent_started',
                 status='running',
-                data={'task': self.agent.task}
+                data=data,
+                flush=True
             )
             
-            # Simple workflow for MVP: just execute the task as one LLM call
-            # Later: break into multiple steps, tools, etc.
+            wall_start = time.time()
+            results = await self.run_graph(graph, completed)
+            wall_seconds = time.time() - wall_start
             
-            step_config = {
-                'step_number': 1,
-                'prompt': f"Task: {self.agent.task}\n\nPlease complete this task and provide a detailed response."
-            }
-            
-            result = await self.execute_step(step_config)
+            # Critical path = wall time with unlimited parallelism; compare with
+            # the sum of step times to see what parallel execution bought
+            durations = {node_id: r['duration_seconds'] for node_id, r in results.items()}
+            critical_seconds, critical_path = graph.critical_path(durations)
             
-            # Save result
-            self.agent.result = {
-                'content': result['content'],
-                'tokens': result['tokens_total'],
-                'cost': result['cost_usd']
-            }
-            self.agent.status = AgentStatus.COMPLETED
-            self.agent.completed_at = datetime.utcnow()
-            self.agent.runtime_seconds = int((self.agent.completed_at - self.agent.started_at).total_seconds())
-            self.db.commit()
+            sinks = graph.sinks()
+            if len(sinks) == 1:
+                content = results[sinks[0].id]['content']
+            else:
+                content = '\n\n'.join(f"## {node.id}\n{results[node.id]['content']}" for node in sinks)
+            # The flush timer may be committing the session (see EventSink)
+            async with self.events.lock:
+                self.agent.result = {
+                    'content': content,
+                    'tokens': sum(r['tokens_total'] for r in results.values()),
+                    'cost': sum(r['cost_usd'] for r in results.values())
+                }
+                if len(graph) > 1:
+                    self.agent.result['steps'] = {
+                        node_id: {
+                            'content': r['content'],
+                            'tokens': r['tokens_total'],
+                            'cost': r['cost_usd'],
+                            'duration_seconds': round(r['duration_seconds'], 3)
+                        }
+                        for node_id, r in results.items()
+                    }
+                self.agent.status = AgentStatus.COMPLETED
+                self.agent.completed_at = datetime.utcnow()
+                self.agent.runtime_seconds = int((self.agent.completed_at - self.agent.started_at).total_seconds())
             
-            self.emit_event(
+            await self.emit_event(
                 action='agent_completed',
                 status='completed',
                 data={
                     'runtime_seconds': self.agent.runtime_seconds,
-                    'total_cost': self.agent.cost_usd
-                }
+                    'total_cost': self.agent.cost_usd,
+                    'steps': len(graph),
+                    'wall_seconds': round(wall_seconds, 3),
+                    'step_seconds_total': round(sum(durations.values()), 3),
+                    'critical_path_seconds': round(critical_seconds, 3),
+                    'critical_path': critical_path
+                },
+                flush=True
             )
             
             return self.agent.result
             
+        except AgentKilled as e:
+            await self.finish_killed(e.partial_cost, e.partial_tokens)
+            return None
+            
+        except BudgetExceeded:
+            # execute_step set PAUSED and emitted budget_pause; /resume re-enqueues
+            # the agent and it continues from its checkpoint
+            return None
+            
         except Exception as e:
-            self.agent.status = AgentStatus.FAILED
-            self.agent.error = str(e)
-            self.db.commit()
+            async with self.events.lock:
+                if inspect(self.agent).expired_attributes:
+                    # A failed flush rolled the session back; reload before writing
+                    await self.db.refresh(self.agent)
+                self.agent.status = AgentStatus.FAILED
+                self.agent.error = str(e)
             
-            self.emit_event(
+            await self.emit_event(
                 action='agent_failed',
                 status='failed',
-                data={'error': str(e)}
+                data={'error': str(e)},
+                flush=True
             )
             
             raise
\ No newline at end of file
@@ -0,0 +1,176 @@
+from typing import Dict, Any, List, Optional, Tuple
+from app.core.monitoring import NEAR_DUP_LOOKUPS, NEAR_DUP_LOOKUP_SECONDS, NEAR_DUP_ENTRIES
+import os
+import re
+import time
+
+try:
+    import numpy as np
+except ImportError:  # Optional: only needed for cache_similarity
+    np = None
+
+# Fingerprints kept per process (~260 bytes of arrays each plus the cache key);
+# the oldest is overwritten when full
+NEAR_DUP_MAX_ENTRIES = int(os.getenv("NEAR_DUP_MAX_ENTRIES", "100000"))
+NEAR_DUP_PERMUTATIONS = int(os.getenv("NEAR_DUP_PERMUTATIONS", "128"))
+# Bands x rows = permutations; 16 x 8 finds pairs from ~0.7 Jaccard up
+NEAR_DUP_BANDS = int(os.getenv("NEAR_DUP_BANDS", "16"))
+NEAR_DUP_SHINGLE_WORDS = int(os.getenv("NEAR_DUP_SHINGLE_WORDS", "2"))
+
+# ID-like tokens (UUIDs, hex of 8+ characters, runs of 6+ digits) become one
+# placeholder before shingling, so prompts that differ only in them
+# fingerprint the same. Short numbers stay: "2+2" and "3+5" are different
+# questions, as are different dates or amounts
+UUID_PATTERN = r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}"
+TOKEN_PATTERN = re.compile(UUID_PATTERN + r"|\w+|[^\w\s]")
+ID_PATTERN = re.compile(UUID_PATTERN + r"|(?=[a-f]*\d)[0-9a-f]{8,}|\w*\d{6,}\w*")
+
+def normalize(prompt: str) -> List[str]:
+    """Lowercased words and punctuation with IDs masked"""
+    return [
+        token if token.isalpha() or not ID_PATTERN.fullmatch(token) else '<id>'
+        for token in TOKEN_PATTERN.findall(prompt.lower())
+    ]
+
+class PromptIndex:
+    """MinHash/LSH index of prompts whose responses are in the ResponseCache.
+
+    Each prompt is reduced to word shingles and a MinHash signature
+    (NEAR_DUP_PERMUTATIONS multiply-shift hashes, computed with NumPy).
+    The signature is split into bands; each band hashes into a direct-mapped
+    table per band, so a lookup probes NEAR_DUP_BANDS slots whatever the
+    size of the index. Candidates are verified against their stored
+    signature (the low byte of each hash, corrected for chance matches) and
+    the most similar one at or above the caller's threshold wins.
+
+    Storage is a ring of preallocated arrays: inserting into a full index
+    overwrites the oldest entry, and table slots still pointing at it fail
+    the per-band check, so eviction needs no cleanup.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = NEAR_DUP_MAX_ENTRIES,
+        permutations: int = NEAR_DUP_PERMUTATIONS,
+        bands: int = NEAR_DUP_BANDS,
+        shingle_words: int = NEAR_DUP_SHINGLE_WORDS,
+        seed: int = 0
+    ):
+        if np is None:
+            raise RuntimeError("numpy is required for near-duplicate prompt matching")
+        if permutations % bands:
+            raise ValueError("NEAR_DUP_PERMUTATIONS must be a multiple of NEAR_DUP_BANDS")
+        self.capacity = max_entries
+        self.bands = bands
+        self.rows = permutations // bands
+        self.shingle_words = shingle_words
+
+        rng = np.random.default_rng(seed)
+        self.hash_a = rng.integers(1, 2 ** 63, size=(permutations, 1), dtype=np.uint64) | np.uint64(1)
+        self.hash_b = rng.integers(0, 2 ** 63, size=(permutations, 1), dtype=np.uint64)
+        self.band_mult = rng.integers(1, 2 ** 63, size=self.rows, dtype=np.uint64) | np.uint64(1)
+        self.band_seed = rng.integers(0, 2 ** 63, size=bands, dtype=np.uint64)
+        self.band_range = np.arange(bands)
+
+        table_size = 1 << max(1, (max_entries - 1).bit_length())
+        self.table_mask = np.uint64(table_size - 1)
+        self.tables = np.full((bands, table_size), -1, dtype=np.int32)
+        self.checks = np.zeros((max_entries, bands), dtype=np.uint32)
+        self.signatures = np.zeros((max_entries, permutations), dtype=np.uint8)
+        self.namespaces = np.zeros(max_entries, dtype=np.uint32)
+        self.keys: List[Optional[str]] = [None] * max_entries
+        self.inserted = 0
+
+        self.lookups = 0
+        self.hits = 0
+        self.lookup_seconds = 0.0
+
+    def __len__(self) -> int:
+        return min(self.inserted, self.capacity)
+
+    def signature(self, prompt: str) -> "np.ndarray":
+        words = normalize(prompt) or ['']
+        # str hashes are salted per process, like the index itself
+        hashes = np.fromiter(map(hash, words), dtype=np.int64, count=len(words)).view(np.uint64) & np.uint64(0xFFFFFFFF)
+        n = self.shingle_words
+        if len(hashes) > n > 1:
+            # Combine each run of n word hashes into one 32-bit shingle hash
+            shingles = hashes[:len(hashes) - n + 1].copy()
+            for i in range(1, n):
+                shingles = (shingles * np.uint64(0x9E3779B1) + hashes[i:len(hashes) - n + 1 + i]) & np.uint64(0xFFFFFFFF)
+            hashes = shingles
+        # Multiply-shift hashing: top 32 bits of a * x + b (mod 2^64)
+        return ((self.hash_a * hashes + self.hash_b) >> np.uint64(32)).min(axis=1)
+
+    def band_keys(self, signature: "np.ndarray", namespace: int) -> "np.ndarray":
+        keys = (signature.reshape(self.bands, self.rows) * self.band_mult).sum(axis=1)
+        keys ^= self.band_seed + np.uint64(namespace)
+        keys ^= keys >> np.uint64(31)
+        keys *= np.uint64(0xBF58476D1CE4E5B9)
+        keys ^= keys >> np.uint64(29)
+        return keys
+
+    def add(self, namespace: int, prompt: str, key: str):
+        """Index `prompt`, whose response is cached under `key`"""
+        signature = self.signature(prompt)
+        band_keys = self.band_keys(signature, namespace)
+        slot = self.inserted % self.capacity
+        self.inserted += 1
+        self.signatures[slot] = signature & np.uint64(0xFF)
+        self.checks[slot] = band_keys >> np.uint64(32)
+        self.namespaces[slot] = namespace
+        self.keys[slot] = key
+        self.tables[self.band_range, band_keys & self.table_mask] = slot
+
+    def lookup(self, namespace: int, prompt: str, threshold: float) -> Optional[Tuple[str, float]]:
+        """Cache key and estimated Jaccard similarity of the closest indexed prompt, if >= threshold"""
+        start = time.perf_counter()
+        match = None
+        if self.inserted:
+            signature = self.signature(prompt)
+            band_keys = self.band_keys(signature, namespace)
+            slots = self.tables[self.band_range, band_keys & self.table_mask]
+            valid = slots >= 0
+            valid[valid] = self.checks[slots[valid], self.band_range[valid]] == (band_keys[valid] >> np.uint64(32))
+            candidates = np.unique(slots[valid])
+            candidates = candidates[self.namespaces[candidates] == namespace]
+            if len(candidates):
+                agreement = (self.signatures[candidates] == (signature & np.uint64(0xFF)).astype(np.uint8)).mean(axis=1)
+                # One in 256 low bytes agree by chance
+                similarity = (agreement - 1 / 256) / (1 - 1 / 256)
+                best = int(similarity.argmax())
+                if similarity[best] >= threshold:
+                    match = (self.keys[candidates[best]], float(similarity[best]))
+
+        elapsed = time.perf_counter() - start
+        self.lookups += 1
+        self.lookup_seconds += elapsed
+        NEAR_DUP_LOOKUP_SECONDS.observe(elapsed)
+        if match is not None:
+            self.hits += 1
+            NEAR_DUP_LOOKUPS.labels('hit').inc()
+        else:
+            NEAR_DUP_LOOKUPS.labels('miss').inc()
+        return match
+
+    def stats(self) -> Dict[str, Any]:
+        arrays = (self.tables, self.checks, self.signatures, self.namespaces)
+        return {
+            'entries': len(self),
+            'capacity': self.capacity,
+            'lookups': self.lookups,
+            'hits': self.hits,
+            'hit_rate': self.hits / self.lookups if self.lookups else 0.0,
+            'mean_lookup_us': self.lookup_seconds / self.lookups * 1e6 if self.lookups else 0.0,
+            'array_bytes': sum(a.nbytes for a in arrays)
+        }
+
+_prompt_index: Optional[PromptIndex] = None
+
+def get_prompt_index() -> PromptIndex:
+    """Process-wide index shared by every agent with cache_similarity set"""
+    global _prompt_index
+    if _prompt_index is None:
+        _prompt_index = PromptIndex()
+        NEAR_DUP_ENTRIES.set_function(lambda: len(_prompt_index))
+    return _prompt_index
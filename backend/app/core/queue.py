@@ -0,0 +1,165 @@
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+import redis.asyncio as aioredis
+import os
+
+AGENT_QUEUE_PREFIX = "agents:queue"
+AGENT_QUEUE_GROUP = "workers"
+
+# Lanes are drained in this order; a lower lane only runs when higher ones are empty
+PRIORITY_LANES = ("high", "normal", "low")
+
+# A delivered job that hasn't been acked or touched for this long is reclaimed
+QUEUE_VISIBILITY_TIMEOUT_MS = int(os.getenv("QUEUE_VISIBILITY_TIMEOUT_MS", "60000"))
+# Consumers with nothing pending and no reads for this long are removed (live
+# workers read every second, so only ones that died without cleaning up qualify)
+QUEUE_CONSUMER_MAX_IDLE_MS = int(os.getenv("QUEUE_CONSUMER_MAX_IDLE_MS", str(24 * 3600 * 1000)))
+
+@dataclass
+class Job:
+    lane: str
+    message_id: str
+    agent_id: str
+
+class AgentQueue:
+    """Durable agent run queue on Redis Streams.
+
+    One stream per priority lane, one consumer group shared by all workers.
+    Delivered jobs stay pending until acked; workers touch their in-flight
+    jobs to keep them visible, and jobs from dead workers are reclaimed once
+    they sit idle past the visibility timeout.
+    """
+
+    def __init__(
+        self,
+        redis_client: aioredis.Redis,
+        group: str = AGENT_QUEUE_GROUP,
+        visibility_timeout_ms: int = QUEUE_VISIBILITY_TIMEOUT_MS
+    ):
+        self.redis = redis_client
+        self.group = group
+        self.visibility_timeout_ms = visibility_timeout_ms
+
+    @staticmethod
+    def stream(lane: str) -> str:
+        if lane not in PRIORITY_LANES:
+            raise ValueError(f"Unknown priority lane: {lane}")
+        return f"{AGENT_QUEUE_PREFIX}:{lane}"
+
+    async def ensure_groups(self):
+        """Create the consumer group on every lane (idempotent)"""
+        for lane in PRIORITY_LANES:
+            try:
+                await self.redis.xgroup_create(self.stream(lane), self.group, id="0", mkstream=True)
+            except aioredis.ResponseError as e:
+                if "BUSYGROUP" not in str(e):
+                    raise
+
+    async def enqueue(self, agent_id: str, lane: str = "normal") -> str:
+        return await self.redis.xadd(self.stream(lane), {"agent_id": agent_id})
+
+    async def enqueue_many(self, agent_ids: Iterable[str], lane: str = "normal") -> List[str]:
+        """Enqueue several agents in one round trip"""
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for agent_id in agent_ids:
+                pipe.xadd(self.stream(lane), {"agent_id": agent_id})
+            return await pipe.execute()
+
+    async def claim(self, consumer: str, count: int, block_ms: int = 1000) -> List[Job]:
+        """Take up to `count` jobs: stalled ones first, then by lane priority.
+
+        The blocking read may return up to `count` per lane; callers queue the
+        overflow behind their concurrency limit (it stays touched meanwhile).
+        """
+        jobs = await self._reclaim_stalled(consumer, count)
+
+        for lane in PRIORITY_LANES:
+            if len(jobs) >= count:
+                return jobs
+            jobs += await self._read(consumer, [lane], count - len(jobs))
+
+        if not jobs:
+            # Nothing ready anywhere: block on all lanes at once
+            jobs = await self._read(consumer, PRIORITY_LANES, count, block_ms=block_ms)
+        return jobs
+
+    async def ack(self, job: Job):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.xack(self.stream(job.lane), self.group, job.message_id)
+            pipe.xdel(self.stream(job.lane), job.message_id)
+            await pipe.execute()
+
+    async def touch(self, consumer: str, jobs: Iterable[Job]):
+        """Reset the idle time of in-flight jobs so they aren't reclaimed"""
+        by_lane: Dict[str, List[str]] = {}
+        for job in jobs:
+            by_lane.setdefault(job.lane, []).append(job.message_id)
+        for lane, message_ids in by_lane.items():
+            await self.redis.xclaim(
+                self.stream(lane), self.group, consumer,
+                min_idle_time=0, message_ids=message_ids, justid=True
+            )
+
+    async def remove_consumer(self, consumer: str) -> int:
+        """Delete a stopped worker's consumer; returns its jobs still pending.
+
+        Lanes where it still holds jobs keep the consumer: DELCONSUMER would
+        drop them from the pending list, and they must stay reclaimable.
+        """
+        pending = 0
+        for lane in PRIORITY_LANES:
+            for info in await self.redis.xinfo_consumers(self.stream(lane), self.group):
+                if info["name"] != consumer:
+                    continue
+                if info["pending"]:
+                    pending += info["pending"]
+                else:
+                    await self.redis.xgroup_delconsumer(self.stream(lane), self.group, consumer)
+        return pending
+
+    async def prune_consumers(self, max_idle_ms: int = QUEUE_CONSUMER_MAX_IDLE_MS) -> int:
+        """Delete consumers of workers that died, once their jobs were reclaimed"""
+        removed = 0
+        for lane in PRIORITY_LANES:
+            for info in await self.redis.xinfo_consumers(self.stream(lane), self.group):
+                if not info["pending"] and info["idle"] >= max_idle_ms:
+                    await self.redis.xgroup_delconsumer(self.stream(lane), self.group, info["name"])
+                    removed += 1
+        return removed
+
+    async def depth(self) -> Dict[str, int]:
+        return {lane: await self.redis.xlen(self.stream(lane)) for lane in PRIORITY_LANES}
+
+    async def _read(
+        self,
+        consumer: str,
+        lanes: Iterable[str],
+        count: int,
+        block_ms: Optional[int] = None
+    ) -> List[Job]:
+        response = await self.redis.xreadgroup(
+            self.group, consumer,
+            {self.stream(lane): ">" for lane in lanes},
+            count=count, block=block_ms
+        )
+        jobs = []
+        for stream, messages in response or []:
+            lane = stream.rsplit(":", 1)[-1]
+            for message_id, fields in messages:
+                jobs.append(Job(lane, message_id, fields["agent_id"]))
+        return jobs
+
+    async def _reclaim_stalled(self, consumer: str, count: int) -> List[Job]:
+        jobs = []
+        for lane in PRIORITY_LANES:
+            if len(jobs) >= count:
+                break
+            response = await self.redis.xautoclaim(
+                self.stream(lane), self.group, consumer,
+                min_idle_time=self.visibility_timeout_ms,
+                start_id="0-0", count=count - len(jobs)
+            )
+            for message_id, fields in response[1]:
+                if fields:  # deleted entries come back empty
+                    jobs.append(Job(lane, message_id, fields["agent_id"]))
+        return jobs
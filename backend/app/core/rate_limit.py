@@ -0,0 +1,200 @@
+from typing import AsyncIterator, Dict, Any, Optional
+from app.core.llm_providers import LLMProvider, ProviderError
+from app.core.tracing import span
+import asyncio
+import os
+import random
+import time
+import weakref
+
+# Default per-key limits; agents can override with config["rate_limits"]
+LLM_DEFAULT_RPM = int(os.getenv("LLM_DEFAULT_RPM", "500"))
+LLM_DEFAULT_TPM = int(os.getenv("LLM_DEFAULT_TPM", "150000"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+LLM_RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", "1.0"))
+LLM_RETRY_MAX_SECONDS = float(os.getenv("LLM_RETRY_MAX_SECONDS", "60"))
+# Completion tokens reserved up front when the call doesn't set max_tokens
+LLM_EXPECTED_COMPLETION_TOKENS = int(os.getenv("LLM_EXPECTED_COMPLETION_TOKENS", "1000"))
+
+# Adaptive rate: halve on 429, creep back up on success, never below the floor
+RATE_FACTOR_DECREASE = 0.5
+RATE_FACTOR_INCREASE = 0.02
+RATE_FACTOR_FLOOR = 0.05
+
+# Two token buckets (requests, tokens) per provider+key, refilled per minute
+# and scaled by the adaptive factor. Returns 0 when the call may go ahead,
+# otherwise how many ms to wait before asking again.
+ACQUIRE_SCRIPT = """
+local b = redis.call('HMGET', KEYS[1], 'req', 'tok', 'ts', 'factor')
+local now = tonumber(ARGV[1])
+local factor = tonumber(b[4]) or 1
+local rpm = tonumber(ARGV[2]) * factor
+local tpm = tonumber(ARGV[3]) * factor
+local req = tonumber(b[1]) or rpm
+local tok = tonumber(b[2]) or tpm
+local ts = tonumber(b[3]) or now
+local elapsed = math.max(0, now - ts) / 60000
+req = math.min(rpm, req + elapsed * rpm)
+tok = math.min(tpm, tok + elapsed * tpm)
+local need = math.min(tonumber(ARGV[4]), tpm)
+local wait = 0
+if req < 1 then wait = math.max(wait, (1 - req) / rpm * 60000) end
+if tok < need then wait = math.max(wait, (need - tok) / tpm * 60000) end
+if wait == 0 then
+  req = req - 1
+  tok = tok - need
+end
+redis.call('HSET', KEYS[1], 'req', tostring(req), 'tok', tostring(tok), 'ts', ARGV[1])
+redis.call('PEXPIRE', KEYS[1], 600000)
+return math.ceil(wait)
+"""
+
+ADJUST_SCRIPT = """
+local f = tonumber(redis.call('HGET', KEYS[1], 'factor')) or 1
+f = math.max(tonumber(ARGV[3]), math.min(1, f * tonumber(ARGV[1]) + tonumber(ARGV[2])))
+redis.call('HSET', KEYS[1], 'factor', tostring(f))
+return tostring(f)
+"""
+
+class RateGovernor:
+    """Shared requests/min + tokens/min limiter keyed by provider and API key.
+
+    State lives in Redis so every worker draws from the same buckets. A 429
+    halves the effective rate for that key; successes restore it gradually.
+    """
+
+    def __init__(self, redis_client, rpm: int = LLM_DEFAULT_RPM, tpm: int = LLM_DEFAULT_TPM):
+        self.redis = redis_client
+        self.rpm = rpm
+        self.tpm = tpm
+        self._acquire = redis_client.register_script(ACQUIRE_SCRIPT)
+        self._adjust = redis_client.register_script(ADJUST_SCRIPT)
+
+    @staticmethod
+    def bucket(provider: str, key_hash: str) -> str:
+        return f"ratelimit:{provider}:{key_hash}"
+
+    async def acquire(self, bucket: str, tokens: int, rpm: Optional[int] = None, tpm: Optional[int] = None) -> float:
+        """Wait until the call fits in both buckets; returns seconds waited"""
+        start = time.monotonic()
+        while True:
+            wait_ms = await self._acquire(
+                keys=[bucket],
+                args=[int(time.time() * 1000), rpm or self.rpm, tpm or self.tpm, tokens]
+            )
+            if not wait_ms:
+                return time.monotonic() - start
+            # Jitter so waiting callers don't retry in lockstep
+            await asyncio.sleep(wait_ms / 1000 * (1 + random.random() * 0.1))
+
+    async def settle(self, bucket: str, reserved: int, actual: int):
+        """Charge (or refund) the difference between reserved and used tokens"""
+        if actual != reserved:
+            await self.redis.hincrbyfloat(bucket, 'tok', reserved - actual)
+
+    async def throttled(self, bucket: str):
+        await self._adjust(keys=[bucket], args=[RATE_FACTOR_DECREASE, 0, RATE_FACTOR_FLOOR])
+
+    async def succeeded(self, bucket: str):
+        await self._adjust(keys=[bucket], args=[1, RATE_FACTOR_INCREASE, RATE_FACTOR_FLOOR])
+
+def backoff_seconds(attempt: int, error: ProviderError) -> float:
+    """Exponential backoff with full jitter, honouring Retry-After"""
+    delay = min(LLM_RETRY_MAX_SECONDS, LLM_RETRY_BASE_SECONDS * 2 ** attempt)
+    delay = random.uniform(0, delay)
+    if error.retry_after:
+        delay = max(delay, error.retry_after)
+    return delay
+
+_rate_governors: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+def get_rate_governor(redis_client) -> RateGovernor:
+    """Shared governor for this Redis client (scripts registered once)"""
+    governor = _rate_governors.get(redis_client)
+    if governor is None:
+        governor = _rate_governors[redis_client] = RateGovernor(redis_client)
+    return governor
+
+class GovernedProvider(LLMProvider):
+    """Wraps a provider with the rate governor and retries.
+
+    Each call waits for capacity, retries 429/5xx/connection errors with
+    jittered backoff, and reports queue_wait_ms and retries in its result.
+    """
+
+    def __init__(
+        self,
+        provider: LLMProvider,
+        governor: RateGovernor,
+        key_hash: str,
+        rpm: Optional[int] = None,
+        tpm: Optional[int] = None
+    ):
+        self.provider = provider
+        self.governor = governor
+        self.rpm = rpm
+        self.tpm = tpm
+        self.name = provider.name
+        self.model = provider.model
+        self.bucket = governor.bucket(provider.name, key_hash)
+
+    def cost(self, tokens_prompt: int, tokens_completion: int) -> float:
+        return self.provider.cost(tokens_prompt, tokens_completion)
+
+    def reserve(self, prompt: str, kwargs: Dict) -> int:
+        return len(prompt) // 4 + kwargs.get('max_tokens', LLM_EXPECTED_COMPLETION_TOKENS)
+
+    async def complete(self, prompt: str, **kwargs) -> Dict[str, Any]:
+        reserved = self.reserve(prompt, kwargs)
+        queue_wait = 0.0
+        attempt = 0
+        while True:
+            with span('ratelimit.wait', attempt=attempt):
+                queue_wait += await self.governor.acquire(self.bucket, reserved, self.rpm, self.tpm)
+            try:
+                with span('llm.request', provider=self.name, model=self.model, attempt=attempt):
+                    result = await self.provider.complete(prompt, **kwargs)
+            except ProviderError as e:
+                if not e.retryable or attempt >= LLM_MAX_RETRIES:
+                    raise
+                if e.status_code == 429:
+                    await self.governor.throttled(self.bucket)
+                delay = backoff_seconds(attempt, e)
+                queue_wait += delay
+                with span('llm.backoff', attempt=attempt, status=e.status_code or 0):
+                    await asyncio.sleep(delay)
+                attempt += 1
+                continue
+
+            await self.governor.settle(self.bucket, reserved, result['tokens_total'])
+            await self.governor.succeeded(self.bucket)
+            return {**result, 'queue_wait_ms': int(queue_wait * 1000), 'retries': attempt}
+
+    async def stream(self, prompt: str, **kwargs) -> AsyncIterator[Dict[str, Any]]:
+        reserved = self.reserve(prompt, kwargs)
+        queue_wait = 0.0
+        attempt = 0
+        while True:
+            with span('ratelimit.wait', attempt=attempt):
+                queue_wait += await self.governor.acquire(self.bucket, reserved, self.rpm, self.tpm)
+            started = False
+            try:
+                async for chunk in self.provider.stream(prompt, **kwargs):
+                    if chunk['type'] == 'result':
+                        await self.governor.settle(self.bucket, reserved, chunk['tokens_total'])
+                        await self.governor.succeeded(self.bucket)
+                        chunk = {**chunk, 'queue_wait_ms': int(queue_wait * 1000), 'retries': attempt}
+                    started = True
+                    yield chunk
+                return
+            except ProviderError as e:
+                # Once tokens reached the viewer a retry would duplicate output
+                if started or not e.retryable or attempt >= LLM_MAX_RETRIES:
+                    raise
+                if e.status_code == 429:
+                    await self.governor.throttled(self.bucket)
+                delay = backoff_seconds(attempt, e)
+                queue_wait += delay
+                with span('llm.backoff', attempt=attempt, status=e.status_code or 0):
+                    await asyncio.sleep(delay)
+                attempt += 1
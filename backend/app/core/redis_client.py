@@ -0,0 +1,32 @@
+from typing import Optional
+import redis.asyncio as aioredis
+import os
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379")
+# Shared pool per process; callers wait up to REDIS_POOL_TIMEOUT for a free
+# connection instead of failing. Pub/sub listeners each hold one for good.
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "100"))
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", "10"))
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", "30"))
+
+_redis: Optional[aioredis.Redis] = None
+
+def get_redis() -> aioredis.Redis:
+    """Process-wide async Redis client (shared connection pool)"""
+    global _redis
+    if _redis is None:
+        pool = aioredis.BlockingConnectionPool.from_url(
+            REDIS_URL,
+            max_connections=REDIS_MAX_CONNECTIONS,
+            timeout=REDIS_POOL_TIMEOUT,
+            health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
+            decode_responses=True
+        )
+        _redis = aioredis.Redis(connection_pool=pool)
+    return _redis
+
+async def close_redis():
+    global _redis
+    if _redis is not None:
+        await _redis.aclose(close_connection_pool=True)
+        _redis = None
@@ -0,0 +1,120 @@
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+from datetime import datetime
+from app.models.agent import Agent
+import hashlib
+import json
+import os
+import time
+import weakref
+
+# Redis copy outlives a run so dashboards of finished agents stay cached
+STATUS_CACHE_TTL_SECONDS = int(os.getenv("STATUS_CACHE_TTL_SECONDS", "3600"))
+# In-process copy: how stale a poll may be when another process changed the agent
+STATUS_CACHE_LOCAL_TTL_MS = int(os.getenv("STATUS_CACHE_LOCAL_TTL_MS", "1000"))
+STATUS_CACHE_LOCAL_SIZE = int(os.getenv("STATUS_CACHE_LOCAL_SIZE", "10000"))
+
+# Fields of GET /api/agents/{id}; `result` is large and only loaded on request
+STATUS_FIELDS = (
+    'id', 'task', 'status', 'current_step', 'total_steps', 'cost_usd', 'runtime_seconds',
+    'confidence_score', 'estimated_cost_min', 'estimated_cost_max',
+    'created_at', 'started_at', 'completed_at', 'error'
+)
+
+def status_key(agent_id: str) -> str:
+    return f'agent_status:{agent_id}'
+
+def status_body(agent: Agent) -> str:
+    """JSON status of an agent (without `result`)"""
+    payload = {}
+    for field in STATUS_FIELDS:
+        value = getattr(agent, field)
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        elif field == 'status' and value is not None:
+            value = value.value
+        payload[field] = value
+    return json.dumps(payload)
+
+def body_etag(body: str) -> str:
+    return '"' + hashlib.blake2b(body.encode(), digest_size=12).hexdigest() + '"'
+
+class StatusCache:
+    """Agent status for polling clients, kept off the database.
+
+    Whoever changes an agent (the executor on every flush, the API on
+    create/resume) writes the serialized status and its ETag to Redis;
+    reads go to a short-lived in-process copy first, then Redis, and only
+    fall back to the database on a miss.
+    """
+
+    def __init__(
+        self,
+        redis_client,
+        ttl: int = STATUS_CACHE_TTL_SECONDS,
+        local_ttl_ms: int = STATUS_CACHE_LOCAL_TTL_MS,
+        local_size: int = STATUS_CACHE_LOCAL_SIZE
+    ):
+        self.redis_client = redis_client
+        self.ttl = ttl
+        self.local_ttl = local_ttl_ms / 1000.0
+        self.local_size = local_size
+        # agent_id -> (etag, body, expires_at)
+        self._local: "OrderedDict[str, Tuple[str, str, float]]" = OrderedDict()
+
+    async def get(self, agent_id: str) -> Optional[Tuple[str, str]]:
+        """(etag, body) or None on a miss"""
+        entry = self._local.get(agent_id)
+        if entry is not None and entry[2] > time.monotonic():
+            return entry[0], entry[1]
+
+        cached = await self.redis_client.get(status_key(agent_id))
+        if cached is None:
+            return None
+        etag, body = cached.split(' ', 1)
+        self._store_local(agent_id, etag, body)
+        return etag, body
+
+    async def put(self, agent: Agent, only_if_missing: bool = False) -> Tuple[str, str]:
+        """Cache the agent's current status.
+
+        Readers filling a miss from the database pass only_if_missing, so
+        they never overwrite a newer status written by the executor.
+        """
+        etag, body = self.encode(agent)
+        self._store_local(agent.id, etag, body)
+        await self.redis_client.set(status_key(agent.id), etag + ' ' + body, ex=self.ttl, nx=only_if_missing)
+        return etag, body
+
+    async def put_many(self, agents: List[Agent]):
+        """Cache several agents in one pipelined round trip"""
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            for agent in agents:
+                self.put_on(pipe, agent.id, *self.encode(agent))
+            await pipe.execute()
+
+    def put_on(self, pipe, agent_id: str, etag: str, body: str):
+        """Queue the write on the caller's Redis pipeline"""
+        self._store_local(agent_id, etag, body)
+        pipe.set(status_key(agent_id), etag + ' ' + body, ex=self.ttl)
+
+    def encode(self, agent: Agent) -> Tuple[str, str]:
+        body = status_body(agent)
+        return body_etag(body), body
+
+    def _store_local(self, agent_id: str, etag: str, body: str):
+        self._local.pop(agent_id, None)
+        self._local[agent_id] = (etag, body, time.monotonic() + self.local_ttl)
+        while len(self._local) > self.local_size:
+            self._local.popitem(last=False)
+
+# One cache per Redis client, so the in-process tier is shared by all requests
+# of a process but a cache never writes to a different server than its caller
+_status_caches: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+def get_status_cache(redis_client) -> StatusCache:
+    """Shared cache for this Redis client"""
+    cache = _status_caches.get(redis_client)
+    if cache is None:
+        cache = _status_caches[redis_client] = StatusCache(redis_client)
+    return cache
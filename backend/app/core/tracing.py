@@ -0,0 +1,245 @@
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from app.core.event_codec import JSON_CODEC
+import os
+import random
+import secrets
+import time
+
+# Share of agent runs traced (config.trace=true always traces one agent)
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.05"))
+# Spans past this many in one run are counted but not recorded
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "2000"))
+# Runs kept per agent (a resume is a new run) and how long they are kept
+TRACE_MAX_RUNS = int(os.getenv("TRACE_MAX_RUNS", "5"))
+TRACE_TTL_SECONDS = int(os.getenv("TRACE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+_current_trace: ContextVar[Optional["Trace"]] = ContextVar('trace', default=None)
+_current_span: ContextVar[Optional[int]] = ContextVar('span', default=None)
+
+class Span:
+    """One timed operation; a context manager that becomes the parent of spans opened inside it"""
+
+    __slots__ = ('trace', 'span_id', 'parent_id', 'name', 'attrs', 'start_ns', 'end_ns', '_token')
+
+    def __init__(self, trace: "Trace", span_id: int, parent_id: Optional[int], name: str, attrs: Dict[str, Any]):
+        self.trace = trace
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.name = name
+        self.attrs = attrs
+        self.start_ns = 0
+        self.end_ns: Optional[int] = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self) -> "Span":
+        self.start_ns = time.perf_counter_ns() - self.trace.origin_ns
+        self._token = _current_span.set(self.span_id)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.end_ns = time.perf_counter_ns() - self.trace.origin_ns
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.attrs['error'] = exc_type.__name__
+        return False
+
+class NullSpan:
+    """Stands in for a Span when the run isn't sampled"""
+
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self) -> "NullSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+NULL_SPAN = NullSpan()
+
+class Trace:
+    """Spans recorded during one sampled agent run.
+
+    Spans nest through context variables, so spans opened in tasks (parallel
+    steps, hedged calls) hang off whatever span was open when the task was
+    created, and code anywhere below AgentExecutor.run can call span()
+    without being handed the trace.
+    """
+
+    def __init__(self, agent_id: str, max_spans: int = TRACE_MAX_SPANS):
+        self.agent_id = agent_id
+        self.trace_id = secrets.token_hex(16)
+        self.started_at = time.time()
+        self.origin_ns = time.perf_counter_ns()
+        self.max_spans = max_spans
+        self.spans: List[Span] = []
+        self.dropped = 0
+
+    def span(self, name: str, **attrs) -> Any:
+        if len(self.spans) >= self.max_spans:
+            self.dropped += 1
+            return NULL_SPAN
+        span = Span(self, len(self.spans) + 1, _current_span.get(), name, attrs)
+        self.spans.append(span)
+        return span
+
+    def record(self) -> Dict[str, Any]:
+        """Compact form stored per agent: spans as [id, parent, name, start_us, duration_us, attrs]"""
+        end_ns = time.perf_counter_ns() - self.origin_ns
+        return {
+            'trace_id': self.trace_id,
+            'agent_id': self.agent_id,
+            'started_at': self.started_at,
+            'duration_us': end_ns // 1000,
+            'dropped': self.dropped,
+            'spans': [
+                [s.span_id, s.parent_id, s.name, s.start_ns // 1000,
+                 ((s.end_ns if s.end_ns is not None else end_ns) - s.start_ns) // 1000, s.attrs]
+                for s in self.spans
+            ]
+        }
+
+def start_trace(agent_id: str, force: Optional[bool] = None) -> Optional[Trace]:
+    """Decide whether this run is sampled and make its trace current (None if not)"""
+    sampled = force if force is not None else random.random() < TRACE_SAMPLE_RATE
+    trace = Trace(agent_id) if sampled else None
+    _current_trace.set(trace)
+    return trace
+
+def span(name: str, **attrs) -> Any:
+    """Span in the current run's trace; a no-op when the run isn't sampled"""
+    trace = _current_trace.get()
+    if trace is None:
+        return NULL_SPAN
+    return trace.span(name, **attrs)
+
+def trace_key(agent_id: str) -> str:
+    return f'trace:{agent_id}'
+
+class TraceStore:
+    """Recent traces per agent in Redis, newest first"""
+
+    def __init__(self, redis_client):
+        self.redis_client = redis_client
+
+    async def save(self, trace: Trace):
+        key = trace_key(trace.agent_id)
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            pipe.lpush(key, JSON_CODEC.encode(trace.record()))
+            pipe.ltrim(key, 0, TRACE_MAX_RUNS - 1)
+            pipe.expire(key, TRACE_TTL_SECONDS)
+            await pipe.execute()
+
+    async def load(self, agent_id: str, run: int = 0) -> Optional[Dict[str, Any]]:
+        """run=0 is the latest traced run, 1 the one before, ..."""
+        encoded = await self.redis_client.lindex(trace_key(agent_id), run)
+        return JSON_CODEC.decode(encoded) if encoded is not None else None
+
+def waterfall(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Spans in start order with depth, plus time per span name.
+
+    self_ms is a span's duration minus its direct children's, so it shows
+    where time went rather than what contained it (children running in
+    parallel can exceed their parent; self time stops at zero).
+    """
+    depth: Dict[int, int] = {}
+    child_us: Dict[int, int] = {}
+    spans = []
+    for span_id, parent_id, name, start_us, duration_us, attrs in sorted(record['spans'], key=lambda s: s[3]):
+        depth[span_id] = depth.get(parent_id, -1) + 1
+        if parent_id is not None:
+            child_us[parent_id] = child_us.get(parent_id, 0) + duration_us
+        spans.append({
+            'id': span_id,
+            'parent_id': parent_id,
+            'name': name,
+            'depth': depth[span_id],
+            'start_ms': start_us / 1000,
+            'duration_ms': duration_us / 1000,
+            'attrs': attrs
+        })
+
+    totals: Dict[str, Dict[str, Any]] = {}
+    for s in spans:
+        total = totals.setdefault(s['name'], {'name': s['name'], 'count': 0, 'total_ms': 0.0, 'self_ms': 0.0})
+        total['count'] += 1
+        total['total_ms'] += s['duration_ms']
+        total['self_ms'] += max(0.0, s['duration_ms'] - child_us.get(s['id'], 0) / 1000)
+    breakdown = sorted(totals.values(), key=lambda t: t['self_ms'], reverse=True)
+    for total in breakdown:
+        total['total_ms'] = round(total['total_ms'], 3)
+        total['self_ms'] = round(total['self_ms'], 3)
+
+    return {
+        'agent_id': record['agent_id'],
+        'trace_id': record['trace_id'],
+        'started_at': datetime.utcfromtimestamp(record['started_at']).isoformat(),
+        'duration_ms': record['duration_us'] / 1000,
+        'dropped_spans': record['dropped'],
+        'breakdown': breakdown,
+        'spans': spans
+    }
+
+def otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+def to_otlp(record: Dict[str, Any]) -> Dict[str, Any]:
+    """OpenTelemetry OTLP/JSON (POST it to a collector's /v1/traces)"""
+    start_ns = int(record['started_at'] * 1e9)
+    spans = []
+    for span_id, parent_id, name, start_us, duration_us, attrs in record['spans']:
+        span = {
+            'traceId': record['trace_id'],
+            'spanId': f'{span_id:016x}',
+            'name': name,
+            'kind': 1,  # SPAN_KIND_INTERNAL
+            'startTimeUnixNano': str(start_ns + start_us * 1000),
+            'endTimeUnixNano': str(start_ns + (start_us + duration_us) * 1000),
+            'attributes': [{'key': k, 'value': otlp_value(v)} for k, v in attrs.items()]
+        }
+        if parent_id is not None:
+            span['parentSpanId'] = f'{parent_id:016x}'
+        if 'error' in attrs:
+            span['status'] = {'code': 2, 'message': str(attrs['error'])}  # STATUS_CODE_ERROR
+        spans.append(span)
+    return {
+        'resourceSpans': [{
+            'resource': {'attributes': [
+                {'key': 'service.name', 'value': {'stringValue': 'agentos'}},
+                {'key': 'agent.id', 'value': {'stringValue': record['agent_id']}}
+            ]},
+            'scopeSpans': [{'scope': {'name': 'agentos'}, 'spans': spans}]
+        }]
+    }
+
+def to_chrome(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Chrome trace event format (chrome://tracing, Perfetto); one row per step"""
+    parents = {s[0]: s[1] for s in record['spans']}
+    steps = {s[0]: s[5].get('step', 0) for s in record['spans'] if s[2] == 'step'}
+
+    def lane(span_id: Optional[int]) -> int:
+        while span_id is not None:
+            if span_id in steps:
+                return steps[span_id]
+            span_id = parents.get(span_id)
+        return 0
+
+    return {
+        'traceEvents': [
+            {'name': name, 'cat': 'agentos', 'ph': 'X', 'ts': start_us, 'dur': duration_us,
+             'pid': 1, 'tid': lane(span_id), 'args': attrs}
+            for span_id, parent_id, name, start_us, duration_us, attrs in record['spans']
+        ],
+        'displayTimeUnit': 'ms',
+        'otherData': {'agent_id': record['agent_id'], 'trace_id': record['trace_id']}
+    }
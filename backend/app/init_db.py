@@ -1,10 +1,10 @@
 # backend/app/init_db.py
 from app.models.agent import Base
-from app.core.database import engine
+from app.core.database import get_engine
 
 def init_db():
     """Create all tables"""
-    Base.metadata.create_all(bind=engine)
+    Base.metadata.create_all(bind=get_engine())
     print("Database initialized!")
 
 if __name__ == "__main__":
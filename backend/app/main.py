@@ -1,13 +1,33 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+import asyncio
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
-from app.api import agents, websocket
-from app.core.database import engine
-from app.models.agent import Base
+from app.api import agents, costs, websocket
+from app.core.database import AsyncSessionLocal, DB_CREATE_SCHEMA, create_schema, close_db
+from app.core.estimator import get_estimator, load_encodings
+from app.core.llm_providers import provider_registry
+from app.core.monitoring import REGISTRY, CONTENT_TYPE, QUEUE_DEPTH
+from app.core.queue import AgentQueue
+from app.core.redis_client import get_redis, close_redis
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Owns the process-wide DB, Redis and provider pools: nothing connects at import"""
+    if DB_CREATE_SCHEMA:
+        await create_schema()
+    # Tokenizer files are fetched (or read from cache) here, not on a request
+    await asyncio.to_thread(load_encodings)
+    # Keep create_agent's cost/runtime estimates current with finished calls
+    estimator = asyncio.create_task(get_estimator().run(AsyncSessionLocal))
+    yield
+    estimator.cancel()
+    # Close pooled provider, Redis and database connections on shutdown
+    await websocket.manager.close()
+    await provider_registry.aclose()
+    await close_redis()
+    await close_db()
 
-app = FastAPI(title="AgentOS API")
+app = FastAPI(title="AgentOS API", lifespan=lifespan)
 
 # CORS
 app.add_middleware(
@@ -20,6 +40,7 @@ app.add_middleware(
 
 # Routes
 app.include_router(agents.router, prefix="/api/agents", tags=["agents"])
+app.include_router(costs.router, prefix="/api/costs", tags=["costs"])
 app.include_router(websocket.router, tags=["websocket"])
 
 @app.get("/")
@@ -28,4 +49,14 @@ def root():
 
 @app.get("/health")
 def health():
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy"}
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics for this API process (workers serve their own)"""
+    try:
+        for lane, depth in (await AgentQueue(get_redis()).depth()).items():
+            QUEUE_DEPTH.labels(lane).set(depth)
+    except Exception as e:
+        print(f"Queue depth unavailable: {e}")
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
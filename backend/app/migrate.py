@@ -0,0 +1,25 @@
+# backend/app/migrate.py
+"""Bring an existing database's schema up to date.
+
+    python -m app.migrate
+
+Creates missing tables, then applies the changes create_all can't make to
+existing ones (see app/core/migrations.py). Safe to re-run; run it before
+starting upgraded API or worker processes. With DB_CREATE_SCHEMA the API
+does the same on startup.
+"""
+import asyncio
+
+from app.core.database import close_db, create_schema
+
+async def main():
+    try:
+        applied = await create_schema()
+        for description in applied:
+            print(f"Applied: {description}")
+        print("Schema is up to date")
+    finally:
+        await close_db()
+
+if __name__ == "__main__":
+    asyncio.run(main())
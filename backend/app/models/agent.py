@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Float, DateTime, JSON, Enum
+from sqlalchemy import Column, String, Integer, Float, DateTime, JSON, Enum, Index, UniqueConstraint, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
 import enum
@@ -11,6 +11,7 @@ class AgentStatus(enum.Enum):
     PAUSED = "paused"
     COMPLETED = "completed"
     FAILED = "failed"
+    KILLED = "killed"
 
 class Agent(Base):
     __tablename__ = "agents"
@@ -27,7 +28,7 @@ class Agent(Base):
     # Execution
     current_step = Column(Integer, default=0)
     total_steps = Column(Integer)
-    checkpoint_data = Column(JSON)
+    checkpoint_data = Column(JSON)  # Small pointer into agent_checkpoints, see CheckpointLog
     
     # Metrics
     cost_usd = Column(Float, default=0.0)
@@ -52,9 +53,13 @@ class Agent(Base):
 
 class AgentEvent(Base):
     __tablename__ = "agent_events"
+    __table_args__ = (
+        # Serves per-agent timelines and keyset pagination (agent_id, id)
+        Index("ix_agent_events_agent_id_id", "agent_id", "id"),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
-    agent_id = Column(String, nullable=False, index=True)
+    agent_id = Column(String, nullable=False)
     
     step = Column(Integer)
     action = Column(String)  # "llm_call", "tool_use", "checkpoint", etc
@@ -63,4 +68,75 @@ class AgentEvent(Base):
     data = Column(JSON)
     cost_usd = Column(Float, default=0.0)
     
-    timestamp = Column(DateTime, default=datetime.utcnow, index=True)
\ No newline at end of file
+    timestamp = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+class CostRollup(Base):
+    """Spend per agent/provider/model/key per hour, kept up to date as events are written"""
+    __tablename__ = "cost_rollups"
+    __table_args__ = (
+        UniqueConstraint("agent_id", "provider", "model", "key_hash", "bucket_start",
+                         name="uq_cost_rollups_bucket"),
+        Index("ix_cost_rollups_bucket_start", "bucket_start"),
+    )
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    agent_id = Column(String, nullable=False)
+    provider = Column(String, nullable=False)
+    model = Column(String, nullable=False)
+    key_hash = Column(String, nullable=False)
+    bucket_start = Column(DateTime, nullable=False)  # Hour the events fall in
+    
+    cost_usd = Column(Float, default=0.0)
+    tokens = Column(Integer, default=0)
+    calls = Column(Integer, default=0)
+
+
+class AgentCheckpoint(Base):
+    """Append-only checkpoint log: per-step deltas plus periodic snapshots"""
+    __tablename__ = "agent_checkpoints"
+    __table_args__ = (
+        UniqueConstraint("agent_id", "seq", name="uq_agent_checkpoints_seq"),
+    )
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    agent_id = Column(String, nullable=False)
+    seq = Column(Integer, nullable=False)
+    kind = Column(String, nullable=False)  # "delta" or "snapshot"
+    payload = Column(LargeBinary, nullable=False)  # zlib-compressed JSON
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class CheckpointBlob(Base):
+    """Large checkpoint values, stored once per agent and referenced by digest"""
+    __tablename__ = "checkpoint_blobs"
+    
+    agent_id = Column(String, primary_key=True)
+    digest = Column(String, primary_key=True)  # sha256 of the uncompressed value
+    data = Column(LargeBinary, nullable=False)  # zlib-compressed UTF-8
+    size = Column(Integer)  # Uncompressed bytes
+
+
+class EventArchive(Base):
+    """Summary of an agent's archived events (see app/core/archive.py)"""
+    __tablename__ = "event_archives"
+    
+    agent_id = Column(String, primary_key=True)
+    event_count = Column(Integer, default=0)
+    first_event_id = Column(Integer)
+    last_event_id = Column(Integer)
+    size_bytes = Column(Integer)  # Compressed, across all chunks
+    
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+
+class EventArchiveChunk(Base):
+    """A run of consecutive archived events, keyed by the first event id"""
+    __tablename__ = "event_archive_chunks"
+    
+    agent_id = Column(String, primary_key=True)
+    first_event_id = Column(Integer, primary_key=True)
+    last_event_id = Column(Integer, nullable=False)
+    event_count = Column(Integer, nullable=False)
+    payload = Column(LargeBinary, nullable=False)  # zlib-compressed JSON list
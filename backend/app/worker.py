@@ -0,0 +1,193 @@
+# backend/app/worker.py
+"""Agent worker: runs queued agents outside the API process.
+
+    python -m app.worker
+
+Run as many of these as needed, on any node that can reach Postgres and Redis.
+"""
+from typing import Dict
+import asyncio
+import json
+import os
+import signal
+import socket
+import uuid
+
+from app.core.archive import EventArchiver, EVENT_ARCHIVE_INTERVAL_SECONDS
+from app.core.checkpoints import sweep_checkpoints
+from app.core.database import AsyncSessionLocal, close_db
+from app.core.estimator import get_estimator, load_encodings
+from app.core.llm_providers import provider_registry
+from app.core.monitoring import ACTIVE_AGENTS, WORKER_METRICS_PORT, serve_metrics
+from app.core.orchestrator import AgentExecutor, KILL_CHANNEL
+from app.core.queue import AgentQueue, Job
+from app.core.redis_client import get_redis, close_redis
+from app.models.agent import Agent, AgentStatus
+
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "20"))
+WORKER_SHUTDOWN_GRACE_SECONDS = float(os.getenv("WORKER_SHUTDOWN_GRACE_SECONDS", "30"))
+ARCHIVE_LOCK_KEY = "lock:event_archive"
+
+# A job for an agent in one of these is acked without running it: finished
+# ones are reclaimed duplicates, paused ones wait for /resume to re-enqueue them
+SKIP_STATUSES = (AgentStatus.COMPLETED, AgentStatus.FAILED, AgentStatus.KILLED, AgentStatus.PAUSED)
+
+class Worker:
+    def __init__(self, queue: AgentQueue, concurrency: int = WORKER_CONCURRENCY, name: str = None):
+        self.queue = queue
+        self.concurrency = concurrency
+        self.name = name or f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+        self.slots = asyncio.Semaphore(concurrency)
+        self.in_flight: Dict[str, Job] = {}
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self.executors: Dict[str, AgentExecutor] = {}  # agent_id -> running executor
+        self.stopping = asyncio.Event()
+
+    async def run(self):
+        """Claim jobs until asked to stop, then drain in-flight agents"""
+        await self.queue.ensure_groups()
+        await asyncio.to_thread(load_encodings)
+        pruned = await self.queue.prune_consumers()
+        if pruned:
+            print(f"Removed {pruned} dead queue consumers")
+        heartbeat = asyncio.create_task(self._heartbeat())
+        kill_listener = asyncio.create_task(self._listen_for_kills())
+        archiver = asyncio.create_task(self._archive_events())
+        estimator = asyncio.create_task(get_estimator().run(AsyncSessionLocal))
+        ACTIVE_AGENTS.set_function(lambda: len(self.executors))
+        metrics_server = await serve_metrics(WORKER_METRICS_PORT) if WORKER_METRICS_PORT else None
+        print(f"Worker {self.name} started (concurrency={self.concurrency})")
+
+        while not self.stopping.is_set():
+            free = self.concurrency - len(self.in_flight)
+            if free <= 0:
+                await asyncio.sleep(0.05)
+                continue
+            for job in await self.queue.claim(self.name, free):
+                self.in_flight[job.message_id] = job
+                self.tasks[job.message_id] = asyncio.create_task(self._process(job))
+
+        # Unfinished jobs stay pending and are reclaimed by another worker
+        if self.tasks:
+            await asyncio.wait(list(self.tasks.values()), timeout=WORKER_SHUTDOWN_GRACE_SECONDS)
+        leftover = list(self.tasks.values())
+        for task in leftover:
+            task.cancel()
+        # Let cancelled runs unwind before Redis and the database are closed
+        await asyncio.gather(*leftover, return_exceptions=True)
+        try:
+            pending = await self.queue.remove_consumer(self.name)
+            if pending:
+                print(f"Worker {self.name} left {pending} unfinished jobs for reclaim")
+        except Exception as e:
+            print(f"Consumer cleanup failed: {e}")
+        heartbeat.cancel()
+        kill_listener.cancel()
+        archiver.cancel()
+        estimator.cancel()
+        if metrics_server is not None:
+            metrics_server.close()
+        print(f"Worker {self.name} stopped")
+
+    def stop(self):
+        self.stopping.set()
+
+    async def _process(self, job: Job):
+        async with self.slots:
+            try:
+                try:
+                    async with AsyncSessionLocal() as db:
+                        agent = await db.get(Agent, job.agent_id)
+                        if agent and agent.status not in SKIP_STATUSES:
+                            executor = AgentExecutor(job.agent_id, db, redis_client=self.queue.redis)
+                            executor.agent = agent
+                            self.executors[job.agent_id] = executor
+                            await executor.run()
+                except Exception as e:
+                    print(f"Agent {job.agent_id} failed: {e}")
+                # Only a finished run is acked: a task cancelled at shutdown leaves
+                # its job pending for another worker to reclaim and resume
+                await self.queue.ack(job)
+            finally:
+                self.executors.pop(job.agent_id, None)
+                self.in_flight.pop(job.message_id, None)
+                self.tasks.pop(job.message_id, None)
+
+    async def _heartbeat(self):
+        interval = self.queue.visibility_timeout_ms / 3000
+        while True:
+            await asyncio.sleep(interval)
+            if self.in_flight:
+                try:
+                    await self.queue.touch(self.name, list(self.in_flight.values()))
+                except Exception as e:
+                    print(f"Heartbeat failed: {e}")
+
+    async def _listen_for_kills(self):
+        """Interrupt agents this worker owns as soon as a kill is published"""
+        while True:
+            pubsub = self.queue.redis.pubsub()
+            try:
+                await pubsub.subscribe(KILL_CHANNEL)
+                async for message in pubsub.listen():
+                    if message['type'] != 'message':
+                        continue
+                    request = json.loads(message['data'])
+                    executor = self.executors.get(request['agent_id'])
+                    if executor is not None:
+                        executor.kill(request.get('requested_at'))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Kill listener error: {e}")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+    async def _archive_events(self):
+        """Periodically archive old events and drop finished agents' checkpoints; one worker per interval does it"""
+        while True:
+            await asyncio.sleep(EVENT_ARCHIVE_INTERVAL_SECONDS)
+            try:
+                acquired = await self.queue.redis.set(
+                    ARCHIVE_LOCK_KEY, self.name, nx=True, ex=int(EVENT_ARCHIVE_INTERVAL_SECONDS)
+                )
+                if not acquired:
+                    continue
+                async with AsyncSessionLocal() as db:
+                    archiver = EventArchiver(db)
+                    total = 0
+                    while True:
+                        moved = await archiver.run_once()
+                        if not moved:
+                            break
+                        total += moved
+                    swept = 0
+                    while True:
+                        agents = await sweep_checkpoints(db)
+                        if not agents:
+                            break
+                        swept += agents
+                if total:
+                    print(f"Archived {total} events")
+                if swept:
+                    print(f"Dropped checkpoints of {swept} finished agents")
+            except Exception as e:
+                print(f"Event archiving failed: {e}")
+
+async def main():
+    worker = Worker(AgentQueue(get_redis()))
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stop)
+
+    try:
+        await worker.run()
+    finally:
+        await provider_registry.aclose()
+        await close_redis()
+        await close_db()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,141 @@
+"""Bulk submission and batch-mode execution against the fake provider.
+
+Run from backend/:
+
+    python -m benchmarks.bench_batch [--agents 1000] [--run-agents 200]
+
+Part 1 creates --agents agents with one POST /api/agents/ each and then
+with a single POST /api/agents/batch. Part 2 runs --run-agents agents
+directly and in batch mode (config.batch) and compares wall time, spend and
+provider requests. Uses ASYNC_DATABASE_URL / REDIS_URL when set, otherwise
+SQLite (aiosqlite) in a temp directory and fakeredis.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import insert, select, func
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from app.api import agents
+from app.core import batching
+from app.core.database import get_async_db
+from app.core.llm_providers import get_provider
+from app.core.orchestrator import AgentExecutor
+from app.core.queue import AgentQueue
+from app.core.status_cache import get_status_cache
+from app.models.agent import Base, Agent, AgentStatus
+from benchmarks.fakes import register_fake_provider
+
+
+def make_redis():
+    if os.getenv("REDIS_URL"):
+        import redis.asyncio as aioredis
+        return aioredis.Redis.from_url(os.environ["REDIS_URL"], decode_responses=True)
+    import fakeredis
+    return fakeredis.FakeAsyncRedis(decode_responses=True)
+
+
+def make_app(session_factory, redis_client) -> FastAPI:
+    async def get_db():
+        async with session_factory() as db:
+            yield db
+
+    app = FastAPI()
+    app.include_router(agents.router, prefix="/api/agents")
+    app.dependency_overrides[get_async_db] = get_db
+    app.dependency_overrides[agents.get_queue] = lambda: AgentQueue(redis_client)
+    app.dependency_overrides[agents.get_agent_status_cache] = lambda: get_status_cache(redis_client)
+    return app
+
+
+async def bench_submission(session_factory, redis_client, n: int):
+    payload = {'task': 'benchmark task', 'provider': 'fake', 'model': 'fake-1', 'api_key': 'bench'}
+    transport = httpx.ASGITransport(app=make_app(session_factory, redis_client))
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        start = time.perf_counter()
+        for _ in range(n):
+            (await client.post("/api/agents/", json=payload)).raise_for_status()
+        single = time.perf_counter() - start
+
+        start = time.perf_counter()
+        response = await client.post("/api/agents/batch", json={'agents': [payload] * n})
+        response.raise_for_status()
+        bulk = time.perf_counter() - start
+
+    print(f"submit {n} agents: one POST each {single:7.2f}s ({n / single:8.0f}/s)")
+    print(f"{'':>{len(str(n)) + 16}}POST /batch   {bulk:7.2f}s ({n / bulk:8.0f}/s)  {single / bulk:.0f}x")
+
+
+async def run_agents(session_factory, redis_client, n: int, batch: bool) -> dict:
+    rows = [agents.agent_row(agents.AgentCreate(task='benchmark task', provider='fake',
+                                                model='fake-1', api_key='bench', batch=batch))
+            for _ in range(n)]
+    async with session_factory() as db:
+        await db.execute(insert(Agent), rows)
+        await db.commit()
+
+    async def run_one(agent_id: str):
+        async with session_factory() as db:
+            await AgentExecutor(agent_id, db, redis_client=redis_client).run()
+
+    provider = get_provider('fake', api_key='bench', model='fake-1')
+    calls, batches = provider.calls, provider.batches_submitted
+    start = time.perf_counter()
+    await asyncio.gather(*(run_one(row['id']) for row in rows))
+    elapsed = time.perf_counter() - start
+
+    async with session_factory() as db:
+        cost = await db.scalar(
+            select(func.sum(Agent.cost_usd)).where(Agent.id.in_([row['id'] for row in rows]))
+        )
+        completed = await db.scalar(
+            select(func.count()).select_from(Agent).where(
+                Agent.id.in_([row['id'] for row in rows]),
+                Agent.status == AgentStatus.COMPLETED
+            )
+        )
+    return {
+        'seconds': elapsed,
+        'cost': cost or 0.0,
+        'completed': completed,
+        'requests': (provider.calls - calls) + (provider.batches_submitted - batches),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--agents', type=int, default=1000)
+    parser.add_argument('--run-agents', type=int, default=200)
+    parser.add_argument('--latency-ms', type=float, default=200.0)
+    parser.add_argument('--batch-latency-ms', type=float, default=1000.0)
+    args = parser.parse_args()
+
+    register_fake_provider(latency_ms=args.latency_ms, batch_latency_ms=args.batch_latency_ms)
+    # Short collection window and polling so the run finishes in seconds
+    batching._batch_collector = batching.BatchCollector(max_wait_seconds=0.2, poll_seconds=0.1)
+
+    url = os.getenv("ASYNC_DATABASE_URL") or f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/bench.db"
+    engine = create_async_engine(url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    redis_client = make_redis()
+
+    await bench_submission(session_factory, redis_client, args.agents)
+
+    print(f"\n{'mode':>8} {'agents':>7} {'done':>6} {'secs':>7} {'cost':>10} {'requests':>9}")
+    for batch in (False, True):
+        r = await run_agents(session_factory, redis_client, args.run_agents, batch)
+        print(f"{'batch' if batch else 'direct':>8} {args.run_agents:>7} {r['completed']:>6} "
+              f"{r['seconds']:>7.2f} {r['cost']:>10.4f} {r['requests']:>9}")
+
+    await engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
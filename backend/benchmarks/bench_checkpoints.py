@@ -0,0 +1,117 @@
+"""Checkpoint write and resume cost: full-state overwrite vs. CheckpointLog.
+
+Run from backend/:
+
+    python -m benchmarks.bench_checkpoints [--steps 10,100,500] [--output-bytes 2000]
+
+For each state size, checkpoints an agent once per step the old way (rewrite
+Agent.checkpoint_data with the whole state) and with the append-only log,
+committing after each, then times rebuilding the state for a resume.
+Uses ASYNC_DATABASE_URL when set, otherwise SQLite (aiosqlite) in a temp
+directory.
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+import uuid
+
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from app.models.agent import Base, Agent, AgentStatus
+from app.core.checkpoints import CheckpointLog
+
+WORDS = ("agent", "token", "result", "provider", "step", "summary", "cost", "model",
+         "latency", "cache", "budget", "stream", "queue", "worker", "event", "graph")
+
+
+def step_output(rng: random.Random, size: int) -> str:
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return ' '.join(words)
+
+
+async def new_agent(session_factory) -> str:
+    agent_id = str(uuid.uuid4())
+    async with session_factory() as db:
+        db.add(Agent(id=agent_id, task='bench', provider='fake', model='fake-1',
+                     status=AgentStatus.RUNNING, config={}))
+        await db.commit()
+    return agent_id
+
+
+async def run_overwrite(session_factory, outputs) -> dict:
+    """Baseline: the whole state goes into Agent.checkpoint_data every step"""
+    agent_id = await new_agent(session_factory)
+    async with session_factory() as db:
+        agent = await db.get(Agent, agent_id)
+        state = {'completed': {}}
+        start = time.perf_counter()
+        for i, content in enumerate(outputs):
+            state['completed'][f's{i}'] = {'content': content, 'tokens': 500, 'cost': 0.01}
+            agent.checkpoint_data = {'current_step': i + 1, 'completed': dict(state['completed'])}
+            await db.commit()
+        write = time.perf_counter() - start
+
+    async with session_factory() as db:
+        start = time.perf_counter()
+        agent = await db.get(Agent, agent_id)
+        restored = agent.checkpoint_data['completed']
+        resume = time.perf_counter() - start
+    assert len(restored) == len(outputs)
+    return {'write': write, 'resume': resume}
+
+
+async def run_log(session_factory, outputs) -> dict:
+    agent_id = await new_agent(session_factory)
+    async with session_factory() as db:
+        log = CheckpointLog(db, agent_id)
+        start = time.perf_counter()
+        for i, content in enumerate(outputs):
+            await log.append({
+                'current_step': i + 1,
+                'completed': {f's{i}': {'content': content, 'tokens': 500, 'cost': 0.01}}
+            })
+            await db.commit()
+        write = time.perf_counter() - start
+
+    async with session_factory() as db:
+        start = time.perf_counter()
+        restored = (await CheckpointLog(db, agent_id).load())['completed']
+        resume = time.perf_counter() - start
+    assert len(restored) == len(outputs)
+    return {'write': write, 'resume': resume}
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--steps', default='10,100,500')
+    parser.add_argument('--output-bytes', type=int, default=2000)
+    args = parser.parse_args()
+
+    url = os.getenv("ASYNC_DATABASE_URL") or f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/bench.db"
+    engine = create_async_engine(url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+    print(f"{'steps':>6} {'overwrite/ckpt':>15} {'log/ckpt':>10} {'overwrite resume':>17} {'log resume':>11}")
+    for n in (int(level) for level in args.steps.split(',')):
+        rng = random.Random(n)
+        outputs = [step_output(rng, args.output_bytes) for _ in range(n)]
+        before = await run_overwrite(session_factory, outputs)
+        after = await run_log(session_factory, outputs)
+        print(f"{n:>6} {before['write'] / n * 1000:>13.2f}ms {after['write'] / n * 1000:>8.2f}ms "
+              f"{before['resume'] * 1000:>15.1f}ms {after['resume'] * 1000:>9.1f}ms")
+
+    await engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,105 @@
+"""How many agents one worker process can drive at once.
+
+Run from backend/:
+
+    python -m benchmarks.bench_concurrency [--levels 10,100,500] [--latency-ms 200]
+
+Each level starts N agents against the fake provider in a single event loop
+and reports agents/sec and event-loop lag (how late a 10ms ticker wakes up),
+which is what every other agent and WebSocket in the worker would feel.
+Uses ASYNC_DATABASE_URL / REDIS_URL when set, otherwise SQLite (aiosqlite)
+in a temp directory and fakeredis.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+import uuid
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from app.models.agent import Base, Agent, AgentStatus
+from app.core.orchestrator import AgentExecutor
+from benchmarks.fakes import register_fake_provider
+
+
+def make_redis():
+    if os.getenv("REDIS_URL"):
+        import redis.asyncio as aioredis
+        return aioredis.Redis.from_url(os.environ["REDIS_URL"], decode_responses=True)
+    import fakeredis
+    return fakeredis.FakeAsyncRedis(decode_responses=True)
+
+
+async def measure_lag(stop: asyncio.Event, samples: list, interval: float = 0.01):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append((time.perf_counter() - start - interval) * 1000)
+
+
+async def run_level(session_factory, redis_client, n: int) -> dict:
+    ids = [str(uuid.uuid4()) for _ in range(n)]
+    async with session_factory() as db:
+        await db.execute(insert(Agent), [{
+            'id': agent_id, 'task': 'benchmark task', 'provider': 'fake',
+            'model': 'fake-1', 'status': AgentStatus.PENDING,
+            'config': {'api_key': 'bench', 'max_cost_usd': 10.0},
+            'current_step': 0, 'cost_usd': 0.0, 'runtime_seconds': 0
+        } for agent_id in ids])
+        await db.commit()
+
+    async def run_one(agent_id: str):
+        async with session_factory() as db:
+            await AgentExecutor(agent_id, db, redis_client=redis_client).run()
+
+    lag: list = []
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(measure_lag(stop, lag))
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(run_one(agent_id) for agent_id in ids), return_exceptions=True)
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await ticker
+    lag.sort()
+    return {
+        'agents': n,
+        'failed': sum(isinstance(r, Exception) for r in results),
+        'seconds': elapsed,
+        'agents_per_sec': n / elapsed,
+        'lag_p50_ms': statistics.median(lag) if lag else 0.0,
+        'lag_p99_ms': lag[int(len(lag) * 0.99)] if lag else 0.0,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--levels', default='10,100,500')
+    parser.add_argument('--latency-ms', type=float, default=200.0)
+    args = parser.parse_args()
+
+    register_fake_provider(latency_ms=args.latency_ms)
+
+    url = os.getenv("ASYNC_DATABASE_URL") or f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/bench.db"
+    engine = create_async_engine(url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    redis_client = make_redis()
+
+    print(f"{'agents':>8} {'failed':>7} {'secs':>7} {'agents/s':>9} {'lag p50':>8} {'lag p99':>8}")
+    for n in (int(level) for level in args.levels.split(',')):
+        r = await run_level(session_factory, redis_client, n)
+        print(f"{r['agents']:>8} {r['failed']:>7} {r['seconds']:>7.2f} {r['agents_per_sec']:>9.1f} "
+              f"{r['lag_p50_ms']:>6.1f}ms {r['lag_p99_ms']:>6.1f}ms")
+
+    await engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,110 @@
+"""CPU and bytes per live event for each wire format.
+
+Run from backend/:
+
+    python -m benchmarks.bench_event_codec [--events 20000]
+
+Encodes a realistic mix of events (llm_call, llm_response, llm_delta and
+an occasional large payload) with the previous path (json.dumps plus an
+isoformat() per event), the JSON codec (orjson when installed) and
+MessagePack, and reports encode time and bytes per event. The deflate
+rows apply permessage-deflate as a WebSocket server would (one stream per
+connection with context takeover, sync flush per message) to show what
+negotiating compression saves on top.
+"""
+from datetime import datetime
+import argparse
+import json
+import random
+import time
+import zlib
+
+from app.core.event_codec import CODECS, EVENT_FIELD_MAX_CHARS, encode_event, orjson
+
+
+def sample_events(n: int) -> list:
+    rng = random.Random(0)
+    words = ['agent', 'step', 'result', 'token', 'model', 'the', 'of', 'analysis', 'data', 'report']
+    events = []
+    for i in range(n):
+        kind = rng.random()
+        if kind < 0.6:
+            action, data = 'llm_delta', {'text': ' '.join(rng.choice(words) for _ in range(20))}
+        elif kind < 0.8:
+            action, data = 'llm_call', {'step_id': 's1', 'provider': 'openai', 'model': 'gpt-4',
+                                        'prompt_preview': ' '.join(rng.choice(words) for _ in range(15))}
+        elif kind < 0.99:
+            action, data = 'llm_response', {
+                'provider': 'openai', 'model': 'gpt-4', 'tokens': 812, 'tokens_completion': 600,
+                'duration_seconds': 4.2, 'ttft_ms': 640, 'queue_wait_ms': 0, 'retries': 0,
+                'response_preview': ' '.join(rng.choice(words) for _ in range(30))
+            }
+        else:
+            # e.g. a tool result or error carrying a large document
+            action, data = 'tool_result', {'output': ' '.join(rng.choice(words) for _ in range(10000))}
+        events.append(('agent-' + str(i % 50), action, 'completed', i % 7, data, 0.001))
+    return events
+
+
+def previous_encode(agent_id, action, status, step, data, cost):
+    return json.dumps({
+        'agent_id': agent_id, 'action': action, 'status': status, 'step': step,
+        'data': data, 'cost': cost, 'timestamp': datetime.utcnow().isoformat()
+    })
+
+
+def deflate_sizes(messages: list) -> int:
+    compressor = zlib.compressobj(wbits=-15)
+    total = 0
+    for message in messages:
+        data = message.encode() if isinstance(message, str) else message
+        # The trailing 00 00 ff ff of a sync flush is not sent (RFC 7692)
+        total += len(compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)) - 4
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--events', type=int, default=20000)
+    args = parser.parse_args()
+    events = sample_events(args.events)
+    n = len(events)
+
+    rows = []
+
+    start = time.perf_counter()
+    previous = [previous_encode(*event) for event in events]
+    rows.append(('json.dumps (before)', time.perf_counter() - start, previous))
+
+    start = time.perf_counter()
+    current = [encode_event(*event, datetime.utcnow()) for event in events]
+    name = 'orjson' if orjson is not None else 'json'
+    rows.append((f'{name} + truncate', time.perf_counter() - start, current))
+
+    if 'msgpack' in CODECS:
+        codec = CODECS['msgpack']
+        start = time.perf_counter()
+        packed = [codec.encode({
+            'agent_id': agent_id, 'action': action, 'status': status, 'step': step,
+            'data': data, 'cost': cost, 'timestamp': datetime.utcnow()
+        }) for agent_id, action, status, step, data, cost in events]
+        rows.append(('msgpack (no truncate)', time.perf_counter() - start, packed))
+
+        # What the fan-out does for a msgpack socket: transcode the JSON once
+        start = time.perf_counter()
+        transcoded = [codec.encode(CODECS['json'].decode(message)) for message in current]
+        rows.append(('msgpack from json', time.perf_counter() - start, transcoded))
+
+    print(f"{n} events, strings capped at {EVENT_FIELD_MAX_CHARS} chars\n")
+    print(f"{'format':<24} {'us/event':>9} {'bytes/event':>12} {'+deflate':>10}")
+    for label, seconds, messages in rows:
+        size = sum(len(m.encode()) if isinstance(m, str) else len(m) for m in messages) / n
+        print(f"{label:<24} {seconds / n * 1e6:>9.2f} {size:>12.0f} {deflate_sizes(messages) / n:>10.0f}")
+
+    start = time.perf_counter()
+    deflate_sizes(current)
+    print(f"\npermessage-deflate CPU: {(time.perf_counter() - start) / n * 1e6:.2f} us/event per connection")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Events/sec for per-event commits vs. the buffered EventSink.
+
+Run from backend/:
+
+    python -m benchmarks.bench_event_sink [--events 2000] [--batch 50]
+
+Uses ASYNC_DATABASE_URL / REDIS_URL when set, otherwise SQLite (aiosqlite)
+in a temp directory and fakeredis.
+"""
+from datetime import datetime
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from app.models.agent import Base, AgentEvent
+from app.core.event_sink import EventSink
+
+
+async def make_engine():
+    url = os.getenv("ASYNC_DATABASE_URL")
+    if url:
+        engine = create_async_engine(url)
+    else:
+        # Many agents write at once: WAL lets reads proceed during a commit and
+        # writers wait for the lock instead of failing after SQLite's 5s default
+        engine = create_async_engine(
+            f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/bench.db", connect_args={'timeout': 60}
+        )
+        event.listen(engine.sync_engine, 'connect',
+                     lambda conn, _: conn.execute('PRAGMA journal_mode=WAL'))
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    return engine
+
+
+def make_redis():
+    if os.getenv("REDIS_URL"):
+        import redis.asyncio as aioredis
+        return aioredis.Redis.from_url(os.environ["REDIS_URL"], decode_responses=True)
+    import fakeredis
+    return fakeredis.FakeAsyncRedis(decode_responses=True)
+
+
+def payload(i: int) -> dict:
+    return {'tokens': i, 'response_preview': 'x' * 200}
+
+
+async def run_unbuffered(db, redis_client, n: int) -> float:
+    """Baseline: the original add + commit + publish per event"""
+    start = time.perf_counter()
+    for i in range(n):
+        db.add(AgentEvent(agent_id='bench', step=i, action='llm_response',
+                          status='completed', data=payload(i), cost_usd=0.01))
+        await db.commit()
+        await redis_client.publish('agent:bench', json.dumps({
+            'agent_id': 'bench', 'action': 'llm_response', 'status': 'completed',
+            'step': i, 'data': payload(i), 'cost': 0.01,
+            'timestamp': datetime.utcnow().isoformat()
+        }))
+    return time.perf_counter() - start
+
+
+async def run_buffered(db, redis_client, n: int, batch: int) -> float:
+    sink = EventSink(db, redis_client, max_batch=batch)
+    start = time.perf_counter()
+    for i in range(n):
+        await sink.emit('bench', i, 'llm_response', 'completed', payload(i), 0.01)
+    await sink.flush()
+    return time.perf_counter() - start
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--events', type=int, default=2000)
+    parser.add_argument('--batch', type=int, default=50)
+    args = parser.parse_args()
+
+    engine = await make_engine()
+    redis_client = make_redis()
+
+    async with async_sessionmaker(engine, expire_on_commit=False)() as db:
+        before = await run_unbuffered(db, redis_client, args.events)
+        after = await run_buffered(db, redis_client, args.events, args.batch)
+    await engine.dispose()
+
+    print(f"per-event commit: {args.events / before:10.0f} events/sec")
+    print(f"EventSink (b={args.batch}): {args.events / after:10.0f} events/sec")
+    print(f"speedup:          {before / after:10.1f}x")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,95 @@
+"""Step latency and spend with and without hedged requests.
+
+Run from backend/:
+
+    python -m benchmarks.bench_hedging [--calls 200] [--tail-rate 0.05]
+
+The primary fake provider answers in ~100 ms but tail_rate of its calls
+take --tail-ms (a degraded endpoint); the fallback is a second fake with
+the same latency profile and no tail. Calls run one after another through
+the bare primary, through HedgedProvider with failover only, and with
+hedging on, reporting p50/p99 latency and spend per call. The hedge
+threshold's floor (LLM_HEDGE_MIN_DELAY_SECONDS) is lowered to --min-delay
+so it can follow the fake's millisecond latencies.
+
+Before each routed run every route gets --warmup calls (default
+LLM_HEDGE_MIN_SAMPLES) outside the measurement, as a worker that has been
+serving traffic would have; without them the first calls wait out
+LLM_HEDGE_DEFAULT_DELAY_SECONDS and any tail among them lands in the p99.
+"""
+import argparse
+import asyncio
+import time
+
+from app.core import hedging
+from app.core.hedging import HedgedProvider, LatencyTracker
+from benchmarks.fakes import FakeProvider
+from benchmarks.suite import pct
+
+
+async def run(provider, calls: int, prompt: str):
+    latencies, spend = [], 0.0
+    for _ in range(calls):
+        start = time.perf_counter()
+        result = await provider.complete(prompt)
+        latencies.append(time.perf_counter() - start)
+        spend += result['cost_usd']
+    return latencies, spend
+
+
+async def warm_up(tracker: LatencyTracker, routes, calls: int, prompt: str):
+    """Fill each route's latency window so its hedge threshold is live"""
+    for route in routes:
+        for _ in range(calls):
+            start = time.perf_counter()
+            await route.complete(prompt)
+            tracker.observe(route, time.perf_counter() - start, ok=True)
+
+
+def make_routes(args):
+    primary = FakeProvider(model='fake-primary', latency_ms=100, jitter_ms=15,
+                           tail_rate=args.tail_rate, tail_latency_ms=args.tail_ms, seed=1)
+    fallback = FakeProvider(model='fake-fallback', latency_ms=100, jitter_ms=15, seed=2)
+    return primary, fallback
+
+
+async def main_async(args):
+    hedging.LLM_HEDGE_MIN_DELAY_SECONDS = args.min_delay
+    hedging.LLM_HEDGE_DEFAULT_DELAY_SECONDS = args.tail_ms / 1000
+    prompt = "Summarize the quarterly report " * 20
+
+    primary, _ = make_routes(args)
+    rows = [('primary only', *await run(primary, args.calls, prompt))]
+    for label, hedge in (('failover only', False), ('hedged', True)):
+        primary, fallback = make_routes(args)
+        tracker = LatencyTracker()
+        await warm_up(tracker, (primary, fallback), args.warmup, prompt)
+        warmup_calls = primary.calls + fallback.calls
+        provider = HedgedProvider([primary, fallback], tracker, hedge=hedge)
+        latencies, spend = await run(provider, args.calls, prompt)
+        rows.append((label, latencies, spend))
+        if hedge:
+            backups = primary.calls + fallback.calls - warmup_calls - args.calls
+            print(f"hedged: {backups} backups for {args.calls} calls ({backups / args.calls:.1%}), "
+                  f"{fallback.calls - args.warmup - backups} routed to the fallback first; primary threshold "
+                  f"{provider.tracker.hedge_delay(primary) * 1000:.0f} ms\n")
+
+    print(f"{'mode':<16} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'$/call':>11}")
+    for label, latencies, spend in rows:
+        print(f"{label:<16} {pct(latencies, 0.5) * 1000:>8.0f} {pct(latencies, 0.99) * 1000:>8.0f} "
+              f"{max(latencies) * 1000:>8.0f} {spend / args.calls:>11.7f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--calls', type=int, default=200)
+    parser.add_argument('--tail-rate', type=float, default=0.05)
+    parser.add_argument('--tail-ms', type=float, default=2000)
+    parser.add_argument('--min-delay', type=float, default=0.05)
+    parser.add_argument('--warmup', type=int, default=hedging.LLM_HEDGE_MIN_SAMPLES)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Cost of the metrics instrumentation on the event hot path.
+
+Run from backend/:
+
+    python -m benchmarks.bench_metrics [--ops 1000000] [--events 5000] [--rounds 3]
+
+Reports the raw cost of counter/histogram updates, then runs the EventSink
+emit + flush loop with the real metrics and with no-op stand-ins and
+reports the difference per event. Uses ASYNC_DATABASE_URL / REDIS_URL when
+set, otherwise SQLite (aiosqlite) in a temp directory and fakeredis.
+"""
+import argparse
+import asyncio
+import time
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.core import event_sink, monitoring
+from app.core.event_sink import EventSink
+from benchmarks.bench_event_sink import make_engine, make_redis, payload
+
+
+class NoopMetric:
+    def inc(self, amount: float = 1.0):
+        pass
+
+    def observe(self, value: float):
+        pass
+
+
+def time_op(fn, n: int) -> float:
+    """ns per call"""
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n * 1e9
+
+
+async def run_sink(session_factory, redis_client, n: int) -> float:
+    async with session_factory() as db:
+        sink = EventSink(db, redis_client)
+        start = time.perf_counter()
+        for i in range(n):
+            await sink.emit('bench', i, 'llm_response', 'completed', payload(i), 0.01)
+        await sink.flush()
+        return (time.perf_counter() - start) / n * 1e6
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--ops', type=int, default=1000000)
+    parser.add_argument('--events', type=int, default=5000)
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    registry = monitoring.MetricsRegistry()
+    counter = registry.counter('bench_counter', 'bench')
+    histogram = registry.histogram('bench_histogram', 'bench', ('provider', 'model'))
+    child = histogram.labels('openai', 'gpt-4')
+
+    print(f"counter.inc()                  {time_op(counter.inc, args.ops):7.0f} ns")
+    print(f"histogram child.observe()      {time_op(lambda: child.observe(0.2), args.ops):7.0f} ns")
+    print(f"histogram.labels(...).observe  "
+          f"{time_op(lambda: histogram.labels('openai', 'gpt-4').observe(0.2), args.ops):7.0f} ns")
+    start = time.perf_counter()
+    monitoring.REGISTRY.render()
+    print(f"render /metrics                {(time.perf_counter() - start) * 1e3:7.2f} ms")
+
+    engine = await make_engine()
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    redis_client = make_redis()
+
+    # Warm up, then interleave the two variants and keep the best of each
+    await run_sink(session_factory, redis_client, 200)
+    real = (event_sink.EVENTS_EMITTED, event_sink.DB_COMMIT_SECONDS, event_sink.REDIS_PUBLISH_SECONDS)
+    instrumented, bare = [], []
+    for _ in range(args.rounds):
+        instrumented.append(await run_sink(session_factory, redis_client, args.events))
+        event_sink.EVENTS_EMITTED = event_sink.DB_COMMIT_SECONDS = event_sink.REDIS_PUBLISH_SECONDS = NoopMetric()
+        try:
+            bare.append(await run_sink(session_factory, redis_client, args.events))
+        finally:
+            event_sink.EVENTS_EMITTED, event_sink.DB_COMMIT_SECONDS, event_sink.REDIS_PUBLISH_SECONDS = real
+    await engine.dispose()
+
+    with_metrics, without = min(instrumented), min(bare)
+    print(f"\nEventSink per event (best of {args.rounds}): {without:6.1f} us without metrics, "
+          f"{with_metrics:6.1f} us with ({(with_metrics - without) / without * 100:+.1f}%)")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,98 @@
+"""Near-duplicate prompt index: lookup latency, hit rate and memory.
+
+Run from backend/:
+
+    python -m benchmarks.bench_prompt_index [--entries 200000] [--queries 2000] [--threshold 0.8]
+
+Fills a PromptIndex with --entries distinct prompts (~60 words drawn from a
+2000-word vocabulary, plus a ticket number), then looks up an equal mix of
+variants of indexed prompts (new ticket number, different whitespace and
+case, or --edits words replaced) and unseen prompts. Reports lookup
+latency, the share of variants found, false matches among unseen prompts,
+and the index's preallocated array memory. Use --entries 1000000 for the
+1M-entry figures (building takes a couple of minutes).
+"""
+import argparse
+import random
+import statistics
+import time
+
+import numpy as np
+
+from app.core.prompt_index import PromptIndex
+from benchmarks.suite import pct
+
+
+def make_prompts(n: int, vocab: list, words: int, rng: np.random.Generator) -> list:
+    choices = rng.integers(0, len(vocab), size=(n, words))
+    tickets = rng.integers(10000, 99999, size=n)
+    return [f"Ticket #{ticket}: " + ' '.join(vocab[i] for i in row) for ticket, row in zip(tickets, choices)]
+
+
+def variant(prompt: str, kind: str, edits: int, vocab: list, rng: random.Random) -> str:
+    if kind == 'id':
+        return f"Ticket #{rng.randint(10000, 99999)}:" + prompt.split(':', 1)[1]
+    if kind == 'whitespace':
+        return '  ' + prompt.upper().replace(' ', '\n ', 5) + '\n'
+    words = prompt.split(' ')
+    for i in rng.sample(range(2, len(words)), edits):
+        words[i] = rng.choice(vocab)
+    return ' '.join(words)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--entries', type=int, default=200000)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--words', type=int, default=60)
+    parser.add_argument('--edits', type=int, default=2)
+    parser.add_argument('--threshold', type=float, default=0.8)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    pyrng = random.Random(0)
+    vocab = [''.join(chr(97 + c) for c in rng.integers(0, 26, size=rng.integers(3, 10))) for _ in range(2000)]
+    index = PromptIndex(max_entries=args.entries)
+
+    start = time.perf_counter()
+    prompts = make_prompts(args.entries, vocab, args.words, rng)
+    for i, prompt in enumerate(prompts):
+        index.add(1, prompt, f"key-{i}")
+    elapsed = time.perf_counter() - start
+    print(f"built {len(index)} entries in {elapsed:.1f}s ({elapsed / args.entries * 1e6:.0f} us/add incl. generation)")
+
+    kinds = ['id', 'whitespace', 'edit']
+    queries = []
+    for q in range(args.queries // 2):
+        i = pyrng.randrange(args.entries)
+        queries.append((variant(prompts[i], kinds[q % 3], args.edits, vocab, pyrng), f"key-{i}", kinds[q % 3]))
+    queries += [(prompt, None, 'unseen') for prompt in make_prompts(args.queries // 2, vocab, args.words, rng)]
+    pyrng.shuffle(queries)
+
+    latencies = []
+    found = {kind: [0, 0] for kind in kinds + ['unseen']}
+    similarities = []
+    for prompt, expected, kind in queries:
+        t = time.perf_counter()
+        match = index.lookup(1, prompt, args.threshold)
+        latencies.append(time.perf_counter() - t)
+        found[kind][1] += 1
+        if match is not None and (expected is None or match[0] == expected):
+            found[kind][0] += 1
+            similarities.append(match[1])
+
+    print(f"\nlookup over {len(index)} entries ({args.words}-word prompts, threshold {args.threshold}):")
+    print(f"  p50 {pct(latencies, 0.5) * 1e6:.0f} us   p99 {pct(latencies, 0.99) * 1e6:.0f} us   "
+          f"mean {statistics.mean(latencies) * 1e6:.0f} us")
+    for kind in kinds:
+        hits, total = found[kind]
+        print(f"  {kind + ' variants found:':<28} {hits / total:6.1%}")
+    hits, total = found['unseen']
+    print(f"  {'unseen prompts matched:':<28} {hits / total:6.1%}")
+    print(f"  hit rate {index.stats()['hit_rate']:.1%}, mean similarity of hits {statistics.mean(similarities):.3f}")
+    print(f"\narrays: {index.stats()['array_bytes'] / 2 ** 20:.0f} MiB ({index.stats()['array_bytes'] / args.entries:.0f} B/entry)"
+          f" + cache keys")
+
+
+if __name__ == '__main__':
+    main()
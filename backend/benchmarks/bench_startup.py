@@ -0,0 +1,112 @@
+"""API cold start and per-request connection overhead.
+
+Run from backend/:
+
+    python -m benchmarks.bench_startup [--runs 5] [--requests 500]
+
+Cold start is measured in fresh interpreters: importing app.main, the
+provider SDKs (now imported on first use instead of at startup) and the
+app's lifespan startup. Connection overhead compares a query through the
+shared pool with opening a connection per request, and (with REDIS_URL
+set) a PING on the shared Redis pool with a client built per call, which
+is what AgentExecutor used to do. Uses DATABASE_URL / ASYNC_DATABASE_URL
+when set, otherwise SQLite in a temp directory.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+IMPORT_APP = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+IMPORT_SDKS = "import time; t = time.perf_counter(); import openai, anthropic; print(time.perf_counter() - t)"
+STARTUP = """
+import asyncio, time
+t = time.perf_counter()
+from app.main import app
+async def main():
+    async with app.router.lifespan_context(app):
+        print(time.perf_counter() - t)
+asyncio.run(main())
+"""
+
+
+def run_python(code: str, runs: int) -> float:
+    """Median seconds printed by `code` across fresh interpreters"""
+    results = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                                check=True, env=os.environ).stdout
+        results.append(float(output.strip().splitlines()[-1]))
+    return statistics.median(results)
+
+
+async def per_request(n: int):
+    from sqlalchemy import text
+    from sqlalchemy.pool import NullPool
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from app.core.database import ASYNC_DATABASE_URL, AsyncSessionLocal, close_db
+
+    async def timed(fn) -> float:
+        await fn()  # Warm up
+        start = time.perf_counter()
+        for _ in range(n):
+            await fn()
+        return (time.perf_counter() - start) / n * 1e6
+
+    async def pooled():
+        async with AsyncSessionLocal() as db:
+            await db.execute(text("SELECT 1"))
+
+    unpooled_engine = create_async_engine(ASYNC_DATABASE_URL, poolclass=NullPool)
+
+    async def unpooled():
+        async with unpooled_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    print(f"\nDB query, shared pool:           {await timed(pooled):8.0f} us")
+    print(f"DB query, connection per request: {await timed(unpooled):8.0f} us")
+    await unpooled_engine.dispose()
+    await close_db()
+
+    if not os.getenv("REDIS_URL"):
+        print("Redis: set REDIS_URL to compare the shared pool with a client per call")
+        return
+    import redis.asyncio as aioredis
+    from app.core.redis_client import get_redis, close_redis
+
+    async def shared():
+        await get_redis().ping()
+
+    async def fresh():
+        client = aioredis.Redis.from_url(os.environ["REDIS_URL"], decode_responses=True)
+        await client.ping()
+        await client.aclose()
+
+    print(f"Redis PING, shared pool:          {await timed(shared):8.0f} us")
+    print(f"Redis PING, client per call:      {await timed(fresh):8.0f} us")
+    await close_redis()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--requests', type=int, default=500)
+    args = parser.parse_args()
+
+    if not os.getenv("DATABASE_URL"):
+        os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+
+    print(f"median of {args.runs} fresh interpreters")
+    print(f"import app.main:            {run_python(IMPORT_APP, args.runs) * 1000:8.0f} ms")
+    print(f"import openai, anthropic:   {run_python(IMPORT_SDKS, args.runs) * 1000:8.0f} ms  (deferred to first use)")
+    print(f"import + lifespan startup:  {run_python(STARTUP, args.runs) * 1000:8.0f} ms")
+
+    asyncio.run(per_request(args.requests))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Cost of run tracing, and what a traced run's breakdown looks like.
+
+Run from backend/:
+
+    python -m benchmarks.bench_tracing [--agents 40] [--steps 3] [--latency-ms 0]
+
+First times span() itself with no trace current (an unsampled run) and
+inside a trace. Then runs --agents agents one after another against the
+FakeProvider, alternating trace=false and trace=true so drift hits both
+sides equally, and reports per-step wall time for each; at the default
+zero provider latency the difference is tracing's share of the
+orchestrator's own overhead. Finally prints the time breakdown (self time
+per span name) of the last traced run, as GET /api/agents/{id}/trace does.
+Uses ASYNC_DATABASE_URL / REDIS_URL when set, otherwise SQLite and fakeredis.
+"""
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.api import agents
+from app.core.tracing import Trace, TraceStore, _current_trace, span, waterfall
+from app.models.agent import Agent
+from benchmarks.bench_event_sink import make_engine, make_redis
+from benchmarks.fakes import register_fake_provider
+from benchmarks.suite import UNLIMITED, TimedExecutor, pct
+
+
+def ns_per_span(n: int) -> float:
+    start = time.perf_counter_ns()
+    for _ in range(n):
+        with span('bench', step=1):
+            pass
+    return (time.perf_counter_ns() - start) / n
+
+
+async def create_agent(session_factory, steps: int, trace: bool) -> str:
+    chain = [{'id': f's{i}', 'prompt': f'Step {i} of {{{{task}}}}',
+              'depends_on': [f's{i - 1}'] if i else []} for i in range(steps)]
+    row = agents.agent_row(agents.AgentCreate(
+        task='benchmark task', provider='fake', model='fake-1',
+        api_key='bench-tracing', cache=False, steps=chain, trace=trace
+    ))
+    row['config']['rate_limits'] = UNLIMITED
+    async with session_factory() as db:
+        await db.execute(insert(Agent), [row])
+        await db.commit()
+    return row['id']
+
+
+async def main_async(args):
+    _current_trace.set(None)
+    unsampled = ns_per_span(args.spans)
+    _current_trace.set(Trace('bench', max_spans=args.spans))
+    sampled = ns_per_span(args.spans)
+    _current_trace.set(None)
+    print(f"span(): {unsampled:.0f} ns unsampled, {sampled:.0f} ns sampled\n")
+
+    register_fake_provider(latency_ms=args.latency_ms, jitter_ms=args.latency_ms / 5, completion_tokens=200)
+    engine = await make_engine()
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    redis_client = make_redis()
+
+    steps = {False: [], True: []}
+    traced_id = None
+    for i in range(args.agents):
+        trace = bool(i % 2)
+        agent_id = await create_agent(session_factory, args.steps, trace)
+        TimedExecutor.step_seconds = []
+        async with session_factory() as db:
+            await TimedExecutor(agent_id, db, redis_client=redis_client).run()
+        steps[trace] += [seconds * 1000 for seconds in TimedExecutor.step_seconds]
+        if trace:
+            traced_id = agent_id
+    await engine.dispose()
+
+    print(f"{'trace':<8} {'steps':>6} {'p50 ms':>8} {'p99 ms':>8}")
+    for trace in (False, True):
+        print(f"{str(trace).lower():<8} {len(steps[trace]):>6} {pct(steps[trace], 0.5):>8.3f} {pct(steps[trace], 0.99):>8.3f}")
+
+    view = waterfall(await TraceStore(redis_client).load(traced_id))
+    print(f"\nlast traced run: {len(view['spans'])} spans, {view['duration_ms']:.1f} ms")
+    print(f"{'span':<18} {'count':>6} {'total ms':>10} {'self ms':>10}")
+    for total in view['breakdown']:
+        print(f"{total['name']:<18} {total['count']:>6} {total['total_ms']:>10.3f} {total['self_ms']:>10.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--agents', type=int, default=40)
+    parser.add_argument('--steps', type=int, default=3)
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--spans', type=int, default=100000)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""Fan-out latency from Redis publish to socket send.
+
+Run from backend/:
+
+    python -m benchmarks.bench_ws_fanout [--sockets 1000] [--agents 100] [--messages 20]
+
+Connects in-process fake sockets to the shared ConnectionManager, publishes
+timestamped events on agent:{id} and reports publish-to-send latency across
+all sockets. --slow makes that many sockets stall on every send to show the
+bounded queues keep everyone else unaffected. Uses REDIS_URL when set,
+otherwise fakeredis.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from app.api.websocket import ConnectionManager
+
+
+class FakeSocket:
+    def __init__(self, latencies: list, delay: float = 0.0):
+        self.latencies = latencies
+        self.delay = delay
+        self.received = 0
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message: str):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        data = json.loads(message)
+        if 'sent_at' in data:
+            self.latencies.append((time.perf_counter() - data['sent_at']) * 1000)
+        self.received += 1
+
+
+def make_redis():
+    if os.getenv("REDIS_URL"):
+        import redis.asyncio as aioredis
+        return aioredis.Redis.from_url(os.environ["REDIS_URL"], decode_responses=True)
+    import fakeredis
+    return fakeredis.FakeAsyncRedis(decode_responses=True)
+
+
+def pct(values: list, p: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sockets', type=int, default=1000)
+    parser.add_argument('--agents', type=int, default=100)
+    parser.add_argument('--messages', type=int, default=20)
+    parser.add_argument('--slow', type=int, default=0)
+    args = parser.parse_args()
+
+    redis_client = make_redis()
+    manager = ConnectionManager(redis_client)
+    latencies: list = []
+    senders = []
+    sockets = []
+    for i in range(args.sockets):
+        socket = FakeSocket(latencies if i >= args.slow else [], delay=0.5 if i < args.slow else 0.0)
+        client = await manager.connect(f'agent-{i % args.agents}', socket)
+        senders.append(asyncio.create_task(client.run()))
+        sockets.append(socket)
+    await asyncio.sleep(0.2)  # let the pattern subscription settle
+
+    start = time.perf_counter()
+    for n in range(args.messages):
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for a in range(args.agents):
+                pipe.publish(f'agent:agent-{a}', json.dumps({
+                    'action': 'llm_response', 'step': n, 'sent_at': time.perf_counter()
+                }))
+            await pipe.execute()
+
+    expected = (args.sockets - args.slow) * args.messages
+    while len(latencies) < expected and time.perf_counter() - start < 30:
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - start
+
+    for task in senders:
+        task.cancel()
+    await manager.close()
+
+    latencies.sort()
+    print(f"sockets={args.sockets} agents={args.agents} messages/agent={args.messages} slow={args.slow}")
+    print(f"delivered {len(latencies)}/{expected} in {elapsed:.2f}s "
+          f"({len(latencies) / elapsed:.0f} sends/sec)")
+    print(f"latency p50={pct(latencies, 0.5):.2f}ms p99={pct(latencies, 0.99):.2f}ms "
+          f"max={latencies[-1] if latencies else 0:.2f}ms")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,111 @@
+"""Deterministic stand-ins used by the benchmarks."""
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+import asyncio
+import functools
+import random
+import time
+
+from app.core.llm_providers import LLMProvider, ProviderError, PROVIDER_CLASSES
+
+
+class FakeProvider(LLMProvider):
+    """LLMProvider with seeded latency, token counts and failures, no network.
+
+    Latency and completion tokens are drawn from normal distributions
+    (latency_ms/jitter_ms, completion_tokens/tokens_jitter); tail_rate of
+    calls take tail_latency_ms instead (a degraded backend), and error_rate
+    of calls fail with a retryable 500 before any output.
+    """
+
+    name = "fake"
+    supports_batch = True
+    batch_discount = 0.5
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        model: str = "fake-1",
+        http_client=None,
+        latency_ms: float = 50.0,
+        jitter_ms: float = 10.0,
+        completion_tokens: int = 200,
+        tokens_jitter: float = 0.0,
+        error_rate: float = 0.0,
+        tail_rate: float = 0.0,
+        tail_latency_ms: float = 2000.0,
+        batch_latency_ms: float = 1000.0,
+        seed: int = 0
+    ):
+        self.model = model or "fake-1"
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.completion_tokens = completion_tokens
+        self.tokens_jitter = tokens_jitter
+        self.error_rate = error_rate
+        self.tail_rate = tail_rate
+        self.tail_latency_ms = tail_latency_ms
+        self.batch_latency_ms = batch_latency_ms
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self.errors = 0
+        self.batches: Dict[str, Tuple[float, Dict[str, str]]] = {}
+        self.batches_submitted = 0
+
+    @classmethod
+    def cost(cls, tokens_prompt: int, tokens_completion: int) -> float:
+        return tokens_prompt * 0.000001 + tokens_completion * 0.000002
+
+    def _latency(self) -> float:
+        if self.tail_rate and self.rng.random() < self.tail_rate:
+            return self.tail_latency_ms / 1000.0
+        return max(0.0, self.rng.gauss(self.latency_ms, self.jitter_ms)) / 1000.0
+
+    def _tokens(self) -> int:
+        return max(1, round(self.rng.gauss(self.completion_tokens, self.tokens_jitter)))
+
+    def _maybe_fail(self):
+        if self.error_rate and self.rng.random() < self.error_rate:
+            self.errors += 1
+            raise ProviderError("Fake provider error", status_code=500, retryable=True)
+
+    async def complete(self, prompt: str, **kwargs) -> Dict[str, Any]:
+        self.calls += 1
+        latency, tokens = self._latency(), self._tokens()
+        self._maybe_fail()
+        await asyncio.sleep(latency)
+        return self.build_result("ok " * tokens, len(prompt) // 4, tokens)
+
+    async def stream(self, prompt: str, **kwargs) -> AsyncIterator[Dict[str, Any]]:
+        self.calls += 1
+        latency, tokens = self._latency(), self._tokens()
+        self._maybe_fail()
+        per_token = latency / tokens
+        for _ in range(tokens):
+            await asyncio.sleep(per_token)
+            yield {"type": "delta", "text": "ok "}
+        yield {"type": "result", **self.build_result("ok " * tokens, len(prompt) // 4, tokens)}
+
+    async def submit_batch(self, requests: Dict[str, str]) -> str:
+        self.batches_submitted += 1
+        batch_id = f"fake-batch-{self.batches_submitted}"
+        self.batches[batch_id] = (time.monotonic() + self.batch_latency_ms / 1000.0, dict(requests))
+        return batch_id
+
+    async def batch_results(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        ready_at, requests = self.batches[batch_id]
+        if time.monotonic() < ready_at:
+            return None
+        # Kept, like real batch results, so a resumed run can fetch them again
+        return {
+            custom_id: self.build_result("ok " * self.completion_tokens, len(prompt) // 4, self.completion_tokens)
+            for custom_id, prompt in requests.items()
+        }
+
+
+def register_fake_provider(**options):
+    """Make provider='fake' resolvable through get_provider()
+
+    Keyword options (latency_ms, completion_tokens, ...) are passed to every
+    FakeProvider the registry builds.
+    """
+    PROVIDER_CLASSES["fake"] = functools.partial(FakeProvider, **options)
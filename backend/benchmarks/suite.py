@@ -0,0 +1,364 @@
+"""End-to-end benchmark suite with a regression check against a baseline.
+
+Run from backend/:
+
+    python -m benchmarks.suite [--output results.json] [--baseline benchmarks/baseline.json]
+    python -m benchmarks.suite --save-baseline
+
+Scenarios run against the deterministic FakeProvider (see fakes.py), the
+real AgentExecutor, EventSink, timeline API and WebSocket fan-out:
+
+    throughput  --agents agents with --steps chained steps each at once:
+                agents/sec and events/sec
+    overhead    agents one after another against a zero-latency provider:
+                per-step time spent in the orchestrator itself (p50/p99)
+    timeline    GET /api/agents/{id}/timeline over --events events: latest
+                page, paging back and since_id polls (p50/p99)
+    status      GET /api/agents/{id} polls with If-None-Match: polls/sec
+    websocket   EventSink emit to socket send through Redis and the
+                ConnectionManager (p50/p99)
+
+Results are written as JSON. With a baseline file present every metric is
+compared to it and the run exits 1 if any is worse by more than
+--tolerance (a fraction; latencies use --latency-tolerance since they are
+noisier). Baselines are machine specific: record one per machine/CI runner
+with --save-baseline. Uses ASYNC_DATABASE_URL / REDIS_URL when set,
+otherwise SQLite (aiosqlite) in a temp directory and fakeredis.
+"""
+from datetime import datetime
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import insert, select, func
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.api import agents
+from app.api.websocket import ConnectionManager
+from app.core.database import get_async_db
+from app.core.event_sink import EventSink
+from app.core.status_cache import get_status_cache
+from app.core.orchestrator import AgentExecutor
+from app.models.agent import Agent, AgentEvent, AgentStatus
+from benchmarks.bench_event_sink import make_engine, make_redis
+from benchmarks.fakes import register_fake_provider
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+# No throttling from the rate governor: the suite measures our own overhead
+UNLIMITED = {'rpm': 10 ** 9, 'tpm': 10 ** 12}
+
+
+def pct(values: list, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+
+def metric(value: float, unit: str, better: str) -> dict:
+    return {'value': round(value, 4), 'unit': unit, 'better': better}
+
+
+class TimedExecutor(AgentExecutor):
+    """Records the wall time of every step it runs"""
+
+    step_seconds: list = []
+
+    async def run_node(self, graph, node, outputs):
+        result = await super().run_node(graph, node, outputs)
+        TimedExecutor.step_seconds.append(result['duration_seconds'])
+        return result
+
+
+async def create_agents(session_factory, n: int, steps: int, api_key: str) -> list:
+    chain = [{'id': f's{i}', 'prompt': f'Step {i} of {{{{task}}}}',
+              'depends_on': [f's{i - 1}'] if i else []} for i in range(steps)]
+    rows = []
+    for _ in range(n):
+        row = agents.agent_row(agents.AgentCreate(
+            task='benchmark task', provider='fake', model='fake-1',
+            api_key=api_key, cache=False, steps=chain
+        ))
+        row['config']['rate_limits'] = UNLIMITED
+        rows.append(row)
+    async with session_factory() as db:
+        await db.execute(insert(Agent), rows)
+        await db.commit()
+    return [row['id'] for row in rows]
+
+
+async def run_agents(session_factory, redis_client, ids: list, concurrent: bool = True) -> float:
+    async def run_one(agent_id: str):
+        async with session_factory() as db:
+            await TimedExecutor(agent_id, db, redis_client=redis_client).run()
+
+    start = time.perf_counter()
+    if concurrent:
+        await asyncio.gather(*(run_one(agent_id) for agent_id in ids))
+    else:
+        for agent_id in ids:
+            await run_one(agent_id)
+    return time.perf_counter() - start
+
+
+async def bench_throughput(session_factory, redis_client, args) -> dict:
+    register_fake_provider(latency_ms=args.latency_ms, jitter_ms=args.latency_ms / 5,
+                           completion_tokens=200, tokens_jitter=50, error_rate=args.error_rate)
+    ids = await create_agents(session_factory, args.agents, args.steps, 'bench-throughput')
+    elapsed = await run_agents(session_factory, redis_client, ids)
+
+    async with session_factory() as db:
+        events = await db.scalar(select(func.count()).select_from(AgentEvent).where(AgentEvent.agent_id.in_(ids)))
+        completed = await db.scalar(select(func.count()).select_from(Agent).where(
+            Agent.id.in_(ids), Agent.status == AgentStatus.COMPLETED
+        ))
+    return {
+        'agents_per_sec': metric(args.agents / elapsed, 'agents/s', 'higher'),
+        'events_per_sec': metric(events / elapsed, 'events/s', 'higher'),
+        'agents_completed_ratio': metric(completed / args.agents, 'ratio', 'higher'),
+    }
+
+
+async def bench_overhead(session_factory, redis_client, args) -> dict:
+    register_fake_provider(latency_ms=0.0, jitter_ms=0.0, completion_tokens=200)
+    ids = await create_agents(session_factory, args.overhead_agents, args.steps, 'bench-overhead')
+    TimedExecutor.step_seconds = []
+    # One agent at a time, so this is the per-step cost rather than contention
+    await run_agents(session_factory, redis_client, ids, concurrent=False)
+    durations = [seconds * 1000 for seconds in TimedExecutor.step_seconds]
+    return {
+        'step_overhead_p50_ms': metric(pct(durations, 0.5), 'ms', 'lower'),
+        'step_overhead_p99_ms': metric(pct(durations, 0.99), 'ms', 'lower'),
+    }
+
+
+async def bench_timeline(session_factory, redis_client, args) -> dict:
+    agent_id = 'bench-timeline'
+    async with session_factory() as db:
+        for start in range(0, args.events, 1000):
+            await db.execute(insert(AgentEvent), [{
+                'agent_id': agent_id, 'step': i // 10, 'action': 'llm_response', 'status': 'completed',
+                'data': {'tokens': i, 'response_preview': 'x' * 200}, 'cost_usd': 0.001,
+                'timestamp': datetime.utcnow()
+            } for i in range(start, min(start + 1000, args.events))])
+        await db.commit()
+
+    async def get_db():
+        async with session_factory() as db:
+            yield db
+
+    app = FastAPI()
+    app.include_router(agents.router, prefix="/api/agents")
+    app.dependency_overrides[get_async_db] = get_db
+
+    latencies = []
+    url = f"/api/agents/{agent_id}/timeline"
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def timed(params: dict) -> dict:
+            start = time.perf_counter()
+            response = await client.get(url, params=params)
+            latencies.append((time.perf_counter() - start) * 1000)
+            response.raise_for_status()
+            return response.json()
+
+        for _ in range(args.queries):
+            page = latest = await timed({'limit': 100})
+            for _ in range(4):
+                if not page['has_more']:
+                    break
+                page = await timed({'limit': 100, 'before_id': page['before_id']})
+            await timed({'since_id': latest['since_id'] - 5})
+    return {
+        'timeline_p50_ms': metric(pct(latencies, 0.5), 'ms', 'lower'),
+        'timeline_p99_ms': metric(pct(latencies, 0.99), 'ms', 'lower'),
+    }
+
+
+async def bench_status(session_factory, redis_client, args) -> dict:
+    register_fake_provider()
+    ids = await create_agents(session_factory, 20, 1, 'bench-status')
+
+    async def get_db():
+        async with session_factory() as db:
+            yield db
+
+    app = FastAPI()
+    app.include_router(agents.router, prefix="/api/agents")
+    app.dependency_overrides[get_async_db] = get_db
+    app.dependency_overrides[agents.get_agent_status_cache] = lambda: get_status_cache(redis_client)
+
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        etags = {agent_id: (await client.get(f"/api/agents/{agent_id}")).headers['etag'] for agent_id in ids}
+        start = time.perf_counter()
+        for i in range(args.polls):
+            agent_id = ids[i % len(ids)]
+            poll_start = time.perf_counter()
+            response = await client.get(f"/api/agents/{agent_id}", headers={'If-None-Match': etags[agent_id]})
+            latencies.append((time.perf_counter() - poll_start) * 1000)
+            assert response.status_code == 304
+        elapsed = time.perf_counter() - start
+    return {
+        'status_polls_per_sec': metric(args.polls / elapsed, 'polls/s', 'higher'),
+        'status_poll_p99_ms': metric(pct(latencies, 0.99), 'ms', 'lower'),
+    }
+
+
+class FakeSocket:
+    def __init__(self, latencies: list):
+        self.latencies = latencies
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message: str):
+        data = json.loads(message).get('data') or {}
+        if 'sent_at' in data:
+            self.latencies.append((time.perf_counter() - data['sent_at']) * 1000)
+
+
+async def bench_websocket(session_factory, redis_client, args) -> dict:
+    manager = ConnectionManager(redis_client)
+    latencies: list = []
+    senders = []
+    for i in range(args.sockets):
+        client = await manager.connect(f'bench-ws-{i % args.ws_agents}', FakeSocket(latencies))
+        senders.append(asyncio.create_task(client.run()))
+    await asyncio.sleep(0.2)  # let the pattern subscription settle
+
+    expected = args.sockets * args.messages
+    async with session_factory() as db:
+        sink = EventSink(db, redis_client)
+        for n in range(args.messages):
+            for a in range(args.ws_agents):
+                await sink.emit(f'bench-ws-{a}', n, 'llm_response', 'completed', {'sent_at': time.perf_counter()}, 0.0)
+            await sink.flush()
+            await asyncio.sleep(0.01)
+    deadline = time.perf_counter() + 30
+    while len(latencies) < expected and time.perf_counter() < deadline:
+        await asyncio.sleep(0.01)
+
+    for task in senders:
+        task.cancel()
+    await manager.close()
+    return {
+        'ws_delivery_p50_ms': metric(pct(latencies, 0.5), 'ms', 'lower'),
+        'ws_delivery_p99_ms': metric(pct(latencies, 0.99), 'ms', 'lower'),
+        'ws_delivered_ratio': metric(len(latencies) / expected, 'ratio', 'higher'),
+    }
+
+
+SCENARIOS = {
+    'throughput': bench_throughput,
+    'overhead': bench_overhead,
+    'timeline': bench_timeline,
+    'status': bench_status,
+    'websocket': bench_websocket,
+}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def compare(results: dict, baseline: dict, tolerance: float, latency_tolerance: float) -> list:
+    """Metrics worse than the baseline by more than the tolerance"""
+    regressions = []
+    for name, current in results['metrics'].items():
+        previous = baseline['metrics'].get(name)
+        if previous is None or not previous['value']:
+            continue
+        allowed = latency_tolerance if current['unit'] == 'ms' else tolerance
+        change = (current['value'] - previous['value']) / previous['value']
+        worse = change < -allowed if current['better'] == 'higher' else change > allowed
+        if worse:
+            regressions.append(f"{name}: {previous['value']} -> {current['value']} {current['unit']} "
+                               f"({change * 100:+.1f}%, allowed {allowed * 100:.0f}%)")
+    return regressions
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--agents', type=int, default=200)
+    parser.add_argument('--overhead-agents', type=int, default=50)
+    parser.add_argument('--steps', type=int, default=3)
+    parser.add_argument('--latency-ms', type=float, default=100.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--events', type=int, default=10000)
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--polls', type=int, default=5000)
+    parser.add_argument('--sockets', type=int, default=500)
+    parser.add_argument('--ws-agents', type=int, default=50)
+    parser.add_argument('--messages', type=int, default=20)
+    parser.add_argument('--output', default='benchmark-results.json')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    parser.add_argument('--latency-tolerance', type=float, default=0.5)
+    args = parser.parse_args()
+
+    engine = await make_engine()
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    redis_client = make_redis()
+
+    metrics = {}
+    for name in args.scenarios.split(','):
+        start = time.perf_counter()
+        scenario = await SCENARIOS[name](session_factory, redis_client, args)
+        print(f"{name} ({time.perf_counter() - start:.1f}s)")
+        for key, m in scenario.items():
+            print(f"  {key:<26} {m['value']:>12.3f} {m['unit']}")
+        metrics.update(scenario)
+    await engine.dispose()
+
+    results = {
+        'commit': git_commit(),
+        'created_at': datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'database': engine.url.get_backend_name(),
+        'redis': 'redis' if os.getenv("REDIS_URL") else 'fakeredis',
+        'params': {k: v for k, v in vars(args).items() if k not in ('output', 'baseline', 'save_baseline', 'tolerance', 'latency_tolerance')},
+        'metrics': metrics,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to record one")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get('params') != results['params']:
+        print("Warning: baseline was recorded with different parameters")
+    regressions = compare(results, baseline, args.tolerance, args.latency_tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) against baseline {baseline.get('commit') or args.baseline}:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print(f"No regressions against baseline {baseline.get('commit') or args.baseline}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,93 @@
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import event
+
+from app.api import agents
+from app.core.database import get_async_db
+from app.core.llm_providers import PROVIDER_CLASSES
+from app.core.queue import AgentQueue
+from app.core.status_cache import StatusCache
+from app.models.agent import Agent, AgentStatus
+from benchmarks.fakes import FakeProvider
+
+httpx = pytest.importorskip("httpx")
+
+
+def make_client(session_factory, redis_client, status_cache):
+    async def get_db():
+        async with session_factory() as db:
+            yield db
+
+    app = FastAPI()
+    app.include_router(agents.router, prefix="/api/agents")
+    app.dependency_overrides[get_async_db] = get_db
+    app.dependency_overrides[agents.get_queue] = lambda: AgentQueue(redis_client)
+    app.dependency_overrides[agents.get_agent_status_cache] = lambda: status_cache
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+def count_queries(session_factory):
+    queries = []
+    engine = session_factory.kw['bind'].sync_engine
+    event.listen(engine, 'before_cursor_execute', lambda *args: queries.append(args[2]))
+    return queries
+
+
+def test_status_polls_revalidate_with_etags(run, session_factory, redis_client, monkeypatch):
+    monkeypatch.setitem(PROVIDER_CLASSES, 'fake', FakeProvider)
+
+    async def scenario():
+        status_cache = StatusCache(redis_client)
+        async with make_client(session_factory, redis_client, status_cache) as client:
+            created = await client.post("/api/agents/", json={'task': 't', 'provider': 'fake', 'model': 'fake-1', 'api_key': 'k'})
+            agent_id = created.json()['id']
+
+            queries = count_queries(session_factory)
+            first = await client.get(f"/api/agents/{agent_id}")
+            assert first.status_code == 200
+            assert first.json()['status'] == 'pending'
+            etag = first.headers['etag']
+
+            unchanged = await client.get(f"/api/agents/{agent_id}", headers={'If-None-Match': etag})
+            assert (unchanged.status_code, unchanged.headers['etag'], unchanged.content) == (304, etag, b'')
+            # Both polls were answered from the status cache
+            assert queries == []
+
+            # The executor caches each status change as it commits
+            async with session_factory() as db:
+                agent = await db.get(Agent, agent_id)
+                agent.status = AgentStatus.RUNNING
+                await db.commit()
+                await status_cache.put(agent)
+            changed = await client.get(f"/api/agents/{agent_id}", headers={'If-None-Match': etag})
+            assert changed.status_code == 200
+            assert changed.json()['status'] == 'running'
+            assert changed.headers['etag'] != etag
+
+            # The result is loaded on request only, under its own ETag
+            with_result = await client.get(f"/api/agents/{agent_id}?include=result",
+                                           headers={'If-None-Match': changed.headers['etag']})
+            assert with_result.status_code == 200
+            assert 'result' in with_result.json()
+            assert with_result.headers['etag'] != changed.headers['etag']
+
+    run(scenario())
+
+
+def test_status_cache_misses_are_filled_from_the_database(run, session_factory, redis_client):
+    async def scenario():
+        async with session_factory() as db:
+            db.add(Agent(id='agent-1', task='t', provider='fake', model='fake-1',
+                         status=AgentStatus.COMPLETED, config={}))
+            await db.commit()
+
+        status_cache = StatusCache(redis_client)
+        async with make_client(session_factory, redis_client, status_cache) as client:
+            assert (await client.get("/api/agents/missing")).status_code == 404
+            response = await client.get("/api/agents/agent-1")
+            assert response.json()['status'] == 'completed'
+
+        # Cached for the next process to poll it
+        assert await StatusCache(redis_client).get('agent-1') == (response.headers['etag'], response.text)
+
+    run(scenario())
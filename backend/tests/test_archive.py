@@ -0,0 +1,70 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func, select
+
+from app.core import archive
+from app.core.archive import EventArchiver
+from app.core.events import EventService
+from app.models.agent import Agent, AgentEvent, AgentStatus, EventArchive, EventArchiveChunk
+
+
+@pytest.fixture(autouse=True)
+def fresh_caches(monkeypatch):
+    # Process-wide caches; each test has its own database
+    monkeypatch.setattr(archive, '_bounds_cache', OrderedDict())
+    monkeypatch.setattr(archive, '_chunk_cache', OrderedDict())
+
+
+async def add_events(db, count, agent_id='agent-1'):
+    db.add_all(AgentEvent(agent_id=agent_id, step=0, action='llm_call', status='completed', data={})
+               for _ in range(count))
+    await db.commit()
+
+
+async def page(db, **kwargs):
+    timeline = await EventService(db).get_timeline('agent-1', fields=['action'], **kwargs)
+    return [event['id'] for event in timeline['timeline']], timeline['has_more']
+
+
+def test_timelines_page_through_archived_and_hot_events(run, session_factory):
+    async def scenario():
+        async with session_factory() as db:
+            db.add(Agent(id='agent-1', task='t', status=AgentStatus.COMPLETED, config={},
+                         completed_at=datetime.utcnow() - timedelta(days=60)))
+            await add_events(db, 12)
+            # Another agent's event keeps SQLite from reusing the archived ids
+            await add_events(db, 1, agent_id='agent-2')
+            archiver = EventArchiver(db, chunk_size=5)
+            assert await archiver.run_once() == 12
+            assert await archiver.run_once() == 0
+            # A resume after archiving adds hot events with newer ids
+            await add_events(db, 3)
+
+            assert await db.scalar(select(func.count()).select_from(AgentEvent)) == 4
+            chunks = (await db.execute(
+                select(EventArchiveChunk.first_event_id, EventArchiveChunk.last_event_id)
+                .order_by(EventArchiveChunk.first_event_id)
+            )).all()
+            assert chunks == [(1, 5), (6, 10), (11, 12)]
+
+            assert await page(db, limit=4) == ([12, 14, 15, 16], True)
+            archive._chunk_cache.clear()
+            assert await page(db, limit=4, before_id=12) == ([8, 9, 10, 11], True)
+            # Only the chunks the page overlaps were read
+            assert list(archive._chunk_cache) == [('agent-1', 11), ('agent-1', 6)]
+            assert await page(db, limit=4, before_id=8) == ([4, 5, 6, 7], True)
+            assert await page(db, limit=4, before_id=4) == ([1, 2, 3], False)
+
+            assert await page(db, limit=4, since_id=2) == ([3, 4, 5, 6], True)
+            assert await page(db, limit=4, since_id=10) == ([11, 12, 14, 15], True)
+            assert await page(db, limit=4, since_id=15) == ([16], False)
+
+            # The resumed agent's new events are appended as another chunk
+            assert await archiver.run_once() == 3
+            summary = await db.get(EventArchive, 'agent-1')
+            assert (summary.event_count, summary.first_event_id, summary.last_event_id) == (15, 1, 16)
+            assert await page(db, limit=4) == ([12, 14, 15, 16], True)
+
+    run(scenario())
@@ -0,0 +1,148 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+from app.core.checkpoints import CheckpointLog, merge_state, sweep_checkpoints
+from app.models.agent import Agent, AgentCheckpoint, AgentStatus, CheckpointBlob
+
+
+async def count(db, model, agent_id):
+    return await db.scalar(select(func.count()).select_from(model).where(model.agent_id == agent_id))
+
+
+def test_merge_state_merges_nested_dicts():
+    state = {'outputs': {'a': 1}, 'done': ['a'], 'cost': 1.0}
+    merge_state(state, {'outputs': {'b': 2}, 'done': ['a', 'b'], 'step': 2})
+    assert state == {'outputs': {'a': 1, 'b': 2}, 'done': ['a', 'b'], 'cost': 1.0, 'step': 2}
+
+
+def test_deltas_rebuild_state(run, session_factory):
+    async def scenario():
+        async with session_factory() as db:
+            log = CheckpointLog(db, 'agent-1')
+            await log.append({'outputs': {'a': 'first'}, 'done': ['a']})
+            await log.append({'outputs': {'b': 'second'}, 'done': ['a', 'b']})
+            await db.commit()
+
+        async with session_factory() as db:
+            log = CheckpointLog(db, 'agent-1')
+            state = await log.load()
+            assert state == {'outputs': {'a': 'first', 'b': 'second'}, 'done': ['a', 'b']}
+            assert log.seq == 2
+
+            # Appending after a load continues the sequence
+            await log.append({'done': ['a', 'b', 'c']})
+            await db.commit()
+            assert log.seq == 3
+
+        async with session_factory() as db:
+            assert (await CheckpointLog(db, 'agent-1').load())['done'] == ['a', 'b', 'c']
+            assert await CheckpointLog(db, 'agent-2').load() == {}
+
+    run(scenario())
+
+
+def test_large_values_are_stored_once_as_blobs(run, session_factory):
+    big = 'x' * 100
+
+    async def scenario():
+        async with session_factory() as db:
+            log = CheckpointLog(db, 'agent-1', blob_threshold=50)
+            await log.append({'outputs': {'a': big}})
+            await log.append({'outputs': {'b': big}})
+            await db.commit()
+            assert await db.scalar(select(func.count()).select_from(CheckpointBlob)) == 1
+
+        async with session_factory() as db:
+            state = await CheckpointLog(db, 'agent-1', blob_threshold=50).load()
+            assert state == {'outputs': {'a': big, 'b': big}}
+
+    run(scenario())
+
+
+def test_compaction_folds_the_log_into_a_snapshot(run, session_factory):
+    async def scenario():
+        async with session_factory() as db:
+            log = CheckpointLog(db, 'agent-1', compact_every=3)
+            for i in range(7):
+                await log.append({'outputs': {f's{i}': i}})
+                await db.commit()
+
+            rows = (await db.execute(
+                select(AgentCheckpoint.seq, AgentCheckpoint.kind)
+                .where(AgentCheckpoint.agent_id == 'agent-1')
+                .order_by(AgentCheckpoint.seq)
+            )).all()
+            # 3 deltas + snapshot, 3 deltas + snapshot, 1 delta
+            assert rows == [(8, 'snapshot'), (9, 'delta')]
+
+        async with session_factory() as db:
+            log = CheckpointLog(db, 'agent-1', compact_every=3)
+            assert await log.load() == {'outputs': {f's{i}': i for i in range(7)}}
+            assert log.deltas_since_snapshot == 1
+
+    run(scenario())
+
+
+def test_compaction_drops_blobs_no_longer_referenced(run, session_factory):
+    old, new = 'x' * 100, 'y' * 100
+
+    async def scenario():
+        async with session_factory() as db:
+            log = CheckpointLog(db, 'agent-1', blob_threshold=50, compact_every=3)
+            await log.append({'outputs': {'a': old, 'b': old}})
+            await log.append({'outputs': {'a': new}})
+            await db.commit()
+            assert await count(db, CheckpointBlob, 'agent-1') == 2
+
+            # b still points at the old blob
+            await log.append({'outputs': {'c': 'small'}})
+            await db.commit()
+            assert await count(db, CheckpointBlob, 'agent-1') == 2
+
+            await log.append({'outputs': {'b': new}})
+            await log.append({'done': True})
+            await log.append({'done': False})
+            await db.commit()
+            digests = list(await db.scalars(select(CheckpointBlob.digest)))
+            assert len(digests) == 1
+
+        async with session_factory() as db:
+            log = CheckpointLog(db, 'agent-1', blob_threshold=50)
+            assert await log.load() == {'outputs': {'a': new, 'b': new, 'c': 'small'}, 'done': False}
+
+    run(scenario())
+
+
+def test_sweep_drops_logs_of_finished_agents(run, session_factory):
+    now = datetime.utcnow()
+    agents = {
+        'completed': (AgentStatus.COMPLETED, now),
+        'failed-recently': (AgentStatus.FAILED, None),
+        'killed-long-ago': (AgentStatus.KILLED, now - timedelta(days=30)),
+        'running': (AgentStatus.RUNNING, None),
+    }
+
+    async def scenario():
+        async with session_factory() as db:
+            for agent_id, (status, completed_at) in agents.items():
+                db.add(Agent(id=agent_id, task='t', status=status, config={},
+                             started_at=now - timedelta(days=1), completed_at=completed_at))
+                log = CheckpointLog(db, agent_id, blob_threshold=50)
+                await log.append({'outputs': {'a': agent_id * 50}})
+            await db.commit()
+
+            assert await sweep_checkpoints(db, retention=timedelta(days=7)) == 2
+            assert await sweep_checkpoints(db, retention=timedelta(days=7)) == 0
+            remaining = {
+                agent_id: (await count(db, AgentCheckpoint, agent_id), await count(db, CheckpointBlob, agent_id))
+                for agent_id in agents
+            }
+            assert remaining == {
+                'completed': (0, 0),
+                'failed-recently': (1, 1),
+                'killed-long-ago': (0, 0),
+                'running': (1, 1),
+            }
+
+    run(scenario())
@@ -0,0 +1,48 @@
+import pytest
+
+from app.core.costs import CostService, event_rollups
+from app.core.event_sink import EventSink
+from app.core.llm_providers import hash_api_key
+from app.models.agent import Agent
+
+KEY_HASH = hash_api_key(None)
+
+
+def usage(provider, model, tokens, **extra):
+    return {'provider': provider, 'model': model, 'key_hash': KEY_HASH, 'tokens': tokens, **extra}
+
+
+def test_rollups_sum_spend_and_book_hedges_under_their_own_route(run, session_factory, redis_client):
+    async def scenario():
+        async with session_factory() as db:
+            db.add(Agent(id='agent-1', task='t', provider='openai', model='gpt-4o', config={}))
+            await db.commit()
+
+            sink = EventSink(db, redis_client, max_batch=50, max_delay_ms=60000)
+            await sink.emit('agent-1', 0, 'llm_response', 'completed', {'tokens': 100}, cost=0.01,
+                            usage=usage('openai', 'gpt-4o', 100))
+            # A hedged response: 0.02 for the winner plus 0.005 for the cancelled backup
+            hedge = {'provider': 'anthropic', 'model': 'claude-3-5-sonnet', 'cost_usd': 0.005, 'tokens': 40}
+            await sink.emit('agent-1', 1, 'llm_response', 'completed',
+                            {'tokens': 200, 'hedge_cost_usd': 0.005, 'hedge_costs': [hedge]}, cost=0.025,
+                            usage=[usage('openai', 'gpt-4o', 200, cost_usd=0.02),
+                                   usage('anthropic', 'claude-3-5-sonnet', 40, cost_usd=0.005)])
+            await sink.emit('agent-1', 2, 'agent_completed', 'completed')
+            await sink.close()
+
+            costs = CostService(db)
+            assert await costs.get_agent_cost('agent-1') == pytest.approx(0.035)
+            result = await costs.aggregate(group_by=('provider', 'model'))
+            assert [(row['provider'], row['model'], row['tokens'], row['calls']) for row in result['rows']] == [
+                ('anthropic', 'claude-3-5-sonnet', 40, 1),
+                ('openai', 'gpt-4o', 300, 2),
+            ]
+            assert [row['cost_usd'] for row in result['rows']] == [pytest.approx(0.005), pytest.approx(0.03)]
+
+            # Rebuilding from events (backfill, databases without rollups) agrees
+            rebuilt = await event_rollups(db)
+            by_route = {key[1:3]: totals for key, totals in rebuilt.items()}
+            assert by_route[('openai', 'gpt-4o')] == [pytest.approx(0.03), 300, 2]
+            assert by_route[('anthropic', 'claude-3-5-sonnet')] == [pytest.approx(0.005), 40, 1]
+
+    run(scenario())
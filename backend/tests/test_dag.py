@@ -0,0 +1,67 @@
+import pytest
+
+from app.core.dag import DEFAULT_STEP_PROMPT, StepGraph, StepNode
+
+
+def make_graph():
+    # research -> (draft, facts) -> review
+    return StepGraph.from_config({'steps': [
+        {'id': 'review', 'prompt': 'Review {{draft}}', 'depends_on': ['draft', 'facts']},
+        {'id': 'research', 'prompt': 'Research {{task}}'},
+        {'id': 'draft', 'prompt': 'Draft from {{research}}', 'depends_on': ['research']},
+        {'id': 'facts', 'prompt': 'Check facts', 'depends_on': ['research']},
+    ]})
+
+
+def test_default_graph_runs_the_task():
+    graph = StepGraph.from_config({})
+    assert len(graph) == 1
+    assert graph.nodes['main'].prompt == DEFAULT_STEP_PROMPT
+
+
+def test_topological_order_keeps_config_order_among_independent_steps():
+    graph = make_graph()
+    assert graph.order == ['research', 'draft', 'facts', 'review']
+    assert [graph.nodes[n].number for n in graph.order] == [1, 2, 3, 4]
+
+
+def test_ready_waits_for_dependencies():
+    graph = make_graph()
+    assert [n.id for n in graph.ready(set(), set())] == ['research']
+    assert [n.id for n in graph.ready({'research'}, set())] == ['draft', 'facts']
+    assert [n.id for n in graph.ready({'research'}, {'draft'})] == ['facts']
+    assert [n.id for n in graph.ready({'research', 'draft'}, {'facts'})] == []
+    assert [n.id for n in graph.ready({'research', 'draft', 'facts'}, set())] == ['review']
+
+
+def test_sinks():
+    assert [n.id for n in make_graph().sinks()] == ['review']
+
+
+@pytest.mark.parametrize('nodes, message', [
+    ([StepNode('a', 'x'), StepNode('a', 'y')], 'Duplicate step id'),
+    ([StepNode('a', 'x', ['b'])], 'unknown step b'),
+    ([StepNode('a', 'x', ['b']), StepNode('b', 'y', ['a'])], 'cycle: a, b'),
+])
+def test_invalid_graphs(nodes, message):
+    with pytest.raises(ValueError, match=message):
+        StepGraph(nodes)
+
+
+def test_render_prompt_fills_placeholders_and_appends_the_rest():
+    graph = make_graph()
+    assert graph.render_prompt(graph.nodes['research'], 'cats', {}) == 'Research cats'
+    prompt = graph.render_prompt(graph.nodes['review'], 'cats', {'draft': 'D', 'facts': 'F'})
+    assert prompt == "Review D\n\nOutput of step 'facts':\nF"
+
+
+def test_critical_path():
+    graph = make_graph()
+    length, path = graph.critical_path({'research': 1.0, 'draft': 5.0, 'facts': 2.0, 'review': 1.0})
+    assert length == 7.0
+    assert path == ['research', 'draft', 'review']
+    assert StepGraph([]).critical_path({}) == (0.0, [])
+
+
+def test_levels_group_steps_by_dependency_depth():
+    assert make_graph().levels() == [['research'], ['draft', 'facts'], ['review']]
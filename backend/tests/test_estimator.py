@@ -0,0 +1,124 @@
+import random
+
+import pytest
+
+from app.core import estimator
+from app.core.dag import StepGraph
+from app.core.estimator import DEFAULT_STEP_SECONDS, CostEstimator, QuantileSketch, count_tokens, load_encodings
+from app.models.agent import AgentEvent
+
+
+def test_empty_sketch():
+    assert QuantileSketch().quantile(0.5) is None
+
+
+@pytest.mark.parametrize('q', [0.0, 0.1, 0.5, 0.9, 0.99, 1.0])
+def test_quantiles_within_relative_accuracy(q):
+    rng = random.Random(0)
+    values = [rng.lognormvariate(5, 1.5) for _ in range(10000)]
+    sketch = QuantileSketch(relative_accuracy=0.02)
+    for value in values:
+        sketch.add(value)
+
+    expected = sorted(values)[int(q * (len(values) - 1))]
+    assert sketch.quantile(q) == pytest.approx(expected, rel=0.02)
+    assert sketch.count == len(values)
+
+
+def test_zeros_count_toward_rank():
+    sketch = QuantileSketch()
+    for value in [0, 0, 0, 100]:
+        sketch.add(value)
+    assert sketch.quantile(0.5) == 0.0
+    assert sketch.quantile(1.0) == pytest.approx(100, rel=0.02)
+
+
+def test_add_invalidates_cached_quantiles():
+    sketch = QuantileSketch()
+    sketch.add(10)
+    assert sketch.quantile(1.0) == pytest.approx(10, rel=0.02)
+    sketch.add(1000)
+    assert sketch.quantile(1.0) == pytest.approx(1000, rel=0.02)
+
+
+class FakeEncoding:
+    def encode(self, text):
+        return text.split()
+
+
+class FakeTiktoken:
+    """Stands in for tiktoken: records loads, fails the ones in `missing`"""
+
+    def __init__(self, missing=()):
+        self.missing = set(missing)
+        self.loads = []
+
+    def get_encoding(self, name):
+        self.loads.append(name)
+        if name in self.missing:
+            raise ConnectionError("no network")
+        return FakeEncoding()
+
+    def encoding_name_for_model(self, model):
+        if model.startswith('gpt-4o'):
+            return 'o200k_base'
+        raise KeyError(model)
+
+
+@pytest.fixture
+def fake_tiktoken(monkeypatch):
+    def install(**kwargs):
+        fake = FakeTiktoken(**kwargs)
+        monkeypatch.setattr(estimator, 'tiktoken', fake)
+        monkeypatch.setattr(estimator, '_encodings', {})
+        monkeypatch.setattr(estimator, '_model_encodings', {})
+        return fake
+    return install
+
+
+def test_counting_never_loads_encodings(fake_tiktoken):
+    fake = fake_tiktoken()
+    text = "one two three four five six"
+    approximate = count_tokens(text, 'gpt-4o')
+    assert fake.loads == []
+
+    assert load_encodings(['cl100k_base', 'o200k_base']) == ['cl100k_base', 'o200k_base']
+    assert count_tokens(text, 'gpt-4o') == count_tokens(text, 'claude-3-5-sonnet') == 6
+    assert count_tokens(text) == approximate
+    assert fake.loads == ['cl100k_base', 'o200k_base']
+
+
+def test_encodings_that_fail_to_load_fall_back_to_the_approximation(fake_tiktoken):
+    fake_tiktoken(missing={'o200k_base'})
+    text = "one two three four five six"
+    assert load_encodings(['cl100k_base', 'o200k_base']) == ['cl100k_base']
+    assert count_tokens(text, 'claude-3-5-sonnet') == 6
+    assert count_tokens(text, 'gpt-4o') == count_tokens(text)
+
+
+@pytest.mark.parametrize('max_parallel, waves', [(1, 5), (2, 4), (4, 3)])
+def test_runtime_bounds_run_each_level_in_waves_of_max_parallel(max_parallel, waves):
+    # plan -> three research steps -> summary
+    graph = StepGraph.from_config({'steps': [
+        {'id': 'plan', 'prompt': 'plan'},
+        *({'id': f'research-{i}', 'prompt': 'research', 'depends_on': ['plan']} for i in range(3)),
+        {'id': 'summary', 'prompt': 'summary', 'depends_on': [f'research-{i}' for i in range(3)]},
+    ]})
+    estimate = CostEstimator().estimate('openai', 'gpt-4o', 'task', graph, max_parallel)
+    low, high = DEFAULT_STEP_SECONDS
+    assert (estimate['estimated_runtime_min'], estimate['estimated_runtime_max']) == (waves * low, waves * high)
+
+
+def test_observed_call_time_leaves_out_rate_limit_waits(run, session_factory):
+    async def scenario():
+        async with session_factory() as db:
+            db.add(AgentEvent(agent_id='agent-1', action='llm_response', status='completed', data={
+                'provider': 'openai', 'model': 'gpt-4o', 'tokens_completion': 100,
+                'duration_seconds': 12.0, 'queue_wait_ms': 10000
+            }))
+            await db.commit()
+            sketches = CostEstimator()
+            assert await sketches.refresh(db) == 1
+            assert sketches.seconds_range('openai', 'gpt-4o')[0] == pytest.approx(2.0, rel=0.02)
+
+    run(scenario())
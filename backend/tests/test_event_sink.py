@@ -0,0 +1,87 @@
+import asyncio
+import json
+
+import pytest
+from sqlalchemy import select
+
+from app.core.event_sink import EventSink, stream_key
+from app.models.agent import AgentEvent
+
+
+async def stored(db):
+    return (await db.execute(select(AgentEvent.id, AgentEvent.step).order_by(AgentEvent.id))).all()
+
+
+def test_events_are_written_in_batches_and_in_order(run, session_factory, redis_client):
+    async def scenario():
+        async with session_factory() as db:
+            sink = EventSink(db, redis_client, max_batch=3, max_delay_ms=60000)
+            for step in range(2):
+                await sink.emit('agent-1', step, 'llm_call', 'running')
+            assert await stored(db) == []
+            assert sink.pending == 2
+
+            await sink.emit('agent-1', 2, 'llm_call', 'running')
+            rows = await stored(db)
+            assert [step for _, step in rows] == [0, 1, 2]
+            assert sink.pending == 0
+
+            # Stream entries carry the event ids, in commit order
+            entries = await redis_client.xrange(stream_key('agent-1'))
+            assert [entry_id for entry_id, _ in entries] == [f'{event_id}-0' for event_id, _ in rows]
+            assert [json.loads(fields['m'])['step'] for _, fields in entries] == [0, 1, 2]
+            await sink.close()
+
+    run(scenario())
+
+
+def test_idle_batches_are_flushed_by_the_timer(run, session_factory, redis_client):
+    async def scenario():
+        async with session_factory() as db:
+            sink = EventSink(db, redis_client, max_batch=50, max_delay_ms=50)
+            await sink.emit('agent-1', 0, 'llm_call', 'running')
+            await asyncio.sleep(0.2)
+            assert [step for _, step in await stored(db)] == [0]
+            await sink.close()
+
+    run(scenario())
+
+
+def test_failed_batches_are_kept_and_retried(run, session_factory, redis_client):
+    async def scenario():
+        async with session_factory() as db:
+            sink = EventSink(db, redis_client, max_batch=50, max_delay_ms=50)
+            write = sink._write
+            failures = []
+
+            async def failing_write(rows, rollups):
+                if not failures:
+                    failures.append(len(rows))
+                    raise RuntimeError("database unavailable")
+                return await write(rows, rollups)
+
+            sink._write = failing_write
+            await sink.emit('agent-1', 0, 'llm_call', 'running')
+            with pytest.raises(RuntimeError):
+                await sink.emit('agent-1', 1, 'llm_call', 'running', flush=True)
+            assert failures == [2]
+            assert sink.pending == 2
+
+            # The timer retries the batch without another emit
+            await asyncio.sleep(0.2)
+            assert [step for _, step in await stored(db)] == [0, 1]
+            assert sink.pending == 0
+            await sink.close()
+
+    run(scenario())
+
+
+def test_close_flushes_what_is_buffered(run, session_factory, redis_client):
+    async def scenario():
+        async with session_factory() as db:
+            sink = EventSink(db, redis_client, max_batch=50, max_delay_ms=60000)
+            await sink.emit('agent-1', 0, 'agent_completed', 'completed')
+            await sink.close()
+            assert [step for _, step in await stored(db)] == [0]
+
+    run(scenario())
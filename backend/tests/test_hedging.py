@@ -0,0 +1,90 @@
+import pytest
+
+from app.core import hedging
+from app.core.estimator import count_tokens
+from app.core.hedging import HedgedProvider, LatencyTracker
+from app.core.llm_providers import ProviderError
+from benchmarks.fakes import FakeProvider
+
+PROMPT = "Summarize the quarterly report"
+
+
+class BrokenProvider(FakeProvider):
+    async def complete(self, prompt: str, **kwargs):
+        self.calls += 1
+        raise ProviderError("bad gateway", status_code=502, retryable=True)
+
+
+def fake(model, latency_ms, cls=FakeProvider):
+    return cls(model=model, latency_ms=latency_ms, jitter_ms=0, completion_tokens=50)
+
+
+@pytest.fixture(autouse=True)
+def short_delays(monkeypatch):
+    # Hedge after 50ms instead of the production default
+    monkeypatch.setattr(hedging, 'LLM_HEDGE_DEFAULT_DELAY_SECONDS', 0.05)
+
+
+def test_slow_calls_are_hedged_and_the_loser_is_billed_to_its_route(run):
+    async def scenario():
+        slow, fast = fake('slow', 1000), fake('fast', 10)
+        result = await HedgedProvider([slow, fast], LatencyTracker()).complete(PROMPT)
+        assert result['model'] == 'fast'
+        assert (slow.calls, fast.calls) == (1, 1)
+
+        # The cancelled call still paid for its prompt
+        prompt_cost = slow.cost(count_tokens(PROMPT, 'slow'), 0)
+        assert result['hedge_costs'] == [
+            {'provider': 'fake', 'model': 'slow', 'cost_usd': prompt_cost, 'tokens': count_tokens(PROMPT, 'slow')}
+        ]
+        assert result['hedge_cost_usd'] == prompt_cost
+        assert result['cost_usd'] == pytest.approx(fast.cost(result['tokens_prompt'], 50) + prompt_cost)
+
+    run(scenario())
+
+
+def test_without_hedging_slow_calls_are_waited_for(run):
+    async def scenario():
+        slow, fast = fake('slow', 200), fake('fast', 10)
+        result = await HedgedProvider([slow, fast], LatencyTracker(), hedge=False).complete(PROMPT)
+        assert (result['model'], fast.calls) == ('slow', 0)
+        assert 'hedge_cost_usd' not in result
+
+    run(scenario())
+
+
+def test_errors_fail_over_and_move_traffic_off_the_route(run):
+    async def scenario():
+        tracker = LatencyTracker()
+        broken, backup = fake('broken', 0, cls=BrokenProvider), fake('backup', 10)
+        provider = HedgedProvider([broken, backup], tracker)
+        result = await provider.complete(PROMPT)
+        assert (result['model'], broken.calls) == ('backup', 1)
+        assert 'hedge_cost_usd' not in result
+
+        # The next call goes to the healthy route first
+        assert tracker.rank([broken, backup]) == [backup, broken]
+        await provider.complete(PROMPT)
+        assert (broken.calls, backup.calls) == (1, 2)
+
+        with pytest.raises(ProviderError):
+            await HedgedProvider([broken], tracker).complete(PROMPT)
+
+    run(scenario())
+
+
+def test_hedge_delay_follows_the_routes_latency_quantile(monkeypatch):
+    monkeypatch.setattr(hedging, 'LLM_HEDGE_MIN_SAMPLES', 10)
+    monkeypatch.setattr(hedging, 'LLM_HEDGE_MIN_DELAY_SECONDS', 0.5)
+    tracker = LatencyTracker()
+    route = fake('route', 0)
+    for seconds in range(1, 10):
+        tracker.observe(route, seconds, ok=True)
+    assert tracker.hedge_delay(route) == 0.05  # Too few samples yet
+    tracker.observe(route, 10, ok=True)
+    assert tracker.hedge_delay(route) == 10  # p95 of 1..10
+
+    fast = fake('fast', 0)
+    for _ in range(10):
+        tracker.observe(fast, 0.1, ok=True)
+    assert tracker.hedge_delay(fast) == 0.5  # Never below the floor
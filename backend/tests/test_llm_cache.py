@@ -0,0 +1,64 @@
+import pytest
+
+from app.core.llm_cache import CachedProvider, ResponseCache, get_response_cache
+from app.core.llm_providers import LLMProvider
+
+
+class StubProvider(LLMProvider):
+    name = "stub"
+    model = "stub-1"
+
+    def __init__(self, result):
+        self.result = result
+        self.calls = 0
+
+    async def complete(self, prompt: str, **kwargs):
+        self.calls += 1
+        return dict(self.result)
+
+
+def make_result(**extra):
+    return {'content': 'answer', 'tokens_prompt': 10, 'tokens_completion': 5, 'cost_usd': 0.01, **extra}
+
+
+def test_one_shared_cache_per_redis_client(redis_client):
+    fakeredis = pytest.importorskip("fakeredis")
+    other = fakeredis.FakeAsyncRedis(decode_responses=True)
+    assert get_response_cache(redis_client) is get_response_cache(redis_client)
+    assert get_response_cache(other) is not get_response_cache(redis_client)
+    assert get_response_cache(other).redis_client is other
+    assert get_response_cache() is get_response_cache()
+
+
+def test_repeated_prompts_are_served_from_the_cache(run, redis_client):
+    async def scenario():
+        inner = StubProvider(make_result())
+        provider = CachedProvider(inner, ResponseCache(redis_client))
+        first = await provider.complete("hello", temperature=0)
+        hit = await provider.complete("hello", temperature=0)
+        assert inner.calls == 1
+        assert first['cost_usd'] == 0.01
+        assert (hit['cached'], hit['cost_usd'], hit['saved_cost_usd']) == (True, 0.0, 0.01)
+
+        # Other options are a different completion
+        await provider.complete("hello", temperature=1)
+        assert inner.calls == 2
+
+        # The Redis tier serves processes with a cold in-memory tier
+        cold = CachedProvider(inner, ResponseCache(redis_client))
+        assert (await cold.complete("hello", temperature=0))['cached']
+        assert inner.calls == 2
+
+    run(scenario())
+
+
+def test_hedge_spend_is_not_counted_as_saved(run):
+    async def scenario():
+        inner = StubProvider(make_result(cost_usd=0.015, hedge_cost_usd=0.005))
+        provider = CachedProvider(inner, ResponseCache())
+        await provider.complete("hello")
+        hit = await provider.complete("hello")
+        assert hit['saved_cost_usd'] == pytest.approx(0.01)
+        assert 'hedge_cost_usd' not in hit
+
+    run(scenario())
@@ -0,0 +1,35 @@
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core.migrations import migrate
+from app.models.agent import Base
+
+
+async def indexes(engine, table):
+    async with engine.connect() as conn:
+        return sorted(row[1] for row in await conn.execute(text(f"PRAGMA index_list('{table}')")))
+
+
+def test_existing_agent_events_get_the_keyset_index(run, tmp_path):
+    async def scenario():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/old.db")
+        # agent_events as created before the composite index
+        async with engine.begin() as conn:
+            await conn.execute(text(
+                "CREATE TABLE agent_events (id INTEGER PRIMARY KEY, agent_id VARCHAR NOT NULL, step INTEGER, "
+                "action VARCHAR, status VARCHAR, data JSON, cost_usd FLOAT, timestamp DATETIME)"
+            ))
+            await conn.execute(text("CREATE INDEX ix_agent_events_agent_id ON agent_events (agent_id)"))
+            await conn.execute(text("CREATE INDEX ix_agent_events_timestamp ON agent_events (timestamp)"))
+            await conn.run_sync(Base.metadata.create_all)  # Leaves agent_events alone
+
+        assert await indexes(engine, 'agent_events') == ['ix_agent_events_agent_id', 'ix_agent_events_timestamp']
+        assert await migrate(engine) == ["agent_events: (agent_id, id) index replaces the agent_id one"]
+        assert await indexes(engine, 'agent_events') == ['ix_agent_events_agent_id_id', 'ix_agent_events_timestamp']
+
+        # Idempotent, and a no-op on a fresh schema
+        await migrate(engine)
+        assert await indexes(engine, 'agent_events') == ['ix_agent_events_agent_id_id', 'ix_agent_events_timestamp']
+        await engine.dispose()
+
+    run(scenario())
@@ -0,0 +1,171 @@
+import asyncio
+import functools
+from collections import OrderedDict
+
+import pytest
+from sqlalchemy import select
+
+from app.core.llm_providers import PROVIDER_CLASSES, ProviderError, provider_registry
+from app.core.orchestrator import AgentExecutor
+from app.models.agent import Agent, AgentEvent, AgentStatus
+from benchmarks.fakes import FakeProvider
+
+DIAMOND = [
+    {'id': 'plan', 'prompt': 'plan {{task}}'},
+    {'id': 'left', 'prompt': 'left', 'depends_on': ['plan']},
+    {'id': 'right', 'prompt': 'right', 'depends_on': ['plan']},
+    {'id': 'merge', 'prompt': 'merge', 'depends_on': ['left', 'right']},
+]
+
+
+class ScriptedProvider(FakeProvider):
+    """FakeProvider that records prompts and fails those containing a marker in `failing`"""
+    prompts = []
+    failing = set()
+
+    async def complete(self, prompt: str, **kwargs):
+        ScriptedProvider.prompts.append(prompt)
+        if any(marker in prompt for marker in ScriptedProvider.failing):
+            raise ProviderError("scripted failure")
+        return await super().complete(prompt, **kwargs)
+
+
+def register(monkeypatch, latency_ms):
+    monkeypatch.setitem(PROVIDER_CLASSES, 'fake', functools.partial(ScriptedProvider, latency_ms=latency_ms, jitter_ms=0))
+    # Drop instances other tests built with other options
+    monkeypatch.setattr(provider_registry, '_providers', OrderedDict())
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    monkeypatch.setattr(ScriptedProvider, 'prompts', [])
+    monkeypatch.setattr(ScriptedProvider, 'failing', set())
+    register(monkeypatch, latency_ms=20)
+    return ScriptedProvider
+
+
+async def create_agent(session_factory, steps, **config):
+    async with session_factory() as db:
+        db.add(Agent(id='agent-1', task='the task', provider='fake', model='fake-1',
+                     config={'steps': steps, 'cache': False, **config}))
+        await db.commit()
+
+
+async def load(session_factory):
+    async with session_factory() as db:
+        agent = await db.get(Agent, 'agent-1')
+        events = (await db.scalars(select(AgentEvent).order_by(AgentEvent.id))).all()
+        return agent, events
+
+
+def test_graph_runs_steps_after_their_dependencies(run, session_factory, redis_client, provider):
+    async def scenario():
+        await create_agent(session_factory, DIAMOND, max_parallel=2)
+        async with session_factory() as db:
+            result = await AgentExecutor('agent-1', db, redis_client).run()
+
+        agent, events = await load(session_factory)
+        assert (agent.status, agent.current_step, agent.total_steps) == (AgentStatus.COMPLETED, 4, 4)
+        assert set(result['steps']) == {'plan', 'left', 'right', 'merge'}
+        assert agent.cost_usd == pytest.approx(sum(step['cost'] for step in result['steps'].values()))
+
+        # left and right both see plan's output; merge sees both of theirs
+        assert provider.prompts[0] == 'plan the task'
+        assert sorted(provider.prompts[1:3]) == sorted(
+            f"{side}\n\nOutput of step 'plan':\n{result['steps']['plan']['content']}" for side in ('left', 'right')
+        )
+        assert provider.prompts[3].startswith('merge\n\n')
+        assert "Output of step 'left'" in provider.prompts[3] and "Output of step 'right'" in provider.prompts[3]
+
+        started = [e.data['step_id'] for e in events if e.action == 'llm_call']
+        assert started[0] == 'plan' and started[-1] == 'merge'
+        assert events[-1].action == 'agent_completed'
+
+    run(scenario())
+
+
+def test_failed_runs_resume_from_their_checkpoints(run, session_factory, redis_client, provider):
+    async def scenario():
+        steps = [{'id': 'first', 'prompt': 'first'}, {'id': 'second', 'prompt': 'second', 'depends_on': ['first']}]
+        await create_agent(session_factory, steps)
+        provider.failing.add('second')
+        async with session_factory() as db:
+            with pytest.raises(ProviderError):
+                await AgentExecutor('agent-1', db, redis_client).run()
+
+        agent, events = await load(session_factory)
+        assert (agent.status, agent.current_step) == (AgentStatus.FAILED, 1)
+        # The failure is recorded at the step count reached, not a stale one
+        assert (events[-1].action, events[-1].step) == ('agent_failed', 1)
+
+        provider.failing.clear()
+        async with session_factory() as db:
+            await AgentExecutor('agent-1', db, redis_client).run()
+
+        agent, events = await load(session_factory)
+        assert (agent.status, agent.current_step) == (AgentStatus.COMPLETED, 2)
+        assert [prompt.split('\n')[0] for prompt in provider.prompts] == ['first', 'second', 'second']
+        assert [e.data.get('resumed_steps') for e in events if e.action == 'agent_started'] == [None, 1]
+
+    run(scenario())
+
+
+def test_kill_stops_in_flight_steps_and_records_their_spend(run, session_factory, redis_client, provider, monkeypatch):
+    register(monkeypatch, latency_ms=300)
+
+    async def scenario():
+        steps = [{'id': 'quick', 'prompt': 'quick'}, {'id': 'slow', 'prompt': 'slow ' * 400}]
+        await create_agent(session_factory, steps)
+        async with session_factory() as db:
+            executor = AgentExecutor('agent-1', db, redis_client)
+            await executor.load_agent()
+            task = asyncio.create_task(executor.run())
+            await asyncio.sleep(0.1)
+            executor.kill()
+            assert await asyncio.wait_for(task, 1) is None
+
+        agent, events = await load(session_factory)
+        killed = events[-1]
+        assert (agent.status, killed.action) == (AgentStatus.KILLED, 'agent_killed')
+        assert killed.step == agent.current_step == 0
+        # Both prompts were sent, so both are billed
+        assert killed.cost_usd > 0
+        assert agent.cost_usd == pytest.approx(killed.cost_usd)
+        assert killed.data['kill_latency_ms'] < 300
+
+    run(scenario())
+
+
+def test_budget_pause_leaves_the_agent_paused_and_resumable(run, session_factory, redis_client, provider):
+    async def scenario():
+        steps = [{'id': 'first', 'prompt': 'first'}, {'id': 'second', 'prompt': 'second', 'depends_on': ['first']}]
+        # The first call's high estimate fits 90% of the budget; spend plus the second's doesn't
+        await create_agent(session_factory, steps, max_cost_usd=0.0025)
+        async with session_factory() as db:
+            assert await AgentExecutor('agent-1', db, redis_client).run() is None
+
+        agent, events = await load(session_factory)
+        assert (agent.status, agent.current_step) == (AgentStatus.PAUSED, 1)
+        assert events[-1].action == 'budget_pause'
+        assert not any(e.action == 'agent_failed' for e in events)
+
+        async with session_factory() as db:
+            agent = await db.get(Agent, 'agent-1')
+            agent.config = {**agent.config, 'max_cost_usd': 1.0}
+            await db.commit()
+            await AgentExecutor('agent-1', db, redis_client).run()
+
+        agent, events = await load(session_factory)
+        assert (agent.status, agent.current_step) == (AgentStatus.COMPLETED, 2)
+        assert [prompt.split('\n')[0] for prompt in provider.prompts] == ['first', 'second']
+
+    run(scenario())
+
+
+def test_budget_keeps_headroom_and_counts_in_flight_calls(redis_client):
+    executor = AgentExecutor('agent-1', None, redis_client)
+    executor.agent = Agent(id='agent-1', config={'max_cost_usd': 1.0}, cost_usd=0.5)
+    assert executor.check_budget(0.35)
+    assert not executor.check_budget(0.45)  # Under the budget, but inside the 10% headroom
+    executor._inflight_cost = 0.2
+    assert not executor.check_budget(0.35)
@@ -0,0 +1,51 @@
+import pytest
+
+from app.core import prompt_index
+from app.core.prompt_index import normalize
+
+pytestmark = pytest.mark.skipif(prompt_index.np is None, reason="numpy is not installed")
+
+PROMPT = ("Summarize the support ticket {} for the customer and list the next steps "
+          "the team should take, ordered by urgency, with an owner for each step")
+
+
+def test_normalize_masks_ids_but_not_short_numbers():
+    assert normalize("What is 2+2?") == ['what', 'is', '2', '+', '2', '?']
+    assert normalize("Order 12345678 for user 3f2a9c1e-1111-4222-8333-444455556666") == [
+        'order', '<id>', 'for', 'user', '<id>'
+    ]
+    assert normalize("commit 9f86d081884c") == ['commit', '<id>']
+    assert normalize("on 2024-01-15") == ['on', '2024', '-', '01', '-', '15']
+    assert normalize("accepted deadbeef") == ['accepted', 'deadbeef']
+
+
+def test_id_variants_match():
+    index = prompt_index.PromptIndex(max_entries=64)
+    index.add(1, PROMPT.format('8f14e45fceea167a5a36dedd4bea2543'), 'key-1')
+    key, similarity = index.lookup(1, PROMPT.format('c9f0f895fb98ab9159f51fd0297e236d'), 0.9)
+    assert key == 'key-1'
+    assert similarity == pytest.approx(1.0)
+
+
+def test_prompts_differing_in_short_numbers_do_not_match_exactly():
+    index = prompt_index.PromptIndex(max_entries=64)
+    index.add(1, "what is 2 + 2", 'two-plus-two')
+    assert index.lookup(1, "what is 2 + 2", 1.0) == ('two-plus-two', 1.0)
+    assert index.lookup(1, "what is 3 + 5", 0.9) is None
+
+
+def test_namespaces_are_separate():
+    index = prompt_index.PromptIndex(max_entries=64)
+    index.add(1, PROMPT.format('a'), 'key-1')
+    assert index.lookup(2, PROMPT.format('a'), 0.5) is None
+
+
+def test_oldest_entry_is_overwritten_when_full():
+    index = prompt_index.PromptIndex(max_entries=2)
+    prompts = [f"{word} " * 10 + PROMPT for word in ('alpha', 'bravo', 'charlie')]
+    for i, prompt in enumerate(prompts):
+        index.add(1, prompt, f'key-{i}')
+
+    assert len(index) == 2
+    assert index.lookup(1, prompts[0], 0.99) is None
+    assert index.lookup(1, prompts[2], 0.99)[0] == 'key-2'
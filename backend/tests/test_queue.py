@@ -0,0 +1,88 @@
+import asyncio
+
+from app.core.queue import AgentQueue
+
+
+def make_queue(redis_client, visibility_timeout_ms=60000):
+    return AgentQueue(redis_client, visibility_timeout_ms=visibility_timeout_ms)
+
+
+def test_claims_high_lanes_first_and_ack_removes_the_job(run, redis_client):
+    async def scenario():
+        queue = make_queue(redis_client)
+        await queue.ensure_groups()
+        await queue.ensure_groups()  # idempotent
+        await queue.enqueue('low-1', lane='low')
+        await queue.enqueue_many(['normal-1', 'normal-2'])
+        await queue.enqueue('high-1', lane='high')
+
+        jobs = await queue.claim('w1', count=3, block_ms=10)
+        assert [job.agent_id for job in jobs] == ['high-1', 'normal-1', 'normal-2']
+
+        for job in jobs:
+            await queue.ack(job)
+        assert await queue.depth() == {'high': 0, 'normal': 0, 'low': 1}
+
+        jobs = await queue.claim('w1', count=3, block_ms=10)
+        assert [job.agent_id for job in jobs] == ['low-1']
+
+    run(scenario())
+
+
+def test_unacked_jobs_are_reclaimed_by_another_worker(run, redis_client):
+    async def scenario():
+        queue = make_queue(redis_client, visibility_timeout_ms=50)
+        await queue.ensure_groups()
+        await queue.enqueue('agent-1')
+
+        [job] = await queue.claim('w1', count=1, block_ms=10)
+        # w1 stops without acking (crash, or cancelled at shutdown)
+        assert await queue.claim('w2', count=1, block_ms=10) == []
+        await asyncio.sleep(0.1)
+
+        [reclaimed] = await queue.claim('w2', count=1, block_ms=10)
+        assert (reclaimed.agent_id, reclaimed.message_id) == ('agent-1', job.message_id)
+        await queue.ack(reclaimed)
+        await asyncio.sleep(0.1)
+        assert await queue.claim('w3', count=1, block_ms=10) == []
+
+    run(scenario())
+
+
+def test_touched_jobs_are_not_reclaimed(run, redis_client):
+    async def scenario():
+        queue = make_queue(redis_client, visibility_timeout_ms=100)
+        await queue.ensure_groups()
+        await queue.enqueue('agent-1')
+
+        jobs = await queue.claim('w1', count=1, block_ms=10)
+        for _ in range(3):
+            await asyncio.sleep(0.05)
+            await queue.touch('w1', jobs)
+        assert await queue.claim('w2', count=1, block_ms=10) == []
+
+    run(scenario())
+
+
+def test_remove_consumer_keeps_consumers_with_pending_jobs(run, redis_client):
+    async def scenario():
+        queue = make_queue(redis_client)
+        await queue.ensure_groups()
+        await queue.enqueue('agent-1')
+        await queue.enqueue('agent-2', lane='high')
+
+        [high, normal] = await queue.claim('w1', count=2, block_ms=10)
+        await queue.ack(high)
+        assert await queue.remove_consumer('w1') == 1
+
+        consumers = {
+            lane: [c['name'] for c in await redis_client.xinfo_consumers(queue.stream(lane), queue.group)]
+            for lane in ('high', 'normal')
+        }
+        assert consumers == {'high': [], 'normal': ['w1']}
+
+        await queue.ack(normal)
+        assert await queue.remove_consumer('w1') == 0
+        assert await redis_client.xinfo_consumers(queue.stream('normal'), queue.group) == []
+
+    run(scenario())
@@ -0,0 +1,74 @@
+import time
+
+import pytest
+
+from app.core import rate_limit
+from app.core.llm_providers import LLMProvider, ProviderError
+from app.core.rate_limit import GovernedProvider, RateGovernor, get_rate_governor
+
+
+class FlakyProvider(LLMProvider):
+    """Fails with the given errors, then answers"""
+    name = "stub"
+    model = "stub-1"
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    async def complete(self, prompt: str, **kwargs):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return {'content': 'answer', 'tokens_prompt': 10, 'tokens_completion': 5, 'tokens_total': 15, 'cost_usd': 0.01}
+
+
+def test_one_shared_governor_per_redis_client(redis_client):
+    fakeredis = pytest.importorskip("fakeredis")
+    other = fakeredis.FakeAsyncRedis(decode_responses=True)
+    assert get_rate_governor(redis_client) is get_rate_governor(redis_client)
+    assert get_rate_governor(other) is not get_rate_governor(redis_client)
+    assert get_rate_governor(other).redis is other
+
+
+def test_calls_wait_once_a_bucket_is_empty(run, redis_client):
+    async def scenario():
+        governor = RateGovernor(redis_client, rpm=2, tpm=1000)
+        bucket = governor.bucket('stub', 'key')
+        now = int(time.time() * 1000)
+
+        async def acquire(tokens, rpm=2):
+            return await governor._acquire(keys=[bucket], args=[now, rpm, 1000, tokens])
+
+        assert await acquire(100) == 0
+        assert await acquire(100) == 0
+        # Out of requests: the next one refills in 60s / 2 rpm
+        assert await acquire(100) == 30000
+
+        # A 429 halves the rate for this key only
+        await governor.throttled(bucket)
+        assert float(await redis_client.hget(bucket, 'factor')) == 0.5
+        assert await redis_client.hget(governor.bucket('stub', 'other'), 'factor') is None
+
+    run(scenario())
+
+
+def test_retryable_errors_are_retried_and_throttle_the_key(run, redis_client, monkeypatch):
+    monkeypatch.setattr(rate_limit, 'backoff_seconds', lambda attempt, error: 0.01)
+
+    async def scenario():
+        governor = RateGovernor(redis_client)
+        inner = FlakyProvider([ProviderError("rate limited", status_code=429, retryable=True)])
+        provider = GovernedProvider(inner, governor, key_hash='key')
+        result = await provider.complete("hello")
+        assert (inner.calls, result['retries']) == (2, 1)
+        assert result['queue_wait_ms'] >= 10
+        # Halved by the 429, then nudged back up by the success
+        factor = float(await redis_client.hget(provider.bucket, 'factor'))
+        assert factor == pytest.approx(0.5 + rate_limit.RATE_FACTOR_INCREASE)
+
+        failing = GovernedProvider(FlakyProvider([ProviderError("bad request", status_code=400)]), governor, 'key')
+        with pytest.raises(ProviderError):
+            await failing.complete("hello")
+
+    run(scenario())
@@ -0,0 +1,90 @@
+import asyncio
+import functools
+from collections import OrderedDict
+
+from app.core.llm_providers import PROVIDER_CLASSES, provider_registry
+from app.core.orchestrator import AgentExecutor
+from app.core.tracing import NULL_SPAN, TraceStore, span, start_trace, to_chrome, to_otlp, waterfall
+from app.models.agent import Agent
+from benchmarks.fakes import FakeProvider
+
+
+async def traced_run():
+    """agent.run with two parallel steps, the second one failing"""
+    trace = start_trace('agent-1', force=True)
+
+    async def step(number, seconds, fail=False):
+        with span('step', step=number):
+            with span('llm.call', provider='fake'):
+                await asyncio.sleep(seconds)
+                if fail:
+                    raise RuntimeError("provider down")
+
+    with span('agent.run'):
+        await asyncio.gather(step(1, 0.02), step(2, 0.01, fail=True), return_exceptions=True)
+    return trace
+
+
+def test_spans_nest_across_tasks(run):
+    record = run(traced_run()).record()
+    by_id = {s[0]: s for s in record['spans']}
+    names = {s[0]: s[2] for s in record['spans']}
+    assert sorted(names.values()) == ['agent.run', 'llm.call', 'llm.call', 'step', 'step']
+    for span_id, parent_id, name, *_ in record['spans']:
+        expected = {'agent.run': None, 'step': 'agent.run', 'llm.call': 'step'}[name]
+        assert (names[parent_id] if parent_id else None) == expected
+    failed = [s for s in by_id.values() if s[2] == 'llm.call' and 'error' in s[5]]
+    assert len(failed) == 1 and 'RuntimeError' in failed[0][5]['error']
+
+
+def test_unsampled_runs_record_nothing(run):
+    async def scenario():
+        assert start_trace('agent-1', force=False) is None
+        assert span('step', step=1) is NULL_SPAN
+
+    run(scenario())
+
+
+def test_exports(run):
+    record = run(traced_run()).record()
+
+    view = waterfall(record)
+    assert [s['depth'] for s in view['spans']][0] == 0
+    totals = {t['name']: t for t in view['breakdown']}
+    assert totals['llm.call']['count'] == 2
+    # Steps only wrap their calls, so their own time is small
+    assert totals['step']['self_ms'] < totals['llm.call']['self_ms']
+
+    otlp = to_otlp(record)['resourceSpans'][0]['scopeSpans'][0]['spans']
+    assert {s['traceId'] for s in otlp} == {record['trace_id']}
+    root = next(s for s in otlp if s['name'] == 'agent.run')
+    assert 'parentSpanId' not in root
+    assert all(s.get('parentSpanId') for s in otlp if s is not root)
+    # The error marks the failed call and the step it propagated through
+    assert sorted((s['name'], s['status']['code']) for s in otlp if 'status' in s) == [('llm.call', 2), ('step', 2)]
+    assert all(int(s['endTimeUnixNano']) >= int(s['startTimeUnixNano']) for s in otlp)
+
+    events = to_chrome(record)['traceEvents']
+    # One row per step; spans outside any step go on row 0
+    assert {(e['name'], e['tid']) for e in events} == {
+        ('agent.run', 0), ('step', 1), ('step', 2), ('llm.call', 1), ('llm.call', 2)
+    }
+
+
+def test_traced_runs_are_stored_newest_first(run, session_factory, redis_client, monkeypatch):
+    monkeypatch.setitem(PROVIDER_CLASSES, 'fake', functools.partial(FakeProvider, latency_ms=10, jitter_ms=0))
+    monkeypatch.setattr(provider_registry, '_providers', OrderedDict())
+
+    async def scenario():
+        async with session_factory() as db:
+            db.add(Agent(id='agent-1', task='t', provider='fake', model='fake-1', config={'trace': True}))
+            await db.commit()
+            await AgentExecutor('agent-1', db, redis_client).run()
+
+        store = TraceStore(redis_client)
+        record = await store.load('agent-1')
+        names = {s[2] for s in record['spans']}
+        assert {'agent.run', 'step', 'llm.call', 'events.flush'} <= names
+        assert await store.load('agent-1', run=1) is None
+
+    run(scenario())
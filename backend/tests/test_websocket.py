@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+
+from app.api.websocket import Client, ConnectionManager
+from app.core.event_codec import JSON_CODEC, get_codec
+from app.core.event_sink import EventSink, stream_key
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message):
+        self.sent.append(JSON_CODEC.decode(message))
+
+    async def send_bytes(self, message):
+        self.sent.append(get_codec('msgpack').decode(message))
+
+
+async def wait_for(condition, timeout=1.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def test_replay_then_live_events_without_duplicates(run, session_factory, redis_client):
+    async def scenario():
+        manager = ConnectionManager(redis_client)
+        async with session_factory() as db:
+            sink = EventSink(db, redis_client, max_batch=1)
+            for step in range(3):
+                await sink.emit('agent-1', step, 'llm_call', 'running')
+
+            websocket = FakeWebSocket()
+            client = await manager.connect('agent-1', websocket)
+            # The client has event 1 (e.g. from the timeline); 2 and 3 are replayed
+            await manager.replay('agent-1', client, last_event_id=1)
+            assert [JSON_CODEC.decode(m)['id'] for m in client.backlog] == [2, 3]
+
+            # Published again while the replay ran (the overlap), then a new event
+            [(_, fields)] = await redis_client.xrange(stream_key('agent-1'), min='3', max='3')
+            manager.dispatch('agent-1', fields['m'])
+            await sink.emit('agent-1', 3, 'llm_response', 'completed')
+
+            sender = asyncio.create_task(client.run())
+            await wait_for(lambda: len(websocket.sent) >= 3)
+            await asyncio.sleep(0.05)
+            sender.cancel()
+            assert [message['id'] for message in websocket.sent] == [2, 3, 4]
+            await sink.close()
+        await manager.close()
+
+    run(scenario())
+
+
+def test_replay_reports_a_gap_it_cannot_cover(run, redis_client):
+    async def scenario():
+        manager = ConnectionManager(redis_client)
+        client = await manager.connect('agent-1', FakeWebSocket(), get_codec('msgpack'))
+        await redis_client.xadd(stream_key('agent-1'), {'m': JSON_CODEC.encode({'id': 10, 'action': 'llm_call'})},
+                                id='10-0')
+        # Events 6..9 were trimmed from the stream
+        await manager.replay('agent-1', client, last_event_id=5)
+        backlog = [client.codec.decode(m) for m in client.backlog]
+        assert backlog[0] == {'action': 'replay_gap', 'status': 'warning', 'data': {'since_id': 5}}
+        assert backlog[1]['id'] == 10
+        await manager.close()
+
+    run(scenario())
+
+
+def test_slow_viewers_drop_their_oldest_messages(run):
+    async def scenario():
+        websocket = FakeWebSocket()
+        client = Client(websocket, max_queue=2)
+        for event_id in range(1, 5):
+            client.offer(JSON_CODEC.encode({'id': event_id}))
+        sender = asyncio.create_task(client.run())
+        await wait_for(lambda: len(websocket.sent) >= 3)
+        sender.cancel()
+        assert websocket.sent == [
+            {'action': 'messages_dropped', 'status': 'warning', 'data': {'count': 2}},
+            {'id': 3},
+            {'id': 4},
+        ]
+
+    run(scenario())
@@ -0,0 +1,46 @@
+import uuid
+
+import pytest
+
+from app import worker
+from app.core.queue import AgentQueue
+from app.models.agent import Agent, AgentStatus
+
+
+@pytest.mark.parametrize('status, runs', [
+    (AgentStatus.PENDING, True),
+    (AgentStatus.RUNNING, True),  # Reclaimed from a worker that died mid-run
+    (AgentStatus.PAUSED, False),
+    (AgentStatus.COMPLETED, False),
+    (AgentStatus.KILLED, False),
+])
+def test_jobs_run_only_unfinished_unpaused_agents(run, session_factory, redis_client, monkeypatch, status, runs):
+    started = []
+
+    class RecordingExecutor:
+        def __init__(self, agent_id, db, redis_client=None):
+            self.agent_id = agent_id
+
+        async def run(self):
+            started.append(self.agent_id)
+
+    monkeypatch.setattr(worker, 'AsyncSessionLocal', session_factory)
+    monkeypatch.setattr(worker, 'AgentExecutor', RecordingExecutor)
+
+    async def scenario():
+        agent_id = str(uuid.uuid4())
+        async with session_factory() as db:
+            db.add(Agent(id=agent_id, task='t', provider='fake', model='fake-1', status=status, config={}))
+            await db.commit()
+
+        queue = AgentQueue(redis_client)
+        await queue.ensure_groups()
+        await queue.enqueue(agent_id)
+        [job] = await queue.claim('w1', count=1, block_ms=10)
+
+        await worker.Worker(queue, name='w1')._process(job)
+        assert started == ([agent_id] if runs else [])
+        # Acked either way
+        assert await queue.depth() == {'high': 0, 'normal': 0, 'low': 0}
+
+    run(scenario())
@@ -1,12 +1,12 @@
 'use client'
 
-import { useEffect, useState } from 'react'
+import { useEffect, useRef, useState } from 'react'
 import Link from 'next/link'
 
 interface Agent {
   id: string
   task: string
-  status: 'running' | 'completed' | 'failed' | 'paused' | 'pending'
+  status: 'running' | 'completed' | 'failed' | 'paused' | 'pending' | 'killed'
   current_step: number
   total_steps: number
   cost_usd: number
@@ -23,6 +23,7 @@ interface Agent {
 }
 
 interface TimelineEvent {
+  id?: number  // Stored events only; live llm_delta messages have none
   timestamp: string
   action: string
   status: string
@@ -33,6 +34,7 @@ interface TimelineEvent {
 
 interface TimelineResponse {
   timeline: TimelineEvent[]
+  since_id?: number | null
 }
 
 export default function AgentPage({ params }: { params: { id: string } }) {
@@ -42,12 +44,15 @@ export default function AgentPage({ params }: { params: { id: string } }) {
   const [timeline, setTimeline] = useState<TimelineEvent[]>([])
   const [ws, setWs] = useState<WebSocket | null>(null)
   const [error, setError] = useState<string>('')
+  const [liveOutput, setLiveOutput] = useState<string>('')
+  // Newest event shown; the socket replays anything after it on (re)connect
+  const lastEventId = useRef<number | null>(null)
 
   // Fetch agent details
   const fetchAgent = async () => {
     if (!agentId) return
     try {
-      const res = await fetch(`http://localhost:8000/api/agents/${agentId}`)
+      const res = await fetch(`http://localhost:8000/api/agents/${agentId}?include=result`)
       if (!res.ok) throw new Error('Failed to fetch agent')
       const data: Agent = await res.json()
       setAgent(data)
@@ -67,38 +72,69 @@ export default function AgentPage({ params }: { params: { id: string } }) {
       if (!res.ok) throw new Error('Failed to fetch timeline')
       const data: TimelineResponse = await res.json()
       setTimeline(Array.isArray(data.timeline) ? data.timeline : [])
+      if (data.since_id != null) lastEventId.current = data.since_id
     } catch (err) {
       console.error('Failed to fetch timeline:', err)
     }
   }
 
   useEffect(() => {
-    fetchAgent()
-    fetchTimeline()
-
     if (!agentId) return
+    let websocket: WebSocket | null = null
+    let reconnectTimer: ReturnType<typeof setTimeout> | undefined
+    let closed = false
 
-    const websocket = new WebSocket(`ws://localhost:8000/ws/agents/${agentId}`)
+    const connect = () => {
+      const resume = lastEventId.current != null ? `?last_event_id=${lastEventId.current}` : ''
+      websocket = new WebSocket(`ws://localhost:8000/ws/agents/${agentId}${resume}`)
 
-    websocket.onopen = () => console.log('WebSocket connected')
-    websocket.onmessage = (event: MessageEvent<string>) => {
-      try {
-        const data: TimelineEvent = JSON.parse(event.data)
-        setTimeline(prev => [...prev, data])
-        if (['agent_completed', 'agent_failed', 'agent_started'].includes(data.action)) {
-          fetchAgent()
+      websocket.onopen = () => console.log('WebSocket connected')
+      websocket.onmessage = (event: MessageEvent<string>) => {
+        try {
+          const data: TimelineEvent = JSON.parse(event.data)
+          // Streamed token deltas build up the live output instead of the timeline
+          if (data.action === 'llm_delta') {
+            setLiveOutput(prev => prev + String(data.data?.text ?? ''))
+            return
+          }
+          // The server dropped messages for this (slow) tab, or couldn't replay
+          // everything since lastEventId: resync from the API
+          if (data.action === 'messages_dropped' || data.action === 'replay_gap') {
+            fetchTimeline()
+            return
+          }
+          if (data.id != null) {
+            if (lastEventId.current != null && data.id <= lastEventId.current) return  // Already shown
+            lastEventId.current = data.id
+          }
+          if (data.action === 'llm_response') setLiveOutput('')
+          setTimeline(prev => [...prev, data])
+          if (['agent_completed', 'agent_failed', 'agent_killed', 'agent_started'].includes(data.action)) {
+            fetchAgent()
+          }
+        } catch (err) {
+          console.error('Invalid WebSocket message:', err)
         }
-      } catch (err) {
-        console.error('Invalid WebSocket message:', err)
       }
+      websocket.onerror = (err) => console.error('WebSocket error:', err)
+      websocket.onclose = () => {
+        console.log('WebSocket closed')
+        // Reconnect (e.g. after a deploy); the server replays what was missed
+        if (!closed) reconnectTimer = setTimeout(connect, 1000 + Math.random() * 2000)
+      }
+      setWs(websocket)
     }
-    websocket.onerror = (err) => console.error('WebSocket error:', err)
-    websocket.onclose = () => console.log('WebSocket closed')
 
-    setWs(websocket)
+    fetchAgent()
+    // Connect once the timeline is loaded so the socket resumes right after it
+    fetchTimeline().then(() => {
+      if (!closed) connect()
+    })
 
     return () => {
-      if (websocket.readyState === WebSocket.OPEN) websocket.close()
+      closed = true
+      clearTimeout(reconnectTimer)
+      if (websocket && websocket.readyState === WebSocket.OPEN) websocket.close()
     }
   }, [agentId])
 
@@ -165,6 +201,7 @@ export default function AgentPage({ params }: { params: { id: string } }) {
       case 'completed': return 'bg-green-100 text-green-800'
       case 'failed': return 'bg-red-100 text-red-800'
       case 'paused': return 'bg-yellow-100 text-yellow-800'
+      case 'killed': return 'bg-red-100 text-red-800'
       case 'pending': return 'bg-gray-100 text-gray-800'
       default: return 'bg-gray-100 text-gray-800'
     }
@@ -230,6 +267,16 @@ export default function AgentPage({ params }: { params: { id: string } }) {
               )}
             </div>
 
+            {/* Live output while a streamed completion is in flight */}
+            {liveOutput && (
+              <div className="bg-white rounded-lg shadow p-6">
+                <h2 className="font-semibold mb-4">Live Output</h2>
+                <pre className="whitespace-pre-wrap text-sm bg-gray-50 p-4 rounded">
+                  {liveOutput}
+                </pre>
+              </div>
+            )}
+
             {/* Result */}
             {agent.result && (
               <div className="bg-white rounded-lg shadow p-6">